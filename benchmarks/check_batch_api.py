@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import argparse
+import subprocess
+
+# ========== Batch API 流程检查 ==========
+# 在进程内启动模拟服务 (含 /files、/batches 接口)，用 run --batch-api 处理一组复制出的示例图片：
+# 第一次运行让中间某个分片的 POST /batches 失败，确认程序以退出码 1 结束且清单中保留了未提交的分片；
+# 第二次运行应只提交剩余的分片，等待全部任务完成后每张图片都写入 results.sqlite。任何一步不符合预期时以退出码 1 结束。
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BENCHMARK_DIR)
+from mock_openai_server import MockServerConfig, start_mock_server  # noqa: E402
+from sample_dataset import build_dataset  # noqa: E402
+
+
+def run_batch_api(base_url, data_folder, output_folder, requests_per_file, verbose):
+    env = dict(os.environ, OPENAI_API_KEY="sk-check", OPENAI_BASE_URL=base_url, PYTHONPATH=REPO_DIR,
+               TACTILE_PAVING_BATCH_MAX_REQUESTS_PER_FILE=str(requests_per_file),
+               TACTILE_PAVING_BATCH_POLL_INTERVAL_SECONDS="0", TACTILE_PAVING_PREPROCESS_IMAGES="False")
+    command = [sys.executable, "-m", "tactile_paving", "--data-folder", data_folder, "--output-folder", output_folder,
+               "run", "--batch-api", "--no-cache"]
+    completed = subprocess.run(command, env=env, cwd=REPO_DIR, stdout=None if verbose else subprocess.DEVNULL,
+                               stderr=None if verbose else subprocess.DEVNULL)
+    return completed.returncode
+
+
+def stored_images(store_path):
+    if not os.path.exists(store_path):
+        return set()
+    with sqlite3.connect(store_path) as conn:
+        return {row[0] for row in conn.execute("SELECT image FROM images")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用本地模拟服务检查 Batch API 的提交、续传和结果写入")
+    parser.add_argument("--images", type=int, default=7, help="图片数量 (默认: %(default)s)")
+    parser.add_argument("--requests-per-file", type=int, default=2, help="每个分片的请求数，用于生成多个分片 (默认: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="显示被测流程的输出")
+    args = parser.parse_args()
+
+    num_shards = -(-args.images // args.requests_per_file)
+    if num_shards < 2:
+        raise SystemExit("至少需要 2 个分片才能检查续传，请增加 --images 或减小 --requests-per-file。")
+
+    server = start_mock_server(MockServerConfig(latency_ms=0, seed=0))
+    work_folder = tempfile.mkdtemp(prefix="tactile_paving_batch_check_")
+    failures = []
+    try:
+        data_folder = build_dataset(os.path.join(work_folder, "data"), args.images, prefix="check")
+        output_folder = os.path.join(work_folder, "results")
+        manifest_path = os.path.join(output_folder, "_batch_api", "manifest.json")
+        store_path = os.path.join(output_folder, "results.sqlite")
+        print(f"🧪 模拟服务: {server.base_url}，{args.images} 张图片，{num_shards} 个分片")
+
+        # 第一次运行：第 2 个分片提交失败
+        server.fail_batch_creates_after = 1
+        server.fail_batch_creates = 1
+        returncode = run_batch_api(server.base_url, data_folder, output_folder, args.requests_per_file, args.verbose)
+        if returncode != 1:
+            failures.append(f"提交失败时退出码应为 1，实际为 {returncode}")
+        if not os.path.exists(manifest_path):
+            failures.append("提交失败后没有保留 manifest.json")
+        else:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("batches", [])
+            submitted = sum(1 for entry in entries if entry.get("batch_id"))
+            print(f"▶️ 第一次运行: 退出码 {returncode}，清单中 {submitted}/{len(entries)} 个分片已提交")
+            if len(entries) != num_shards or submitted != 1:
+                failures.append(f"清单应包含 {num_shards} 个分片且只有 1 个已提交，实际 {submitted}/{len(entries)}")
+
+        # 第二次运行：继续提交剩余分片并写入结果
+        returncode = run_batch_api(server.base_url, data_folder, output_folder, args.requests_per_file, args.verbose)
+        images = stored_images(store_path)
+        print(f"▶️ 第二次运行: 退出码 {returncode}，数据库中 {len(images)} 张图片，共创建 {len(server.batches)} 个批处理任务")
+        if returncode != 0:
+            failures.append(f"续传运行的退出码应为 0，实际为 {returncode}")
+        if len(images) != args.images:
+            failures.append(f"数据库中应有 {args.images} 张图片，实际 {len(images)} 张")
+        if len(server.batches) != num_shards:
+            failures.append(f"应创建 {num_shards} 个批处理任务 (不重复提交)，实际 {len(server.batches)} 个")
+        if os.path.exists(manifest_path):
+            failures.append("全部完成后 manifest.json 应被删除")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Batch API 流程检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import namedtuple
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ========== 本地模拟 OpenAI 服务 ==========
+# 只依赖标准库，实现 chat.completions 的流式 (SSE)、JSON 模式和严格 JSON Schema 响应，用于离线压测批处理流程。
+# 响应根据请求中出现的问题ID生成；可配置延迟分布、429/5xx 错误注入、结构错误的响应和响应大小。
+# GET /stats 返回请求计数和峰值并发数，POST /stats/reset 清零。
+# 同时实现 Batch API 用到的接口 (POST /files、POST /batches、GET /batches/{id}、GET /files/{id}/content)：
+# 提交的批处理任务在第二次查询时完成，逐行生成与 chat.completions 相同的响应，按 error_5xx_rate 写入错误文件。
+# fail_batch_creates 大于 0 时，已创建 fail_batch_creates_after 个批处理任务之后的这么多次 POST /batches 返回 500，
+# 用于测试提交到一半失败后的续传。
+
+MockServerConfig = namedtuple(
+    "MockServerConfig",
+    ["latency_distribution", "latency_ms", "latency_sigma", "stream_chunk_chars", "stream_chunk_delay_ms",
+     "error_429_rate", "error_5xx_rate", "malformed_rate", "retry_after_seconds", "analysis_chars", "positive_rate",
+     "undetermined_rate", "seed"],
+    defaults=["lognormal", 800.0, 0.5, 50, 0.0, 0.0, 0.0, 0.0, 1.0, 60, 0.15, 0.03, None],
+)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+QUESTION_ID_PATTERN = re.compile(r"(?m)^\s*(\d+\.\d+\.\d+)\s")
+BATCH_PATH_PATTERN = re.compile(r"/batches/([^/]+)$")
+FILE_CONTENT_PATH_PATTERN = re.compile(r"/files/([^/]+)/content$")
+
+
+def sample_latency_seconds(config, rng):
+    mean = config.latency_ms / 1000
+    if config.latency_distribution == "fixed" or mean <= 0:
+        return max(0.0, mean)
+    if config.latency_distribution == "uniform":
+        return rng.uniform(mean * max(0.0, 1 - config.latency_sigma), mean * (1 + config.latency_sigma))
+    if config.latency_distribution == "exponential":
+        return rng.expovariate(1 / mean)
+    # 对数正态: 均值为 latency_ms，sigma 控制长尾
+    mu = math.log(mean) - config.latency_sigma ** 2 / 2
+    return rng.lognormvariate(mu, config.latency_sigma)
+
+
+def request_text_and_images(body):
+    texts = []
+    image_count = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                image_count += 1
+    return "\n".join(texts), image_count
+
+
+def build_malformed_content(config):
+    # 模拟模型不按要求输出: 没有 evaluations 数组，而是一大段说明文字
+    return json.dumps({"result": "无法按要求的格式完成评估。" * (config.analysis_chars * 4)}, ensure_ascii=False)
+
+
+def build_completion_content(body, config, rng):
+    text, image_count = request_text_and_images(body)
+    question_ids = list(dict.fromkeys(QUESTION_ID_PATTERN.findall(text)))
+    response_format = (body.get("response_format") or {}).get("type")
+
+    def judgment():
+        roll = rng.random()
+        if roll < config.undetermined_rate:
+            return -1
+        return 1 if roll < config.undetermined_rate + config.positive_rate else 0
+
+    if response_format not in ("json_object", "json_schema"):
+        # 纯文本模式: 每行 "QID: 0/1"
+        return "\n".join(f"{question_id}: {max(judgment(), 0)}" for question_id in question_ids)
+
+    analysis = ("模拟分析" * (config.analysis_chars // 4 + 1))[:config.analysis_chars]
+
+    schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema") or {}
+    if response_format == "json_schema" and schema:
+        return build_schema_content(schema, image_count, judgment, analysis)
+
+    def evaluations():
+        return [{"question_id": question_id, "question_text": "模拟问题", "analysis": analysis, "judgment": judgment()}
+                for question_id in question_ids]
+
+    if image_count > 1:
+        return json.dumps({"images": [{"image_index": index, "evaluations": evaluations()}
+                                      for index in range(1, image_count + 1)]}, ensure_ascii=False)
+    return json.dumps({"evaluations": evaluations()}, ensure_ascii=False)
+
+
+def build_schema_content(schema, image_count, judgment, analysis):
+    # 精简格式 (严格 JSON Schema): 问题ID和允许的取值都从 schema 中读取，与真实服务端一样保证符合 schema
+    packed = "images" in schema.get("properties", {})
+    image_schema = schema["properties"]["images"]["items"] if packed else schema
+    judgment_properties = image_schema["properties"]["judgments"]["properties"]
+    include_findings = "findings" in image_schema["properties"]
+
+    def image_result():
+        judgments = {}
+        for question_id, value_schema in judgment_properties.items():
+            value = judgment()
+            allowed = value_schema.get("enum", [-1, 0, 1])
+            judgments[question_id] = value if value in allowed else 0
+        result = {"judgments": judgments}
+        if include_findings:
+            short_analysis = analysis[:30]
+            result["findings"] = [{"question_id": question_id, "analysis": short_analysis}
+                                  for question_id, value in judgments.items() if value == 1]
+        return result
+
+    if packed:
+        return json.dumps({"images": [{"image_index": index, **image_result()} for index in range(1, image_count + 1)]},
+                          ensure_ascii=False)
+    return json.dumps(image_result(), ensure_ascii=False)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config):
+        super().__init__(address, MockOpenAIHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "completed": 0, "errors_429": 0, "errors_5xx": 0, "in_flight": 0, "peak_in_flight": 0}
+        self.batch_lock = threading.Lock()
+        self.files = {}  # 文件ID -> (文件名, 内容)
+        self.batches = {}  # 批处理ID -> 批处理对象
+        self.fail_batch_creates = 0
+        self.fail_batch_creates_after = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, key, delta=1):
+        with self.stats_lock:
+            self.stats[key] += delta
+            if key == "in_flight":
+                self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+
+    def snapshot_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            for key in self.stats:
+                if key != "in_flight":
+                    self.stats[key] = 0
+
+    def add_file(self, filename, content, purpose):
+        with self.batch_lock:
+            file_id = f"file-mock-{len(self.files) + 1:06d}"
+            self.files[file_id] = (filename, content)
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def create_batch(self, request):
+        with self.batch_lock:
+            if self.fail_batch_creates > 0 and len(self.batches) >= self.fail_batch_creates_after:
+                self.fail_batch_creates -= 1
+                return None
+            if request.get("input_file_id") not in self.files:
+                return {}
+            batch_id = f"batch-mock-{len(self.batches) + 1:06d}"
+            batch = {"id": batch_id, "object": "batch", "endpoint": request.get("endpoint"), "errors": None,
+                     "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window", "24h"),
+                     "status": "validating", "output_file_id": None, "error_file_id": None, "created_at": int(time.time()),
+                     "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": request.get("metadata")}
+            self.batches[batch_id] = batch
+            return dict(batch)
+
+    def poll_batch(self, batch_id):
+        # 第一次查询返回 in_progress，第二次查询时生成结果文件并返回 completed
+        with self.batch_lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                self.run_batch(batch)
+            return dict(batch)
+
+    def run_batch(self, batch):
+        output_lines, error_lines = [], []
+        for line in self.files[batch["input_file_id"]][1].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request.get("body") or {}
+            with self.rng_lock:
+                failed = self.rng.random() < self.config.error_5xx_rate
+                content = build_completion_content(body, self.config, self.rng)
+            record = {"id": f"batch_req_{len(output_lines) + len(error_lines)}", "custom_id": request.get("custom_id"), "error": None}
+            if failed:
+                record["response"] = {"status_code": 500, "request_id": "mock",
+                                      "body": {"error": {"message": "Service unavailable (mock)", "type": "server_error"}}}
+                error_lines.append(json.dumps(record, ensure_ascii=False))
+                continue
+            record["response"] = {"status_code": 200, "request_id": "mock", "body": {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(line) // 4, "completion_tokens": len(content) // 3,
+                          "total_tokens": len(line) // 4 + len(content) // 3}}}
+            output_lines.append(json.dumps(record, ensure_ascii=False))
+        for key, lines in (("output_file_id", output_lines), ("error_file_id", error_lines)):
+            if lines:
+                file_id = f"file-mock-{len(self.files) + 1:06d}"
+                self.files[file_id] = (f"{batch['id']}_{key}.jsonl", ("\n".join(lines) + "\n").encode("utf-8"))
+                batch[key] = file_id
+        batch["request_counts"] = {"total": len(output_lines) + len(error_lines), "completed": len(output_lines), "failed": len(error_lines)}
+        batch["status"] = "completed"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, payload, content_type="application/json", headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if not isinstance(payload, bytes) else payload
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/stats":
+            return self.send_body(200, self.server.snapshot_stats())
+        match = BATCH_PATH_PATTERN.search(path)
+        if match:
+            batch = self.server.poll_batch(match.group(1))
+            if batch is None:
+                return self.send_body(404, {"error": {"message": f"未知批处理: {match.group(1)}"}})
+            return self.send_body(200, batch)
+        match = FILE_CONTENT_PATH_PATTERN.search(path)
+        if match and match.group(1) in self.server.files:
+            return self.send_body(200, self.server.files[match.group(1)][1], content_type="application/octet-stream")
+        self.send_body(404, {"error": {"message": f"未知路径: {self.path}"}})
+
+    def handle_file_upload(self, raw_body):
+        # multipart/form-data: file (文件内容) 和 purpose
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"content-type: {self.headers.get('content-type', '')}\r\n\r\n".encode("latin-1") + raw_body)
+        fields = {}
+        filename = "upload.jsonl"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = part.get_payload(decode=True) or b""
+            if name == "file":
+                filename = part.get_filename() or filename
+        if "file" not in fields:
+            return self.send_body(400, {"error": {"message": "缺少 file 字段"}})
+        self.send_body(200, self.server.add_file(filename, fields["file"], fields.get("purpose", b"batch").decode("utf-8")))
+
+    def handle_batch_create(self, raw_body):
+        batch = self.server.create_batch(json.loads(raw_body))
+        if batch is None:
+            return self.send_body(500, {"error": {"message": "Batch creation failed (mock)", "type": "server_error"}})
+        if not batch:
+            return self.send_body(400, {"error": {"message": "input_file_id 不存在"}})
+        self.send_body(200, batch)
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        raw_body = self.rfile.read(length)
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/stats/reset":
+            self.server.reset_stats()
+            return self.send_body(200, self.server.snapshot_stats())
+        if path.endswith("/files"):
+            return self.handle_file_upload(raw_body)
+        if path.endswith("/batches"):
+            return self.handle_batch_create(raw_body)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self.send_body(404, {"error": {"message": f"未知路径: {self.path}"}})
+
+        server = self.server
+        config = server.config
+        server.count("requests")
+        server.count("in_flight")
+        try:
+            body = json.loads(raw_body)
+            with server.rng_lock:
+                latency = sample_latency_seconds(config, server.rng)
+                roll = server.rng.random()
+                if server.rng.random() < config.malformed_rate:
+                    content = build_malformed_content(config)
+                else:
+                    content = build_completion_content(body, config, server.rng)
+            time.sleep(latency)
+
+            if roll < config.error_429_rate:
+                server.count("errors_429")
+                return self.send_body(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                                      headers={"retry-after": f"{config.retry_after_seconds:g}"})
+            if roll < config.error_429_rate + config.error_5xx_rate:
+                server.count("errors_5xx")
+                return self.send_body(503, {"error": {"message": "Service unavailable (mock)", "type": "server_error"}})
+
+            usage = {"prompt_tokens": len(raw_body) // 4, "completion_tokens": len(content) // 3}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            rate_headers = {"x-ratelimit-limit-requests": "10000", "x-ratelimit-remaining-requests": "9999",
+                            "x-ratelimit-limit-tokens": "30000000", "x-ratelimit-remaining-tokens": "29999999"}
+            if body.get("stream"):
+                self.stream_completion(body, content, usage, rate_headers)
+            else:
+                self.send_body(200, {
+                    "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                }, headers=rate_headers)
+            server.count("completed")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            server.count("in_flight", -1)
+
+    def stream_completion(self, body, content, usage, rate_headers):
+        config = self.server.config
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        for name, value in rate_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+        def chunk(choices, **extra):
+            return json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                               "model": body.get("model"), "choices": choices, **extra}, ensure_ascii=False)
+
+        step = max(1, config.stream_chunk_chars)
+        for start in range(0, len(content), step):
+            write_event(chunk([{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}]))
+            if config.stream_chunk_delay_ms:
+                time.sleep(config.stream_chunk_delay_ms / 1000)
+        write_event(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            write_event(chunk([], usage=usage))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    # 在后台线程中启动服务，返回 server；server.base_url 可直接作为 OpenAI 客户端的 base_url
+    server = MockOpenAIServer((host, port), config or MockServerConfig())
+    threading.Thread(target=server.serve_forever, name="mock-openai-server", daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="响应延迟分布 (默认: %(default)s)")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="平均响应延迟，毫秒 (默认: %(default)s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态分布的 sigma，或均匀分布的相对半宽 (默认: %(default)s)")
+    parser.add_argument("--stream-chunk-chars", type=int, default=50, help="流式响应每个数据块的字符数 (默认: %(default)s)")
+    parser.add_argument("--stream-chunk-delay-ms", type=float, default=0.0, help="流式数据块之间的间隔，毫秒 (默认: %(default)s)")
+    parser.add_argument("--error-429-rate", type=float, default=0.0, help="返回 429 的请求比例 (默认: %(default)s)")
+    parser.add_argument("--error-5xx-rate", type=float, default=0.0, help="返回 503 的请求比例 (默认: %(default)s)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="返回结构错误 (缺少 evaluations 数组) 响应的比例 (默认: %(default)s)")
+    parser.add_argument("--retry-after-seconds", type=float, default=1.0, help="429 响应的 retry-after 秒数 (默认: %(default)s)")
+    parser.add_argument("--analysis-chars", type=int, default=60, help="每个问题 analysis 字段的字符数，用于调节响应大小 (默认: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+
+
+def config_from_args(args):
+    return MockServerConfig(
+        latency_distribution=args.latency_distribution, latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+        stream_chunk_chars=args.stream_chunk_chars, stream_chunk_delay_ms=args.stream_chunk_delay_ms,
+        error_429_rate=args.error_429_rate, error_5xx_rate=args.error_5xx_rate, malformed_rate=args.malformed_rate,
+        retry_after_seconds=args.retry_after_seconds,
+        analysis_chars=args.analysis_chars, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI chat.completions 和 Batch API 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口，0 表示随机端口 (默认: %(default)s)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = MockOpenAIServer((args.host, args.port), config_from_args(args))
+    print(f"MOCK_SERVER_URL {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.exit(0)
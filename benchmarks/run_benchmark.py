@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import resource
+import tempfile
+import argparse
+import subprocess
+
+import numpy as np
+
+# ========== 批处理性能基准 ==========
+# 启动本地模拟 OpenAI 服务 (mock_openai_server.py)，通过 OPENAI_BASE_URL 驱动真实的处理流程：
+#   chinese: tactile_paving.pipeline 的 process_batch，中文问题清单和提示词
+#   english: 同一流程，英文问题清单和提示词 (LANGUAGE = "en")
+# 每组 (数据集大小, 并发数) 在独立子进程中运行，以便准确测量峰值内存。
+# 输出每秒处理图片数、单图延迟 p50/p95/p99、峰值 RSS 和事件循环延迟，
+# 可保存为 JSON 并与基线对比以发现性能退化。
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULT_MARKER = "BENCHMARK_RESULT "
+TARGETS = ("chinese", "english")
+
+sys.path.insert(0, REPO_DIR)  # tactile_paving 包位于仓库根目录
+sys.path.insert(0, BENCHMARK_DIR)
+from mock_openai_server import add_server_arguments  # noqa: E402
+from sample_dataset import build_dataset  # noqa: E402
+
+
+def parse_int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def peak_rss_mb(who):
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节；RUSAGE_CHILDREN 为最大的一个子进程
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile_summary(values, scale=1.0):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50 * scale, "p95": p95 * scale, "p99": p99 * scale, "max": max(values) * scale}
+
+
+async def monitor_loop_lag(samples, interval=0.01):
+    # 每隔 interval 秒醒来一次，实际醒来时间与预期的差值即事件循环被阻塞的时长
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+def load_pipeline_module(run_folder, data_folder, settings):
+    from tactile_paving import config, pipeline
+
+    config.apply_settings(pipeline, {
+        "DATA_FOLDER": data_folder,
+        "BATCH_OUTPUT_FOLDER": run_folder,
+        "CACHE_FOLDER": os.path.join(run_folder, "cache"),
+        "LANGUAGE": "en" if settings["target"] == "english" else "zh",
+        "CONCURRENT_REQUEST_LIMIT": settings["concurrency"],
+        "TASK_QUEUE_SIZE": max(pipeline.TASK_QUEUE_SIZE, settings["concurrency"] * 2),
+        "RATE_LIMIT_RPM": settings["rpm"],
+        "RATE_LIMIT_TPM": settings["tpm"],
+        "PREPROCESS_IMAGES": settings["preprocess"],
+    })
+    return pipeline
+
+
+def run_pipeline_target(settings, data_folder, run_folder):
+    module = load_pipeline_module(run_folder, data_folder, settings)
+    latencies = []
+
+    # 包装单图/多图分析函数，记录每张图片从开始读取到收到完整响应的耗时
+    analyze_image = module.analyze_image_with_gpt4o
+    analyze_pack = module.analyze_image_pack_with_gpt4o
+
+    async def timed_analyze_image(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await analyze_image(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    async def timed_analyze_pack(image_paths, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await analyze_pack(image_paths, *args, **kwargs)
+        finally:
+            latencies.extend([time.perf_counter() - start] * len(image_paths))
+
+    module.analyze_image_with_gpt4o = timed_analyze_image
+    module.analyze_image_pack_with_gpt4o = timed_analyze_pack
+
+    lag_samples = []
+
+    async def main():
+        monitor = asyncio.create_task(monitor_loop_lag(lag_samples))
+        start = time.perf_counter()
+        try:
+            await module.process_batch(use_cache=False, pack_size=settings["pack"])
+        finally:
+            elapsed = time.perf_counter() - start
+            monitor.cancel()
+        return elapsed
+
+    elapsed = asyncio.run(main())
+    state_counts = module.JobJournal.load(module.JOURNAL_PATH)
+    failed = sum(1 for entry in state_counts.values() if entry["state"] != "done")
+    return elapsed, latencies, lag_samples, failed
+
+
+def run_child(settings):
+    # 子进程入口: 运行一组配置，把结果以一行 JSON 输出到 stdout
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "sk-benchmark"
+    os.environ["OPENAI_BASE_URL"] = settings["base_url"]
+    run_folder = tempfile.mkdtemp(prefix="bench_run_", dir=settings["work_folder"])
+    try:
+        elapsed, latencies, lag_samples, failed = run_pipeline_target(settings, settings["data_folder"], run_folder)
+    finally:
+        shutil.rmtree(run_folder, ignore_errors=True)
+
+    result = {
+        "target": settings["target"],
+        "images": settings["images"],
+        "concurrency": settings["concurrency"],
+        "pack": settings["pack"],
+        "elapsed_seconds": elapsed,
+        "images_per_second": settings["images"] / elapsed if elapsed else None,
+        "failed": failed,
+        "latency_ms": percentile_summary(latencies, 1000),
+        "loop_lag_ms": percentile_summary(lag_samples, 1000),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+def start_server_process(args):
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, "mock_openai_server.py"), "--port", "0",
+               "--latency-distribution", args.latency_distribution, "--latency-ms", str(args.latency_ms),
+               "--latency-sigma", str(args.latency_sigma), "--stream-chunk-chars", str(args.stream_chunk_chars),
+               "--stream-chunk-delay-ms", str(args.stream_chunk_delay_ms), "--error-429-rate", str(args.error_429_rate),
+               "--error-5xx-rate", str(args.error_5xx_rate), "--malformed-rate", str(args.malformed_rate), "--retry-after-seconds", str(args.retry_after_seconds),
+               "--analysis-chars", str(args.analysis_chars)]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("MOCK_SERVER_URL "):
+        process.kill()
+        raise SystemExit("模拟服务启动失败。")
+    return process, line.split(" ", 1)[1].strip()
+
+
+def fetch_server_stats(base_url, reset=False):
+    import urllib.request
+    stats_url = base_url.rsplit("/v1", 1)[0] + ("/stats/reset" if reset else "/stats")
+    with urllib.request.urlopen(stats_url, data=b"" if reset else None, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def run_configuration(settings, verbose=False):
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(settings)],
+                               stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    if verbose:
+        print(completed.stdout)
+    return {"target": settings["target"], "images": settings["images"], "concurrency": settings["concurrency"],
+            "pack": settings["pack"], "error": f"子进程退出码 {completed.returncode}"}
+
+
+def format_number(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_results_table(results):
+    header = f"{'target':<8} {'images':>7} {'conc':>5} {'pack':>4} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} " \
+             f"{'RSS MB':>7} {'lag p99':>8} {'lag max':>8} {'429':>5} {'5xx':>5} {'failed':>6}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if "error" in result:
+            print(f"{result['target']:<8} {result['images']:>7} {result['concurrency']:>5} {result['pack']:>4}  ❌ {result['error']}")
+            continue
+        latency, lag, server = result["latency_ms"], result["loop_lag_ms"], result.get("server", {})
+        print(f"{result['target']:<8} {result['images']:>7} {result['concurrency']:>5} {result['pack']:>4} "
+              f"{format_number(result['images_per_second'], 2):>8} {format_number(latency['p50']):>8} "
+              f"{format_number(latency['p95']):>8} {format_number(latency['p99']):>8} {format_number(result['peak_rss_mb']):>7} "
+              f"{format_number(lag['p99']):>8} {format_number(lag['max']):>8} {server.get('errors_429', 0):>5} "
+              f"{server.get('errors_5xx', 0):>5} {result['failed']:>6}")
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    # 吞吐量下降或 p95 延迟上升超过 tolerance 时视为退化；返回退化的条目数
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(item["target"], item["images"], item["concurrency"], item["pack"]): item
+                    for item in json.load(f)["results"] if "error" not in item}
+    regressions = 0
+    for result in results:
+        previous = baseline.get((result["target"], result["images"], result["concurrency"], result["pack"]))
+        if previous is None or "error" in result:
+            continue
+        label = f"{result['target']} images={result['images']} concurrency={result['concurrency']} pack={result['pack']}"
+        if result["images_per_second"] < previous["images_per_second"] * (1 - tolerance):
+            regressions += 1
+            print(f"📉 {label}: 吞吐量 {previous['images_per_second']:.2f} -> {result['images_per_second']:.2f} 张/秒")
+        previous_p95, current_p95 = previous["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if previous_p95 and current_p95 and current_p95 > previous_p95 * (1 + tolerance):
+            regressions += 1
+            print(f"📈 {label}: p95 延迟 {previous_p95:.0f} -> {current_p95:.0f} ms")
+    print("✅ 未发现性能退化。" if not regressions else f"⚠️ 共发现 {regressions} 项性能退化 (容差 {tolerance:.0%})。")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用本地模拟服务对批处理流程进行性能测试")
+    parser.add_argument("--target", choices=TARGETS + ("both",), default="chinese", help="测试的问题清单语言 (默认: %(default)s)")
+    parser.add_argument("--images", type=parse_int_list, default=[200], help="数据集大小，逗号分隔 (默认: 200)")
+    parser.add_argument("--concurrency", type=parse_int_list, default=[10, 50, 100], help="并发数，逗号分隔 (默认: 10,50,100)")
+    parser.add_argument("--pack", type=int, default=1, help="每次请求打包的图片数 (默认: %(default)s)")
+    parser.add_argument("--rpm", type=int, default=1_000_000, help="限流器的 RPM 设置，默认足够大以只测量流程本身")
+    parser.add_argument("--tpm", type=int, default=1_000_000_000, help="限流器的 TPM 设置")
+    parser.add_argument("--no-preprocess", action="store_true", help="跳过图片预处理，直接上传原图")
+    parser.add_argument("--work-folder", help="数据集和运行输出的临时文件夹 (默认: 系统临时目录)")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前保存的 JSON 结果对比，发现退化时以退出码 1 结束")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="判定退化的相对容差 (默认: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="显示被测脚本的输出")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    targets = TARGETS if args.target == "both" else (args.target,)
+    if args.work_folder:
+        os.makedirs(args.work_folder, exist_ok=True)
+    work_folder = tempfile.mkdtemp(prefix="tactile_paving_bench_", dir=args.work_folder)
+    server_process, base_url = start_server_process(args)
+    print(f"🧪 模拟服务: {base_url} ({args.latency_distribution}, 平均 {args.latency_ms:g} ms，"
+          f"429 {args.error_429_rate:.0%}，5xx {args.error_5xx_rate:.0%})")
+    results = []
+    try:
+        for num_images in args.images:
+            data_folder = build_dataset(os.path.join(work_folder, f"data_{num_images}"), num_images)
+            for target in targets:
+                for concurrency in args.concurrency:
+                    settings = {"target": target, "images": num_images, "concurrency": concurrency, "pack": args.pack,
+                                "rpm": args.rpm, "tpm": args.tpm, "preprocess": not args.no_preprocess,
+                                "base_url": base_url, "data_folder": data_folder, "work_folder": work_folder}
+                    print(f"▶️ {target}: {num_images} 张图片，并发 {concurrency} ...", flush=True)
+                    fetch_server_stats(base_url, reset=True)
+                    result = run_configuration(settings, verbose=args.verbose)
+                    result["server"] = fetch_server_stats(base_url)
+                    results.append(result)
+    finally:
+        server_process.terminate()
+        server_process.wait()
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    print()
+    print_results_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "settings": vars(args), "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n📂 结果已保存到: {args.output}")
+    if args.compare and compare_with_baseline(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+
+# ========== 基准与检查脚本共用的测试数据 ==========
+# 循环复制 data/ 中的示例图片，并在 JPEG 结束标记后追加不同的字节，使每张图片内容唯一 (不命中任何缓存)。
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+SAMPLE_IMAGE_FOLDER = os.path.join(REPO_DIR, "data")
+
+
+def build_dataset(folder, num_images, prefix="bench"):
+    sample_paths = sorted(os.path.join(SAMPLE_IMAGE_FOLDER, name) for name in os.listdir(SAMPLE_IMAGE_FOLDER)
+                          if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    if not sample_paths:
+        raise SystemExit(f"在 {SAMPLE_IMAGE_FOLDER} 中未找到示例图片。")
+    samples = []
+    for path in sample_paths:
+        with open(path, "rb") as f:
+            samples.append((os.path.splitext(path)[1], f.read()))
+    os.makedirs(folder, exist_ok=True)
+    for index in range(num_images):
+        extension, data = samples[index % len(samples)]
+        with open(os.path.join(folder, f"{prefix}_{index:06d}{extension}"), "wb") as f:
+            f.write(data + index.to_bytes(8, "big"))
+    return folder
@@ -0,0 +1,2 @@
+# 盲道图片评估工具包。命令行用法见 cli.py (python -m tactile_paving --help)。
+# 这里不导入子模块，导入本包本身几乎没有开销；批处理流程在 pipeline.py 中，默认配置在 settings.py 中。
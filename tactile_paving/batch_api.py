@@ -0,0 +1,116 @@
+import os
+import json
+import asyncio
+
+# ========== OpenAI Batch API ==========
+# 把请求写成 JSONL 分片文件，上传后由 Batch API 离线处理 (费用减半，不受 RPM 限制)。
+# 单个分片需同时满足 Batch API 的请求数和文件大小上限。
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS_PER_FILE = 50000
+BATCH_MAX_FILE_BYTES = 200 * 1024 * 1024
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def write_batch_shards(requests, shard_folder, max_requests=BATCH_MAX_REQUESTS_PER_FILE,
+                       max_bytes=BATCH_MAX_FILE_BYTES, on_skipped=None):
+    # requests: 逐个产出 (custom_id, body) 的可迭代对象，返回写出的分片路径列表；
+    # 单个请求超过文件大小上限时跳过，并调用 on_skipped(custom_id, error) 让调用方更新任务状态
+    os.makedirs(shard_folder, exist_ok=True)
+    shard_paths = []
+    shard_file = None
+    shard_requests = 0
+    shard_bytes = 0
+    try:
+        for custom_id, body in requests:
+            line = json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                              ensure_ascii=False).encode("utf-8") + b"\n"
+            if len(line) > max_bytes:
+                print(f"⚠️ 请求 {custom_id} 超过单个批处理文件的大小上限，已跳过。")
+                if on_skipped is not None:
+                    on_skipped(custom_id, "请求超过单个批处理文件的大小上限")
+                continue
+            if shard_file is None or shard_requests >= max_requests or shard_bytes + len(line) > max_bytes:
+                if shard_file is not None:
+                    shard_file.close()
+                shard_path = os.path.join(shard_folder, f"batch_requests_{len(shard_paths):04d}.jsonl")
+                shard_file = open(shard_path, "wb")
+                shard_paths.append(shard_path)
+                shard_requests = 0
+                shard_bytes = 0
+            shard_file.write(line)
+            shard_requests += 1
+            shard_bytes += len(line)
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+    return shard_paths
+
+
+def load_batch_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_batch_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+async def submit_batch_shard(client, shard_path, completion_window="24h"):
+    with open(shard_path, "rb") as f:
+        uploaded_file = await client.files.create(file=f, purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=uploaded_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=completion_window,
+        metadata={"shard": os.path.basename(shard_path)},
+    )
+    return batch.id
+
+
+async def wait_for_batches(client, batch_ids, poll_interval_seconds=60, on_status=None):
+    finished = {}
+    while len(finished) < len(batch_ids):
+        for batch_id in batch_ids:
+            if batch_id in finished:
+                continue
+            batch = await client.batches.retrieve(batch_id)
+            if on_status is not None:
+                on_status(batch)
+            if batch.status in BATCH_TERMINAL_STATUSES:
+                finished[batch_id] = batch
+        if len(finished) < len(batch_ids):
+            await asyncio.sleep(poll_interval_seconds)
+    return finished
+
+
+async def iter_batch_results(client, batch):
+    # 逐个产出 (custom_id, 响应文本, 错误信息)，成功与失败的请求分别来自输出文件和错误文件
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        file_content = await client.files.content(file_id)
+        for line in file_content.text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code", 200) != 200:
+                error = record.get("error") or (response.get("body") or {}).get("error")
+                yield custom_id, None, json.dumps(error, ensure_ascii=False)
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                yield custom_id, None, "批处理结果格式不正确"
+                continue
+            yield custom_id, content, None
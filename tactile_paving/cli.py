@@ -0,0 +1,146 @@
+import os
+import argparse
+
+from . import config, settings
+
+# ========== 命令行入口 ==========
+# python -m tactile_paving [全局选项] {run,test,report,export-csv,merge} [子命令选项]
+# 配置先应用到 settings (只依赖标准库)；只有调用 API 的 run 和 test 才导入 pipeline (以及 openai、numpy、tqdm)，
+# report、export-csv、merge 和 run --processes 的父进程只需要 result_commands。
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tactile_paving", description="使用 GPT-4o 评估盲道图片")
+    parser.add_argument("--config", metavar="PATH", help=f"配置文件 (.toml 或 .json)，也可用 {config.CONFIG_PATH_ENV} 环境变量指定")
+    parser.add_argument("--language", choices=["zh", "en"], help="问题清单和提示词的语言 (默认: zh)")
+    parser.add_argument("--questions-file", metavar="PATH", help="自定义问题清单文件，每行 \"问题ID 问题文本\"")
+    parser.add_argument("--data-folder", metavar="PATH", help="待评估图片所在的文件夹")
+    parser.add_argument("--output-folder", metavar="PATH", help="批处理结果的输出文件夹 (数据库、任务日志和报告都放在这里)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="批量评估 DATA_FOLDER 中的所有图片")
+    run_parser.add_argument("--no-cache", action="store_true", help="忽略响应缓存，强制重新调用API")
+    run_parser.add_argument("--resume", action="store_true", help="根据任务日志续跑，只处理未完成或失败的图片")
+    run_parser.add_argument("--batch-api", action="store_true", help="使用 OpenAI Batch API 离线批量处理 (费用减半，24小时内完成)")
+    run_parser.add_argument("--legacy-output", action="store_true", help="按旧版格式为每张图片单独保存 CSV 和 JSON 文件，而不写入结果数据库")
+    run_parser.add_argument("--only-changed", action="store_true", help="只为每张图片评估新增或内容变更的问题，并合并到结果数据库中已有的记录")
+    run_parser.add_argument("--compact", action="store_true", help="使用精简响应格式: 只返回每个问题的判断 (严格 JSON Schema)，分析仅用于判断为 1 的问题")
+    run_parser.add_argument("--dedupe", action="store_true", help="用感知哈希查找近重复图片，每组只评估一张并把结果复制给其余图片")
+    run_parser.add_argument("--vote", action="store_true", help="对判断为 -1 的问题重新采样最多 VOTE_MAX_SAMPLES 次，按多数票得出判断 (不支持 --batch-api)")
+    run_parser.add_argument("--pack", type=int, metavar="N", help="每次请求打包评估的图片数 (默认: PACK_SIZE)")
+    shard_group = run_parser.add_mutually_exclusive_group()
+    shard_group.add_argument("--shard", metavar="i/N", help="只处理第 i 个分片 (从 0 开始，共 N 个)，结果写入 SHARDS_FOLDER 下的分片文件夹，用于多进程或多台机器并行")
+    shard_group.add_argument("--processes", type=int, metavar="N",
+                             help="在本机启动 N 个分片进程并在结束后合并结果；设置 OPENAI_API_KEYS (逗号分隔) 时按轮转为各进程分配密钥")
+
+    test_parser = subparsers.add_parser("test", help="评估单张图片并打印完整响应，结果保存到 OUTPUT_FOLDER")
+    test_parser.add_argument("--image", metavar="PATH", help="测试图片 (默认: TEST_MODE_IMAGE_PATH，未设置时使用 DATA_FOLDER 中的第一张图片)")
+    test_parser.add_argument("--questions", type=int, metavar="N", help="只评估前 N 个问题 (默认: NUM_TEST_QUESTIONS)")
+    test_parser.add_argument("--compact", action="store_true", help="使用精简响应格式")
+
+    report_parser = subparsers.add_parser("report", help="根据已有结果生成汇总报告 (CSV、图表和 HTML)")
+    report_parser.add_argument("--legacy-output", action="store_true", help="从旧版逐图 CSV 而不是结果数据库读取")
+    report_parser.add_argument("--db", metavar="PATH", help="结果数据库路径 (默认: RESULT_STORE_PATH)")
+    report_parser.add_argument("--output", metavar="PATH", help="报告输出文件夹 (默认: REPORT_FOLDER)")
+
+    subparsers.add_parser("export-csv", help="把结果数据库导出为旧版的逐图 CSV/JSON 文件")
+
+    merge_parser = subparsers.add_parser("merge", help="把各分片的结果合并到主结果数据库和任务日志")
+    merge_parser.add_argument("shard_folders", nargs="*", metavar="FOLDER", help="分片文件夹 (默认: SHARDS_FOLDER 下的所有分片)")
+    merge_parser.add_argument("--prune-removed", action="store_true", help="合并后删除已从问题清单中移除的问题的旧判断 (分片以 --only-changed 运行时使用)")
+    return parser
+
+
+def shard_argv(args, shard):
+    # 子进程沿用父进程的全局选项和 run 选项，只把 --processes 换成 --shard
+    argv = []
+    for option, value in (("--config", args.config), ("--language", args.language), ("--questions-file", args.questions_file),
+                          ("--data-folder", args.data_folder), ("--output-folder", args.output_folder)):
+        if value is not None:
+            argv += [option, value]
+    argv += ["run", "--shard", f"{shard.index}/{shard.count}"]
+    for flag in ("no_cache", "resume", "batch_api", "legacy_output", "only_changed", "compact", "dedupe", "vote"):
+        if getattr(args, flag):
+            argv.append("--" + flag.replace("_", "-"))
+    if args.pack is not None:
+        argv += ["--pack", str(args.pack)]
+    return argv
+
+
+def run_local_shards(args):
+    from .sharding import launch_local_shards
+    from .result_commands import merge_shards
+
+    api_keys = [key.strip() for key in os.environ.get("OPENAI_API_KEYS", "").split(",") if key.strip()]
+    print(f"🧩 在本机启动 {args.processes} 个分片进程" + (f"，共 {len(api_keys)} 个 API 密钥" if api_keys else "") + "...")
+    # 各进程平分本机的 CPU 用于图片预处理，除非单独配置了 PREPROCESS_WORKERS
+    extra_env = {"TACTILE_PAVING_PREPROCESS_WORKERS": str(max(1, (os.cpu_count() or 1) // args.processes))}
+    return_codes = launch_local_shards(lambda shard: shard_argv(args, shard), args.processes,
+                                       settings.SHARDS_FOLDER, api_keys=api_keys,
+                                       extra_env={name: value for name, value in extra_env.items() if name not in os.environ})
+    failed_count = sum(1 for code in return_codes.values() if code != 0)
+    # 旧判断只在父进程中、所有分片都成功结束后清理一次
+    merge_shards(settings, prune_removed=args.only_changed and not failed_count)
+    if failed_count:
+        print(f"⚠️ {failed_count} 个分片进程异常退出，请查看分片日志，可用 --resume 重新运行。")
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    overrides = {
+        "LANGUAGE": args.language,
+        "QUESTIONS_FILE": args.questions_file,
+        "DATA_FOLDER": args.data_folder,
+        "BATCH_OUTPUT_FOLDER": args.output_folder,
+    }
+    if getattr(args, "compact", False):
+        overrides["RESPONSE_MODE"] = "compact"
+    if args.command == "report":
+        overrides["RESULT_STORE_PATH"] = args.db
+        overrides["REPORT_FOLDER"] = args.output
+    if args.command == "run":
+        overrides["SHARD"] = args.shard
+    config.configure(settings, args.config, overrides)
+
+    if args.command in ("export-csv", "report", "merge"):
+        from . import result_commands
+
+        if args.command == "export-csv":
+            result_commands.export_result_store(settings)
+        elif args.command == "report":
+            result_commands.report_result_store(settings, legacy_output=args.legacy_output)
+        else:
+            result_commands.merge_shards(settings, args.shard_folders, prune_removed=args.prune_removed)
+        return
+    if args.command == "run" and args.processes:
+        os.makedirs(settings.BATCH_OUTPUT_FOLDER, exist_ok=True)
+        run_local_shards(args)
+        return
+
+    import asyncio
+    from . import pipeline  # 导入时复制 settings 中已生效的配置
+
+    if args.command == "test":
+        os.makedirs(pipeline.OUTPUT_FOLDER, exist_ok=True)
+        num_questions = args.questions if args.questions is not None else pipeline.NUM_TEST_QUESTIONS
+        print("🧪 测试模式: 只处理单张图片。")
+        if num_questions:
+            print(f"   仅处理前 {num_questions} 个问题。")
+        asyncio.run(pipeline.process_single_image_test_mode(args.image, num_questions))
+    else:
+        os.makedirs(pipeline.BATCH_OUTPUT_FOLDER, exist_ok=True)
+        pipeline.enter_shard()
+        use_cache = pipeline.USE_CACHE and not args.no_cache
+        dedupe = pipeline.NEAR_DUPLICATE_DETECTION or args.dedupe
+        vote = pipeline.VOTE_UNDETERMINED or args.vote
+        if args.batch_api:
+            if vote:
+                print("⚠️ Batch API 模式不支持投票复查，判断为 -1 的问题将保持不变。")
+            asyncio.run(pipeline.process_batch_api(use_cache=use_cache, resume=args.resume, legacy_output=args.legacy_output,
+                                                   only_changed=args.only_changed, dedupe=dedupe))
+        else:
+            pack_size = args.pack if args.pack is not None else pipeline.PACK_SIZE
+            asyncio.run(pipeline.process_batch(use_cache=use_cache, resume=args.resume, pack_size=pack_size, legacy_output=args.legacy_output,
+                                               only_changed=args.only_changed, dedupe=dedupe, vote=vote))
@@ -0,0 +1,198 @@
+import os
+import time
+import importlib
+import importlib.util
+from collections import namedtuple
+
+# ========== OpenAI 客户端 ==========
+# 第一次调用 API 时才创建客户端，导入本包 (例如在工作进程或测试中) 不需要 API 密钥。
+# OPENAI_BASE_URL 等环境变量由 openai 库自行读取，可指向本地的模拟服务。
+#
+# 客户端使用显式配置的 httpx 连接池：连接数与并发数挂钩，连接/读取/写入/等待连接的超时分开设置
+# (上传数 MB 的 base64 请求体需要较长的写入超时，而连接超时应当很短)，HTTP/2 需显式开启 (HTTP2 = True) 并安装 h2。
+# PoolStatsTransport 包装底层传输，统计进行中的请求、新建连接次数和等待连接的时间，
+# 用于判断提高并发数时连接池是否成为瓶颈。
+
+HttpSettings = namedtuple("HttpSettings", ["http2", "max_connections", "max_keepalive_connections", "keepalive_expiry",
+                                           "connect_timeout", "read_timeout", "write_timeout", "pool_timeout"])
+
+_client = None
+_pool_stats = None
+
+
+def openai_httpx():
+    # 传输层、超时等对象必须来自 openai 实际使用的 httpx 模块 (部分 openai 版本依赖其分支 httpx2)
+    from openai import DefaultAsyncHttpxClient
+    return importlib.import_module(DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0])
+
+
+def http2_available():
+    return importlib.util.find_spec("h2") is not None
+
+
+class PoolStats:
+    def __init__(self, transport=None):
+        self.transport = transport
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.connections_opened = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+        self.connect_total = 0.0
+
+    def open_connections(self):
+        # 返回 (已打开的连接数, 其中空闲的连接数)；读取的是 httpcore 连接池的内部状态，取不到时返回 (None, None)
+        pool = getattr(self.transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return None, None
+        return len(connections), sum(1 for connection in connections if connection.is_idle())
+
+    def snapshot(self):
+        open_count, idle_count = self.open_connections()
+        return {
+            "requests": self.requests,
+            "active": self.active,
+            "peak_active": self.peak_active,
+            "connections_opened": self.connections_opened,
+            "connections_open": open_count,
+            "connections_idle": idle_count,
+            "pool_wait_mean": self.pool_wait_total / self.requests if self.requests else 0.0,
+            "pool_wait_max": self.pool_wait_max,
+            "connect_mean": self.connect_total / self.connections_opened if self.connections_opened else 0.0,
+        }
+
+    def prometheus_gauges(self):
+        # 返回 [(指标名, 类型, 值)]，由 MetricsRecorder 写入 Prometheus 指标文件
+        snapshot = self.snapshot()
+        gauges = [
+            ("http_requests_total", "counter", snapshot["requests"]),
+            ("http_requests_active", "gauge", snapshot["active"]),
+            ("http_requests_active_peak", "gauge", snapshot["peak_active"]),
+            ("http_connections_opened_total", "counter", snapshot["connections_opened"]),
+            ("http_pool_wait_seconds_total", "counter", round(self.pool_wait_total, 6)),
+            ("http_pool_wait_seconds_max", "gauge", round(self.pool_wait_max, 6)),
+        ]
+        if snapshot["connections_open"] is not None:
+            gauges += [("http_connections_open", "gauge", snapshot["connections_open"]),
+                       ("http_connections_idle", "gauge", snapshot["connections_idle"])]
+        return gauges
+
+    def summary_line(self):
+        snapshot = self.snapshot()
+        parts = [f"请求 {snapshot['requests']}，峰值并发 {snapshot['peak_active']}，新建连接 {snapshot['connections_opened']}"]
+        if snapshot["connections_open"] is not None:
+            parts.append(f"当前连接 {snapshot['connections_open']} (空闲 {snapshot['connections_idle']})")
+        parts.append(f"等待连接 平均 {snapshot['pool_wait_mean'] * 1000:.1f} ms / 最长 {snapshot['pool_wait_max'] * 1000:.1f} ms")
+        return "，".join(parts)
+
+
+def create_pool_stats_transport(settings):
+    httpx = openai_httpx()
+
+    class CountingStream(httpx.AsyncByteStream):
+        # 流式响应读完或关闭时才算请求结束
+        def __init__(self, stream, on_close):
+            self._stream = stream
+            self._on_close = on_close
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                if self._on_close is not None:
+                    self._on_close()
+                    self._on_close = None
+
+    class PoolStatsTransport(httpx.AsyncBaseTransport):
+        def __init__(self, transport, stats):
+            self._transport = transport
+            self.stats = stats
+
+        async def handle_async_request(self, request):
+            stats = self.stats
+            started = time.perf_counter()
+            timings = {}
+
+            async def trace(event_name, info):
+                # httpcore 的事件: 新建连接时有 connection.connect_tcp.*，拿到连接后开始发送请求头
+                if event_name.startswith("connection.") and event_name.endswith(".started"):
+                    timings.setdefault("connect_started", time.perf_counter())
+                elif event_name.startswith("connection.") and event_name.endswith(".complete"):
+                    timings["connect_complete"] = time.perf_counter()
+                elif event_name.endswith("send_request_headers.started") and "headers_started" not in timings:
+                    timings["headers_started"] = time.perf_counter()
+                if previous_trace is not None:
+                    await previous_trace(event_name, info)
+
+            previous_trace = request.extensions.get("trace")
+            request.extensions["trace"] = trace
+            stats.requests += 1
+            stats.active += 1
+            stats.peak_active = max(stats.peak_active, stats.active)
+
+            def on_close():
+                stats.active -= 1
+
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                on_close()
+                raise
+            finally:
+                connect_seconds = 0.0
+                if "connect_started" in timings:
+                    stats.connections_opened += 1
+                    connect_seconds = timings.get("connect_complete", timings["connect_started"]) - timings["connect_started"]
+                    stats.connect_total += connect_seconds
+                if "headers_started" in timings:
+                    pool_wait = max(0.0, timings["headers_started"] - started - connect_seconds)
+                    stats.pool_wait_total += pool_wait
+                    stats.pool_wait_max = max(stats.pool_wait_max, pool_wait)
+            return httpx.Response(status_code=response.status_code, headers=response.headers,
+                                  stream=CountingStream(response.stream, on_close), extensions=response.extensions)
+
+        async def aclose(self):
+            await self._transport.aclose()
+
+    use_http2 = settings.http2 and http2_available()
+    if settings.http2 and not use_http2:
+        print("⚠️ 未安装 h2 (pip install 'httpx[http2]')，改用 HTTP/1.1。")
+    limits = httpx.Limits(max_connections=settings.max_connections, max_keepalive_connections=settings.max_keepalive_connections,
+                          keepalive_expiry=settings.keepalive_expiry)
+    transport = httpx.AsyncHTTPTransport(http2=use_http2, limits=limits, retries=0)
+    return PoolStatsTransport(transport, PoolStats(transport)), use_http2
+
+
+def get_client(http_settings=None):
+    global _client, _pool_stats
+    if _client is None:
+        api_key = os.environ.get("OPENAI_API_KEY") # 从环境变量读取API密钥
+        if not api_key:
+            raise ValueError("请设置 OPENAI_API_KEY 环境变量。例如：export OPENAI_API_KEY='your_api_key_here'")
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        httpx = openai_httpx()
+
+        print("Initializing AsyncOpenAI client...")
+        client_options = {}
+        if http_settings is not None:
+            transport, use_http2 = create_pool_stats_transport(http_settings)
+            _pool_stats = transport.stats
+            # openai 会按请求传入超时，覆盖 http_client 上的设置，因此超时需要同时交给 AsyncOpenAI
+            client_options["timeout"] = httpx.Timeout(connect=http_settings.connect_timeout, read=http_settings.read_timeout,
+                                                      write=http_settings.write_timeout, pool=http_settings.pool_timeout)
+            client_options["http_client"] = DefaultAsyncHttpxClient(transport=transport, timeout=client_options["timeout"])
+            print(f"   连接池: 最多 {http_settings.max_connections} 个连接，{'HTTP/2' if use_http2 else 'HTTP/1.1'}，"
+                  f"超时 连接 {http_settings.connect_timeout}s / 读取 {http_settings.read_timeout}s / 写入 {http_settings.write_timeout}s")
+        _client = AsyncOpenAI(api_key=api_key, max_retries=0, **client_options) # 重试由 AdaptiveRateLimiter 统一负责
+    return _client
+
+
+def get_pool_stats():
+    # 客户端尚未创建或未使用自定义连接池时返回 None
+    return _pool_stats
@@ -0,0 +1,103 @@
+import os
+import json
+
+# ========== 配置加载 ==========
+# settings.py 中的大写变量是默认配置，可以依次被以下来源覆盖 (后者优先):
+#   1. 配置文件: --config 参数或 TACTILE_PAVING_CONFIG 环境变量指定的 .toml 或 .json 文件，键名与变量名相同 (不区分大小写)
+#   2. 环境变量: TACTILE_PAVING_<变量名>，例如 TACTILE_PAVING_DATA_FOLDER=/data/survey
+#   3. 命令行参数: --language、--data-folder 等
+# 只依赖标准库 (TOML 需要 Python 3.11 的 tomllib)。
+
+ENV_PREFIX = "TACTILE_PAVING_"
+CONFIG_PATH_ENV = "TACTILE_PAVING_CONFIG"
+
+# 由其他路径推导出的路径：只修改 BATCH_OUTPUT_FOLDER 或 CACHE_FOLDER 时，下面的路径跟着移动，除非单独指定
+DERIVED_PATHS = {
+    "JOURNAL_PATH": ("BATCH_OUTPUT_FOLDER", "_job_journal.jsonl"),
+    "BATCH_API_FOLDER": ("BATCH_OUTPUT_FOLDER", "_batch_api"),
+    "NEAR_DUPLICATES_PATH": ("BATCH_OUTPUT_FOLDER", "_near_duplicates.csv"),
+    "RESULT_STORE_PATH": ("BATCH_OUTPUT_FOLDER", "results.sqlite"),
+    "REPORT_FOLDER": ("BATCH_OUTPUT_FOLDER", "report"),
+    "METRICS_PATH": ("BATCH_OUTPUT_FOLDER", "_metrics.jsonl"),
+    "SHARDS_FOLDER": ("BATCH_OUTPUT_FOLDER", "_shards"),
+    "PROMETHEUS_METRICS_PATH": ("BATCH_OUTPUT_FOLDER", "metrics.prom"),
+    "PREPROCESSED_CACHE_FOLDER": ("CACHE_FOLDER", "images"),
+    "IMAGE_HASH_CACHE_PATH": ("CACHE_FOLDER", "image_hashes.json"),
+}
+
+
+def config_names(module):
+    return {name for name in vars(module) if name.isupper() and not name.startswith("_")}
+
+
+def load_config_file(path):
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"配置文件 {path} 的顶层必须是键值对")
+    return {key.upper(): value for key, value in data.items()}
+
+
+def coerce_env_value(raw_value, default):
+    # 按默认值的类型解析环境变量；默认值为 None 时，"none"/"null" 表示 None，其余按 JSON 或原始字符串解析
+    if isinstance(default, bool):
+        if raw_value.strip().lower() in ("1", "true", "yes", "on"):
+            return True
+        if raw_value.strip().lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"无法解析布尔值: {raw_value}")
+    if isinstance(default, int):
+        return int(raw_value)
+    if isinstance(default, float):
+        return float(raw_value)
+    if isinstance(default, str):
+        return raw_value
+    if raw_value.strip().lower() in ("none", "null", ""):
+        return None
+    try:
+        return json.loads(raw_value)
+    except json.JSONDecodeError:
+        return raw_value
+
+
+def load_env_settings(module, environ=None):
+    environ = os.environ if environ is None else environ
+    names = config_names(module)
+    settings = {}
+    for key, raw_value in environ.items():
+        if not key.startswith(ENV_PREFIX) or key == CONFIG_PATH_ENV:
+            continue
+        name = key[len(ENV_PREFIX):]
+        if name in names:
+            settings[name] = coerce_env_value(raw_value, getattr(module, name))
+    return settings
+
+
+def apply_settings(module, settings):
+    # 把 settings 写入模块的全局变量，并重新计算未单独指定的推导路径
+    names = config_names(module)
+    unknown = sorted(set(settings) - names)
+    if unknown:
+        raise ValueError(f"未知的配置项: {', '.join(unknown)}")
+    for name, value in settings.items():
+        setattr(module, name, value)
+    for name, (base_name, leaf) in DERIVED_PATHS.items():
+        if name in names and name not in settings and base_name in settings:
+            setattr(module, name, os.path.join(getattr(module, base_name), leaf))
+
+
+def configure(module, config_path=None, overrides=None):
+    # 依次合并配置文件、环境变量和命令行覆盖项，返回最终生效的设置
+    settings = {}
+    config_path = config_path or os.environ.get(CONFIG_PATH_ENV)
+    if config_path:
+        settings.update(load_config_file(config_path))
+    settings.update(load_env_settings(module))
+    settings.update({name: value for name, value in (overrides or {}).items() if value is not None})
+    apply_settings(module, settings)
+    return settings
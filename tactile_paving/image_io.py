@@ -0,0 +1,148 @@
+import os
+import mmap
+import asyncio
+import binascii
+import contextlib
+from collections import deque
+
+# ========== 图片读取与请求体内存控制 ==========
+# map_image_file 用 mmap 映射图片文件，计算哈希和解码时直接读取映射的页面，不必先把整个文件复制成 bytes。
+# encode_data_url 分块把图片编码进预先分配好大小的缓冲区，直接得到最终的 data URL，
+# 不再依次生成 base64 bytes、str 和拼接后的 f-string 三份完整副本；在线程池中执行，不阻塞事件循环。
+# PayloadBudget 与限制请求数的 semaphore 配合使用，限制已读入内存的图片和请求体占用的总内存，
+# 无论图片多大、并发数多高，内存占用都有上限。每个请求按原图数据、data URL
+# 和序列化后的 JSON 请求体各一份估算 (约为原图的 3.7 倍)；等待的请求按到达顺序放行，大请求不会被小请求一直插队。
+# 调用方在读取图片之前按文件大小预留 (file_payload_size)，读取后用 PayloadReservation.resize 按实际数据调整，
+# 直到请求结束才释放，因此等待限流、并发名额和重试退避期间已读入的图片也计入预算。
+
+ENCODE_CHUNK_BYTES = 3 * 256 * 1024  # 3 的倍数，各块的 base64 结果可以直接拼接
+ENCODED_COPIES = 2  # 发送期间同时存在的 base64 副本数: data URL 字符串和序列化后的 JSON 请求体
+
+
+def base64_size(num_bytes):
+    return (num_bytes + 2) // 3 * 4
+
+
+@contextlib.contextmanager
+def map_image_file(image_path):
+    # 产出只读的 mmap 对象 (支持缓冲区协议，也可以像文件一样 read/seek)；空文件无法映射，产出 b""
+    with open(image_path, "rb") as image_file:
+        if os.fstat(image_file.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def encode_data_url(data, mime_type):
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    buffer = bytearray(len(prefix) + base64_size(len(data)))
+    buffer[:len(prefix)] = prefix
+    view = memoryview(data)
+    position = len(prefix)
+    for start in range(0, len(view), ENCODE_CHUNK_BYTES):
+        encoded = binascii.b2a_base64(view[start:start + ENCODE_CHUNK_BYTES], newline=False)
+        buffer[position:position + len(encoded)] = encoded
+        position += len(encoded)
+    return buffer.decode("ascii")
+
+
+async def encode_data_urls(images):
+    # images: [PreparedImage, ...]；返回对应的 data URL 列表
+    return await asyncio.to_thread(lambda: [encode_data_url(image.data, image.mime_type) for image in images])
+
+
+def estimated_payload_size(num_bytes):
+    # 图片数据 + 发送期间的各份 base64 副本
+    return num_bytes + ENCODED_COPIES * base64_size(num_bytes)
+
+
+def payload_size(images):
+    # 估算一次请求从读取图片到发送完成期间占用的内存
+    return sum(estimated_payload_size(len(image.data)) for image in images)
+
+
+def file_payload_size(image_paths):
+    # 读取之前按文件大小估算；预处理后的图片通常更小，读取后再用 resize 调整
+    total = 0
+    for image_path in image_paths:
+        try:
+            total += estimated_payload_size(os.path.getsize(image_path))
+        except OSError:
+            pass  # 文件不存在等错误在读取时报告
+    return total
+
+
+class PayloadReservation:
+    def __init__(self, budget, num_bytes):
+        self.budget = budget
+        self.num_bytes = num_bytes
+
+    def resize(self, num_bytes):
+        # 缩小时立即放行排队的请求；增大 (预处理后比原文件大，少见) 时不再等待，直接计入
+        delta = num_bytes - self.num_bytes
+        self.num_bytes = num_bytes
+        self.budget._acquire(delta)
+        if delta < 0:
+            self.budget._wake_waiters()
+
+
+class PayloadBudget:
+    def __init__(self, max_bytes=None):
+        # max_bytes 为 None 时不限制，只统计
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self._waiters = deque()  # 按到达顺序排队的 (字节数, future)
+
+    def _fits(self, num_bytes):
+        # 单个请求超过总预算时，等其他请求全部结束后单独发送，不会永远等待
+        return self.max_bytes is None or self.in_use == 0 or self.in_use + num_bytes <= self.max_bytes
+
+    def _acquire(self, num_bytes):
+        self.in_use += num_bytes
+        self.peak = max(self.peak, self.in_use)
+
+    def _wake_waiters(self):
+        # 只放行队首的请求，队首放不下时后面较小的请求也继续等待
+        while self._waiters and self._fits(self._waiters[0][0]):
+            num_bytes, future = self._waiters.popleft()
+            if not future.done():
+                self._acquire(num_bytes)
+                future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, num_bytes):
+        if self._waiters or not self._fits(num_bytes):
+            waiter = (num_bytes, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                if waiter[1].cancelled():
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    self._wake_waiters()
+                else:
+                    # 已被放行但在恢复执行前被取消，归还预算
+                    self.in_use -= num_bytes
+                    self._wake_waiters()
+                raise
+        else:
+            self._acquire(num_bytes)
+        reservation = PayloadReservation(self, num_bytes)
+        try:
+            yield reservation
+        finally:
+            self.in_use -= reservation.num_bytes
+            self._wake_waiters()
+
+    def prometheus_gauges(self):
+        gauges = [("payload_bytes_in_flight", "gauge", self.in_use), ("payload_bytes_in_flight_peak", "gauge", self.peak)]
+        if self.max_bytes is not None:
+            gauges.append(("payload_bytes_budget", "gauge", self.max_bytes))
+        return gauges
+
+    def summary_line(self):
+        budget = f" / 预算 {self.max_bytes / 1024 / 1024:.0f} MB" if self.max_bytes is not None else ""
+        return f"峰值 {self.peak / 1024 / 1024:.1f} MB{budget}"
@@ -0,0 +1,63 @@
+import os
+import asyncio
+
+# ========== 流式任务调度 ==========
+# 目录遍历是惰性的 (os.scandir)，图片经有界队列交给固定数量的 worker，
+# 因此内存占用与数据集大小无关，第一批结果也能立即产出。
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+
+def iter_image_files(root_folder, recursive=True):
+    # 逐个产出相对于 root_folder 的图片路径，支持 "地铁站 110/万寿寺" 这样的站点子目录
+    pending_dirs = [""]
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        try:
+            with os.scandir(os.path.join(root_folder, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not entry.name.startswith('.'):
+                            pending_dirs.append(rel_path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield rel_path
+        except OSError as e:
+            print(f"遍历目录 {os.path.join(root_folder, rel_dir)} 时出错: {e}")
+
+
+def image_output_stem(rel_path):
+    # 子目录中的图片把路径分隔符替换为 "__"，避免不同站点的同名图片互相覆盖
+    return os.path.splitext(rel_path)[0].replace(os.sep, "__").replace("/", "__")
+
+
+async def run_bounded_pipeline(items, worker_fn, num_workers, queue_size=None, on_result=None):
+    queue = asyncio.Queue(maxsize=queue_size or num_workers * 2)
+    done_marker = object()
+
+    async def producer():
+        for item in items:
+            await queue.put(item)
+        for _ in range(num_workers):
+            await queue.put(done_marker)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is done_marker:
+                return
+            try:
+                result = await worker_fn(item)
+            except Exception as e:
+                print(f"处理 {item} 时发生意外的异步错误: {e}")
+                result = None
+            if on_result is not None:
+                on_result(item, result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+    producer_task = asyncio.create_task(producer())
+    try:
+        await asyncio.gather(producer_task, *workers)
+    finally:
+        for task in [producer_task, *workers]:
+            task.cancel()
@@ -0,0 +1,156 @@
+import io
+import os
+import json
+import math
+import mmap
+import hashlib
+from collections import namedtuple
+
+from .image_io import map_image_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安装 Pillow 时退化为直接上传原始文件
+    Image = None
+    ImageOps = None
+
+# ========== 图片预处理 ==========
+# 上传前修正 EXIF 方向、按 GPT-4o 的缩放规则缩小尺寸并重新编码，
+# 同时估算图片消耗的视觉 token。处理结果按 (原图内容, 参数) 缓存在磁盘上。
+# 该模块的函数会在进程池中执行，因此只使用可被 pickle 的参数和返回值。
+# 原图一律通过 mmap 读取 (见 image_io.py)，计算缓存键和解码都直接使用映射的页面，只有需要上传原图时才复制成 bytes。
+
+PreparedImage = namedtuple("PreparedImage", ["data", "mime_type", "width", "height", "estimated_tokens"])
+
+PreprocessSettings = namedtuple("PreprocessSettings", ["max_side", "max_short_side", "max_tiles", "output_format", "quality"])
+
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp", "BMP": "image/bmp"}
+
+# GPT-4o 视觉 token 计费规则: 85 基础 token + 每个 512px 图块 170 token
+BASE_IMAGE_TOKENS = 85
+TILE_IMAGE_TOKENS = 170
+TILE_SIZE = 512
+API_MAX_SIDE = 2048
+API_MAX_SHORT_SIDE = 768
+
+
+def sniff_mime_type(image_bytes):
+    image_bytes = bytes(image_bytes[:12])
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_bytes[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if image_bytes.startswith(b"BM"):
+        return "image/bmp"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def api_scaled_size(width, height):
+    # 服务端先把图片缩放到 2048x2048 以内，再把短边缩放到 768
+    scale = min(1.0, API_MAX_SIDE / max(width, height))
+    short_side = min(width, height) * scale
+    if short_side > API_MAX_SHORT_SIDE:
+        scale *= API_MAX_SHORT_SIDE / short_side
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_image_tokens(width, height):
+    scaled_width, scaled_height = api_scaled_size(width, height)
+    tiles = math.ceil(scaled_width / TILE_SIZE) * math.ceil(scaled_height / TILE_SIZE)
+    return BASE_IMAGE_TOKENS + TILE_IMAGE_TOKENS * tiles
+
+
+def target_size(width, height, settings):
+    scale = 1.0
+    if settings.max_side:
+        scale = min(scale, settings.max_side / max(width, height))
+    if settings.max_short_side:
+        scale = min(scale, settings.max_short_side / min(width, height))
+    if settings.max_tiles:
+        # 逐步缩小，直到图块数不超过预算
+        while scale > 0.05:
+            tiles = math.ceil(width * scale / TILE_SIZE) * math.ceil(height * scale / TILE_SIZE)
+            if tiles <= settings.max_tiles:
+                break
+            scale *= 0.9
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def preprocess_image_bytes(image_bytes, settings):
+    # image_bytes 可以是 bytes 或 mmap；mmap 本身可以当作文件读取，不必再复制进 BytesIO
+    if Image is None:
+        return PreparedImage(bytes(image_bytes), sniff_mime_type(image_bytes), None, None, None)
+
+    source = image_bytes if isinstance(image_bytes, mmap.mmap) else io.BytesIO(image_bytes)
+    source.seek(0)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = target_size(image.width, image.height, settings)
+        if (width, height) != image.size:
+            image = image.resize((width, height), Image.LANCZOS)
+
+        output_format = settings.output_format.upper()
+        if output_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif output_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=output_format, quality=settings.quality, optimize=output_format == "JPEG")
+        return PreparedImage(buffer.getvalue(), FORMAT_MIME_TYPES[output_format], width, height,
+                             estimate_image_tokens(width, height))
+
+
+def preprocessed_cache_key(image_bytes, settings):
+    hasher = hashlib.sha256(image_bytes)
+    hasher.update(repr(tuple(settings)).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def prepare_image_file(image_path, settings, cache_folder=None):
+    # 进程池入口：读取图片、查找预处理缓存，未命中时处理并写入缓存
+    # 不预处理时也通过 mmap 读取，映射的页面直接复制成上传用的 bytes，不经过 read() 的中间缓冲
+    with map_image_file(image_path) as image_bytes:
+        if Image is None or settings is None:
+            return PreparedImage(bytes(image_bytes), sniff_mime_type(image_bytes), None, None, None)
+        return prepare_mapped_image(image_path, image_bytes, settings, cache_folder)
+
+
+def prepare_mapped_image(image_path, image_bytes, settings, cache_folder=None):
+    cache_key = preprocessed_cache_key(image_bytes, settings)
+    if cache_folder:
+        data_path = os.path.join(cache_folder, cache_key[:2], f"{cache_key}.bin")
+        meta_path = f"{data_path[:-4]}.json"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                prepared = PreparedImage(f.read(), meta["mime_type"], meta["width"], meta["height"], meta["estimated_tokens"])
+            os.utime(data_path)  # 刷新修改时间，ResponseCache.evict 按最近使用顺序淘汰
+            return prepared
+        except (OSError, ValueError, KeyError):
+            pass
+
+    try:
+        prepared = preprocess_image_bytes(image_bytes, settings)
+    except Exception as e:
+        print(f"预处理图片 {image_path} 时出错，将上传原图: {e}")
+        return PreparedImage(bytes(image_bytes), sniff_mime_type(image_bytes), None, None, None)
+
+    if cache_folder:
+        try:
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            tmp_path = f"{data_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(prepared.data)
+            os.replace(tmp_path, data_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"mime_type": prepared.mime_type, "width": prepared.width, "height": prepared.height,
+                           "estimated_tokens": prepared.estimated_tokens}, f)
+        except OSError as e:
+            print(f"写入预处理缓存时出错: {e}")
+    return prepared
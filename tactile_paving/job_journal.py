@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+
+# ========== 批处理任务日志 ==========
+# 只追加的 JSONL 日志，逐行记录每张图片的状态变化：
+# pending -> in_flight -> done / failed。
+# 程序中断后可通过重放日志得到每张图片的最新状态，从而断点续跑。
+# record 可以在结果写入线程中调用，因此用锁保护。
+# 每条记录带有时间戳 ts；重放和合并时同一张图片以 ts 最新的记录为准，与记录在文件中的先后顺序无关
+# (合并分片日志时追加的记录保留原来的时间戳，可能早于主日志中已有的记录)。
+
+STATE_PENDING = "pending"
+STATE_IN_FLIGHT = "in_flight"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+class JobJournal:
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.states = self.load(journal_path)
+        os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+        self._file = open(journal_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(journal_path):
+        states = {}
+        if not os.path.exists(journal_path):
+            return states
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 进程被强制终止时最后一行可能不完整
+                image = record.get("image")
+                if image is None:
+                    continue
+                ts = record.get("ts", 0)
+                if image in states and states[image]["ts"] > ts:
+                    continue
+                states[image] = {
+                    "state": record.get("state"),
+                    "attempts": record.get("attempts", 0),
+                    "error": record.get("error"),
+                    "ts": ts,
+                }
+        return states
+
+    def is_done(self, image):
+        entry = self.states.get(image)
+        return entry is not None and entry["state"] == STATE_DONE
+
+    def attempts(self, image):
+        entry = self.states.get(image)
+        return entry["attempts"] if entry else 0
+
+    def record(self, image, state, error=None):
+        with self._lock:
+            attempts = self.attempts(image)
+            if state == STATE_IN_FLIGHT:
+                attempts += 1
+            self.states[image] = {"state": state, "attempts": attempts, "error": error, "ts": round(time.time(), 3)}
+            self._write(image, self.states[image])
+            self._file.flush()
+
+    def merge(self, states):
+        # 合并其他日志 (例如各分片的任务日志) 中每张图片的最新状态，返回状态有变化的图片数
+        # 按时间戳顺序合并，同一张图片只有比已有记录更新的状态才会生效
+        changed_count = 0
+        with self._lock:
+            for image, entry in sorted(states.items(), key=lambda item: item[1].get("ts", 0)):
+                current = self.states.get(image)
+                if current == entry or (current is not None and current.get("ts", 0) > entry.get("ts", 0)):
+                    continue
+                self.states[image] = dict(entry)
+                self._write(image, entry)
+                changed_count += 1
+            self._file.flush()
+        return changed_count
+
+    def _write(self, image, entry):
+        record = {"ts": entry.get("ts") or round(time.time(), 3), "image": image, "state": entry["state"], "attempts": entry["attempts"]}
+        if entry["error"]:
+            record["error"] = entry["error"]
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        counts = {}
+        for entry in self.states.values():
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return counts
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
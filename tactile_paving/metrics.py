@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import contextlib
+from collections import deque
+
+import numpy as np
+
+# ========== 性能与费用统计 ==========
+# 每个请求 (单张图片或一个多图包) 对应一个 RequestSpan，记录各阶段耗时：
+#   read 读取并预处理图片, encode Base64 编码, rate_limit_wait 等待限流器, payload_wait 等待请求体内存预算, semaphore_wait 等待并发名额,
+#   ttft 首个 token 延迟, stream 流式接收耗时, backoff 重试退避, parse 解析答案, write 保存结果
+# 以及 API 返回的 usage (提示词/输出 token)、估计的图片 token 和按单价计算的费用。
+# 重试前中途中止或断开的尝试没有返回 usage，但同样计费，这部分按估计值计入 token 和费用 (estimated_tokens 单独记录)。
+# MetricsRecorder 把每个 span 追加写入 JSONL，并定期导出 Prometheus 文本格式的汇总指标。
+# 其他组件 (例如 HTTP 连接池) 可以通过 add_gauge_source 注册额外的指标。
+
+STAGES = ("read", "encode", "rate_limit_wait", "payload_wait", "semaphore_wait", "ttft", "stream", "backoff", "parse", "write")
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_PREFIX = "tactile_paving"
+LATENCY_WINDOW = 1000  # 进度条中的延迟中位数只按最近这么多个请求计算，内存和计算量不随图片数增长
+
+
+class RequestSpan:
+    def __init__(self, label, images=1):
+        self.label = label
+        self.images = images
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.durations = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.estimated_tokens = 0
+        self.image_tokens = 0
+        self.attempts = 0
+        self.cache_hit = False
+        self.error = None
+
+    def add(self, stage, seconds):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def record_usage(self, usage):
+        # usage 为 API 返回的 CompletionUsage；只有完整接收的流才会带回 usage
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def record_estimated_usage(self, prompt_tokens, completion_tokens):
+        # 没有返回 usage 的尝试按估计值计入
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.estimated_tokens += prompt_tokens + completion_tokens
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+
+def measure(span, stage):
+    # span 为 None 时不做任何统计，方便在测试模式等不需要统计的调用路径中复用同一函数
+    return span.stage(stage) if span is not None else contextlib.nullcontext()
+
+
+def add_duration(span, stage, seconds):
+    if span is not None:
+        span.add(stage, seconds)
+
+
+class MetricsRecorder:
+    def __init__(self, jsonl_path, prometheus_path=None, input_price_per_million=0.0, output_price_per_million=0.0,
+                 cached_input_price_per_million=None, write_interval_seconds=10.0):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.input_price = input_price_per_million / 1_000_000
+        self.output_price = output_price_per_million / 1_000_000
+        cached_price = input_price_per_million if cached_input_price_per_million is None else cached_input_price_per_million
+        self.cached_input_price = cached_price / 1_000_000
+        self.write_interval_seconds = write_interval_seconds
+        self.started = time.perf_counter()
+        self._last_written = 0.0
+        self._gauge_sources = []
+
+        self.status_counts = {"done": 0, "failed": 0}
+        self.images_total = 0
+        self.cache_hits = 0
+        self.token_totals = {"prompt": 0, "completion": 0, "cached": 0, "image_estimated": 0, "usage_estimated": 0}
+        self.cost_total = 0.0
+        self.stage_sums = {stage: 0.0 for stage in STAGES}
+        self.stage_buckets = {stage: np.zeros(len(HISTOGRAM_BUCKETS) + 1, dtype=np.int64) for stage in STAGES}
+        self.stage_counts = {stage: 0 for stage in STAGES}
+        self.request_durations = deque(maxlen=LATENCY_WINDOW)
+        self.ttft_durations = deque(maxlen=LATENCY_WINDOW)
+
+        os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+        self._file = open(jsonl_path, "a", encoding="utf-8")
+
+    def add_gauge_source(self, source):
+        # source() 返回 [(指标名, 类型, 值)]，每次写入 Prometheus 指标文件时调用
+        self._gauge_sources.append(source)
+
+    def start_span(self, label, images=1):
+        return RequestSpan(label, images)
+
+    def cost_of(self, span):
+        uncached_prompt = max(0, span.prompt_tokens - span.cached_tokens)
+        return (uncached_prompt * self.input_price + span.cached_tokens * self.cached_input_price
+                + span.completion_tokens * self.output_price)
+
+    def finish(self, span):
+        total = span.elapsed()
+        cost = self.cost_of(span)
+        status = "failed" if span.error else "done"
+        record = {
+            "ts": round(span.started_at, 3),
+            "image": span.label,
+            "images": span.images,
+            "status": status,
+            "total_seconds": round(total, 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in span.durations.items()},
+            "attempts": span.attempts,
+            "cache_hit": span.cache_hit,
+            "prompt_tokens": span.prompt_tokens,
+            "completion_tokens": span.completion_tokens,
+            "cached_tokens": span.cached_tokens,
+            "usage_tokens_estimated": span.estimated_tokens,
+            "image_tokens_estimated": span.image_tokens,
+            "cost_usd": round(cost, 6),
+        }
+        if span.error:
+            record["error"] = span.error
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+        self.status_counts[status] += 1
+        self.images_total += span.images
+        self.cache_hits += span.cache_hit
+        self.token_totals["prompt"] += span.prompt_tokens
+        self.token_totals["completion"] += span.completion_tokens
+        self.token_totals["cached"] += span.cached_tokens
+        self.token_totals["image_estimated"] += span.image_tokens
+        self.token_totals["usage_estimated"] += span.estimated_tokens
+        self.cost_total += cost
+        for stage, seconds in span.durations.items():
+            if stage in self.stage_sums:
+                self.stage_sums[stage] += seconds
+                self.stage_counts[stage] += 1
+                self.stage_buckets[stage][np.searchsorted(HISTOGRAM_BUCKETS, seconds)] += 1
+        self.request_durations.append(total)
+        if "ttft" in span.durations:
+            self.ttft_durations.append(span.durations["ttft"])
+
+        if self.prometheus_path and time.perf_counter() - self._last_written >= self.write_interval_seconds:
+            self.write_prometheus()
+
+    def summary_line(self):
+        elapsed = time.perf_counter() - self.started
+        parts = [f"失败 {self.status_counts['failed']}"]
+        if self.request_durations:
+            parts.append(f"p50 {np.percentile(self.request_durations, 50):.1f}s")
+        if self.ttft_durations:
+            parts.append(f"TTFT {np.percentile(self.ttft_durations, 50):.1f}s")
+        parts.append(f"{(self.token_totals['prompt'] + self.token_totals['completion']) / 1000:.0f}k tok")
+        parts.append(f"${self.cost_total:.2f}")
+        if elapsed > 0:
+            parts.append(f"{self.images_total / elapsed:.2f} 张/秒")
+        return " | ".join(parts)
+
+    def stage_breakdown(self):
+        # 返回 [(阶段, 总耗时, 平均耗时)]，按总耗时从大到小排序
+        rows = [(stage, self.stage_sums[stage], self.stage_sums[stage] / self.stage_counts[stage])
+                for stage in STAGES if self.stage_counts[stage]]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    def write_prometheus(self):
+        if not self.prometheus_path:
+            return
+        lines = [
+            f"# HELP {METRIC_PREFIX}_requests_total 已完成的请求数 (单图或多图包)",
+            f"# TYPE {METRIC_PREFIX}_requests_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_requests_total{{status="{status}"}} {count}' for status, count in self.status_counts.items()]
+        lines += [
+            f"# TYPE {METRIC_PREFIX}_images_total counter",
+            f"{METRIC_PREFIX}_images_total {self.images_total}",
+            f"# TYPE {METRIC_PREFIX}_cache_hits_total counter",
+            f"{METRIC_PREFIX}_cache_hits_total {self.cache_hits}",
+            f"# TYPE {METRIC_PREFIX}_tokens_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_tokens_total{{kind="{kind}"}} {count}' for kind, count in self.token_totals.items()]
+        lines += [
+            f"# TYPE {METRIC_PREFIX}_cost_usd_total counter",
+            f"{METRIC_PREFIX}_cost_usd_total {self.cost_total:.6f}",
+            f"# HELP {METRIC_PREFIX}_stage_seconds 各阶段耗时",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds histogram",
+        ]
+        for stage in STAGES:
+            cumulative = np.cumsum(self.stage_buckets[stage])
+            for bound, count in zip(HISTOGRAM_BUCKETS, cumulative):
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {self.stage_sums[stage]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {self.stage_counts[stage]}')
+
+        for source in self._gauge_sources:
+            for name, metric_type, value in source():
+                lines += [f"# TYPE {METRIC_PREFIX}_{name} {metric_type}", f"{METRIC_PREFIX}_{name} {value}"]
+
+        # 先写临时文件再替换，抓取方不会读到写了一半的文件
+        temp_path = self.prometheus_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.prometheus_path)
+        self._last_written = time.perf_counter()
+
+    def close(self):
+        self.write_prometheus()
+        if not self._file.closed:
+            self._file.close()
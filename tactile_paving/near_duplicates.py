@@ -0,0 +1,168 @@
+import os
+import json
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安装 Pillow 时无法计算感知哈希，近重复检测不可用
+    Image = None
+    ImageOps = None
+
+# ========== 近重复图片检测 ==========
+# 视频抽帧或连拍得到的图片往往几乎相同。先在进程池中为每张图片计算 64 位感知哈希
+# (dHash: 相邻像素的亮度梯度；pHash: 低频 DCT 系数与中位数比较)，再按汉明距离聚类：
+# 每组只评估一张代表图片，其判断结果复制给组内其余图片并记录来源。
+# 聚类时索引中只保存代表图片，每张图片只与已有代表比较 (不会沿近重复链条无限传递)；
+# 索引采用多索引哈希，单次查询只比较少量候选，总体远低于两两比较的 O(n²)。
+# 哈希结果按 (相对路径, 文件大小, 修改时间, 算法) 缓存在 JSON 文件中，重复运行时无需重新解码图片。
+
+HASH_METHODS = ("dhash", "phash")
+HASH_SIZE = 8  # 8x8 = 64 位
+
+
+def hamming_distance(first_hash, second_hash):
+    return (first_hash ^ second_hash).bit_count()
+
+
+def bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash_bits(image, hash_size=HASH_SIZE):
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    return pixels[:, 1:] > pixels[:, :-1]
+
+
+def dct_matrix(size):
+    # 正交 DCT-II 矩阵，二维 DCT 为 M @ X @ M.T；避免为此引入 scipy
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def phash_bits(image, hash_size=HASH_SIZE, highfreq_factor=4):
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    matrix = dct_matrix(size)
+    low_frequencies = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    return low_frequencies > np.median(low_frequencies)
+
+
+def image_hash_file(image_path, method="dhash", hash_size=HASH_SIZE):
+    # 在进程池中执行；返回哈希整数，读取失败时返回 None
+    try:
+        with Image.open(image_path) as image:
+            # JPEG 可按 1/2~1/8 比例直接缩小解码，计算哈希只需要很小的尺寸
+            image.draft("RGB", (hash_size * 16, hash_size * 16))
+            image = ImageOps.exif_transpose(image)
+            bits = phash_bits(image, hash_size) if method == "phash" else dhash_bits(image, hash_size)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return bits_to_int(bits)
+
+
+def load_hash_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_hash_cache(cache_path, entries):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(temp_path, cache_path)
+
+
+def compute_image_hashes(base_folder, image_files, method="dhash", cache_path=None, workers=None):
+    # 返回 {相对路径: 哈希整数}，无法读取的图片不包含在结果中
+    if Image is None:
+        raise RuntimeError("近重复检测需要安装 Pillow")
+    if method not in HASH_METHODS:
+        raise ValueError(f"不支持的感知哈希算法: {method}")
+    cached_entries = load_hash_cache(cache_path)
+    hashes = {}
+    entries = {}
+    missing = []
+    for rel_path in image_files:
+        try:
+            stat = os.stat(os.path.join(base_folder, rel_path))
+        except OSError:
+            continue
+        signature = [stat.st_size, stat.st_mtime_ns, method]
+        cached = cached_entries.get(rel_path)
+        if cached is not None and cached[:3] == signature:
+            hashes[rel_path] = int(cached[3], 16)
+            entries[rel_path] = cached
+        else:
+            missing.append((rel_path, signature))
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = [os.path.join(base_folder, rel_path) for rel_path, _ in missing]
+            results = pool.map(partial(image_hash_file, method=method), paths, chunksize=64)
+            for (rel_path, signature), image_hash in zip(missing, results):
+                if image_hash is not None:
+                    hashes[rel_path] = image_hash
+                    entries[rel_path] = signature + [f"{image_hash:016x}"]
+    if cache_path and missing:
+        # 与已有条目合并后写回，只扫描部分图片 (如续跑) 时不会丢失其他图片的哈希
+        save_hash_cache(cache_path, {**cached_entries, **entries})
+    return {rel_path: hashes[rel_path] for rel_path in image_files if rel_path in hashes}
+
+
+class MultiIndexHashIndex:
+    # 多索引哈希: 把 64 位哈希切成 max_distance + 1 段，每段各建一个精确匹配的哈希表。
+    # 由抽屉原理，汉明距离不超过 max_distance 的两个哈希至少有一段完全相同，
+    # 因此只需比较与查询哈希某一段相同的候选，不必遍历所有已索引的哈希。
+    def __init__(self, max_distance, hash_bits=HASH_SIZE * HASH_SIZE):
+        self.max_distance = max_distance
+        segment_count = min(max_distance + 1, hash_bits)
+        bounds = np.linspace(0, hash_bits, segment_count + 1).astype(int)
+        self._segments = [(int(start), (1 << int(stop - start)) - 1) for start, stop in zip(bounds[:-1], bounds[1:])]
+        self._tables = [{} for _ in self._segments]
+        self.size = 0
+
+    def add(self, image_hash, item):
+        self.size += 1
+        for (shift, mask), table in zip(self._segments, self._tables):
+            table.setdefault((image_hash >> shift) & mask, []).append((image_hash, item))
+
+    def search(self, image_hash):
+        # 返回 [(距离, 图片)]，按距离从小到大排序
+        matches = {}
+        for (shift, mask), table in zip(self._segments, self._tables):
+            for candidate_hash, item in table.get((image_hash >> shift) & mask, ()):
+                if item not in matches:
+                    distance = hamming_distance(image_hash, candidate_hash)
+                    if distance <= self.max_distance:
+                        matches[item] = distance
+        return sorted((distance, item) for item, distance in matches.items())
+
+
+def cluster_near_duplicates(image_hashes, max_distance, group_of=None):
+    # image_hashes: {图片: 哈希}，按给定顺序处理，每组中最先出现的图片作为代表
+    # group_of: 可选的分组函数，只在同组图片之间查找近重复 (例如同一站点、需要评估的问题相同)
+    # 返回 {代表图片: [(近重复图片, 汉明距离), ...]}，没有近重复的代表图片对应空列表
+    indexes = {}
+    clusters = {}
+    for image, image_hash in image_hashes.items():
+        index = indexes.setdefault(group_of(image) if group_of else None, MultiIndexHashIndex(max_distance))
+        matches = index.search(image_hash)
+        if matches:
+            distance, representative = matches[0]
+            clusters[representative].append((image, distance))
+        else:
+            index.add(image_hash, image)
+            clusters[image] = []
+    return clusters
@@ -0,0 +1,1125 @@
+import os
+import json
+import asyncio 
+import hashlib
+import csv
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from openai import APIConnectionError, APIStatusError, RateLimitError 
+from tqdm.asyncio import tqdm_asyncio 
+from .client import HttpSettings, get_client, get_pool_stats
+from .questions import load_questions, parse_questions_for_ids, format_questions
+from .prompts import get_prompts
+from .response_cache import ResponseCache, compute_cache_key
+from .image_pipeline import iter_image_files, image_output_stem, run_bounded_pipeline
+from .rate_limiter import AdaptiveRateLimiter, count_text_tokens, estimate_text_tokens
+from .image_preprocess import PreprocessSettings, prepare_image_file
+from .image_io import PayloadBudget, encode_data_url, encode_data_urls, payload_size, file_payload_size
+from .batch_api import write_batch_shards, submit_batch_shard, wait_for_batches, iter_batch_results, load_batch_manifest, save_batch_manifest
+from .result_store import ResultStore, load_answered_versions
+from .result_commands import prune_removed_question_judgments
+from .question_versions import question_set_versions, stale_question_ids
+from .near_duplicates import compute_image_hashes, cluster_near_duplicates
+from .metrics import MetricsRecorder, measure, add_duration
+from .streaming_json import StreamingArrayParser, MalformedResponseError, ParsedResponseText, load_response_json
+from .response_schema import build_judgments_schema, build_packed_judgments_schema, json_schema_response_format, normalize_judgment, parse_judgments, parse_judgments_text
+from .job_journal import JobJournal, STATE_PENDING, STATE_IN_FLIGHT, STATE_DONE, STATE_FAILED
+from .sharding import parse_shard_spec, shard_name, in_shard
+from .voting import VoteTally
+
+# ========== 全局配置 ==========
+# 默认配置在 settings.py 中，导入时复制为本模块的全局变量 (命令行在导入本模块之前已对 settings 应用配置)；
+# 直接使用本模块时也可以对本模块调用 config.configure。
+from .settings import *  # noqa: F401,F403
+
+def questions_data():
+    return load_questions(LANGUAGE, QUESTIONS_FILE)
+
+def prompts():
+    return get_prompts(LANGUAGE)
+
+merged_result_store_path = None # 分片运行时主结果数据库和主任务日志的路径 (见 enter_shard)
+merged_journal_path = None
+
+def current_shard():
+    return parse_shard_spec(SHARD) if SHARD else None
+
+def enter_shard():
+    # 分片运行时，结果数据库、任务日志、指标、近重复对应表和 Batch API 文件都写入本分片自己的文件夹，
+    # 互不争用；旧版逐图文件仍写入 BATCH_OUTPUT_FOLDER (文件名按图片区分，不会冲突)
+    global JOURNAL_PATH, RESULT_STORE_PATH, METRICS_PATH, PROMETHEUS_METRICS_PATH, NEAR_DUPLICATES_PATH, BATCH_API_FOLDER
+    global IMAGE_HASH_CACHE_PATH, merged_result_store_path, merged_journal_path
+    shard = current_shard()
+    if shard is None:
+        return None
+    shard_folder = os.path.join(SHARDS_FOLDER, shard_name(shard))
+    os.makedirs(shard_folder, exist_ok=True)
+    merged_result_store_path = RESULT_STORE_PATH
+    merged_journal_path = JOURNAL_PATH
+    JOURNAL_PATH = os.path.join(shard_folder, os.path.basename(JOURNAL_PATH))
+    RESULT_STORE_PATH = os.path.join(shard_folder, os.path.basename(RESULT_STORE_PATH))
+    METRICS_PATH = os.path.join(shard_folder, os.path.basename(METRICS_PATH))
+    PROMETHEUS_METRICS_PATH = os.path.join(shard_folder, os.path.basename(PROMETHEUS_METRICS_PATH))
+    NEAR_DUPLICATES_PATH = os.path.join(shard_folder, os.path.basename(NEAR_DUPLICATES_PATH))
+    BATCH_API_FOLDER = os.path.join(shard_folder, os.path.basename(BATCH_API_FOLDER))
+    # 感知哈希缓存每次保存都会整体重写，各分片使用各自的文件
+    IMAGE_HASH_CACHE_PATH = f"{os.path.splitext(IMAGE_HASH_CACHE_PATH)[0]}.{shard_name(shard)}.json"
+    print(f"🧩 分片 {shard.index}/{shard.count}: 只处理属于本分片的图片，结果写入 {shard_folder}")
+    return shard
+
+def rate_limit_share():
+    if RATE_LIMIT_SHARE is not None:
+        return RATE_LIMIT_SHARE
+    shard = current_shard()
+    return 1 / shard.count if shard else 1.0
+
+def iter_data_images():
+    # 遍历 DATA_FOLDER 中的图片；分片运行时只产出属于本分片的图片
+    shard = current_shard()
+    for rel_path in iter_image_files(DATA_FOLDER, recursive=RECURSIVE_SCAN):
+        if in_shard(rel_path, shard, SHARD_BY_FOLDER):
+            yield rel_path
+
+def open_job_journal():
+    journal = JobJournal(JOURNAL_PATH)
+    if merged_journal_path:
+        # 分片运行时也参考主任务日志中已合并的状态 (例如之前以不同分片数运行的结果)，同一张图片以时间戳较新的状态为准
+        shard = current_shard()
+        for image, entry in JobJournal.load(merged_journal_path).items():
+            current = journal.states.get(image)
+            if in_shard(image, shard, SHARD_BY_FOLDER) and (current is None or current.get("ts", 0) < entry.get("ts", 0)):
+                journal.states[image] = entry
+    return journal
+
+def http_settings():
+    max_connections = HTTP_MAX_CONNECTIONS or CONCURRENT_REQUEST_LIMIT + 4
+    return HttpSettings(http2=HTTP2, max_connections=max_connections, max_keepalive_connections=max_connections,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS, connect_timeout=HTTP_CONNECT_TIMEOUT_SECONDS,
+                        read_timeout=HTTP_READ_TIMEOUT_SECONDS, write_timeout=HTTP_WRITE_TIMEOUT_SECONDS,
+                        pool_timeout=HTTP_POOL_TIMEOUT_SECONDS)
+
+def api_client():
+    return get_client(http_settings())
+
+def get_preprocess_settings():
+    if not PREPROCESS_IMAGES:
+        return None
+    return PreprocessSettings(IMAGE_MAX_SIDE, IMAGE_MAX_SHORT_SIDE, IMAGE_MAX_TILES, IMAGE_OUTPUT_FORMAT, IMAGE_QUALITY)
+
+def report_image_error(image_path, error):
+    if isinstance(error, FileNotFoundError):
+        print(f"错误: 图片文件 {image_path} 未找到。")
+    else:
+        print(f"读取图片 {image_path} 时出错: {error}")
+
+def load_image(image_path):
+    try:
+        return prepare_image_file(image_path, get_preprocess_settings(), PREPROCESSED_CACHE_FOLDER)
+    except Exception as e:
+        report_image_error(image_path, e)
+        return None
+
+async def load_image_async(image_path, preprocess_pool=None):
+    # 在进程池中解码、缩放和重新编码，不阻塞事件循环
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(preprocess_pool, prepare_image_file, image_path,
+                                          get_preprocess_settings(), PREPROCESSED_CACHE_FOLDER)
+    except Exception as e:
+        report_image_error(image_path, e)
+        return None
+
+def build_user_prompt(questions_text_block):
+    return prompts().user_template.format(questions=questions_text_block)
+
+def response_settings(questions_text_block, num_images=1):
+    # 返回 (系统提示词, response_format, 输出 token 上限)；精简模式的 JSON Schema 按本次请求的问题生成
+    prompt_set = prompts()
+    if RESPONSE_MODE == "compact":
+        question_ids = [q_id for q_id, _ in parse_questions_for_ids(questions_text_block)]
+        if num_images > 1:
+            return (prompt_set.compact_packed_system, json_schema_response_format(build_packed_judgments_schema(question_ids)),
+                    min(PACK_MAX_TOKENS, COMPACT_MAX_TOKENS * num_images))
+        return prompt_set.compact_system, json_schema_response_format(build_judgments_schema(question_ids)), COMPACT_MAX_TOKENS
+    if num_images > 1:
+        return prompt_set.packed_system, {"type": "json_object"}, PACK_MAX_TOKENS
+    return prompt_set.system, {"type": "json_object"}, MAX_TOKENS
+
+def is_cacheable_response(response_content, num_images=1):
+    # 只缓存能解析出判断结果的响应；被截断或格式错误的 JSON 不写入缓存，下次运行会重新请求而不是一直复用坏结果
+    if not response_content:
+        return False
+    if num_images == 1:
+        answers, _ = parse_judgments_text(response_content)
+        return bool(answers)
+    try:
+        data = load_response_json(response_content)
+    except json.JSONDecodeError:
+        return False
+    image_results = data.get("images") if isinstance(data, dict) else None
+    return isinstance(image_results, list) and any(isinstance(item, dict) and parse_judgments(item)[0] for item in image_results)
+
+async def request_with_cache(cache, cache_key, image_label, make_request, span=None, num_images=1):
+    if cache is None:
+        return await make_request()
+
+    cached_response = cache.get(cache_key, validate=lambda response: is_cacheable_response(response, num_images))
+    if cached_response is not None:
+        if span is not None:
+            span.cache_hit = True
+        return cached_response
+
+    # 内容相同的图片正在请求中时，直接等待其结果，不重复计费
+    pending = cache.inflight.get(cache_key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    pending = asyncio.get_running_loop().create_future()
+    cache.inflight[cache_key] = pending
+    response_content = None
+    try:
+        response_content = await make_request()
+        if is_cacheable_response(response_content, num_images):
+            cache.put(cache_key, response_content, {"image": image_label, "model": MODEL_NAME})
+    finally:
+        pending.set_result(response_content)
+        del cache.inflight[cache_key]
+    return response_content
+
+@contextlib.asynccontextmanager
+async def reserve_image_payload(payload_budget, image_paths, span=None):
+    # 读取图片之前按文件大小预留内存预算 (见 image_io.py)，读取后由调用方按实际数据 resize，请求结束后才释放；
+    # payload_budget 为 None 时不限制
+    payload_budget = payload_budget or PayloadBudget()
+    wait_start = time.perf_counter()
+    async with payload_budget.reserve(file_payload_size(image_paths)) as reservation:
+        add_duration(span, "payload_wait", time.perf_counter() - wait_start)
+        yield reservation
+
+async def analyze_image_with_gpt4o(image_path, questions_text_block, question_ids_to_evaluate, is_test_mode, semaphore, rate_limiter, cache=None, preprocess_pool=None, span=None,
+                                  payload_budget=None):
+    async with reserve_image_payload(payload_budget, [image_path], span) as reservation:
+        with measure(span, "read"):
+            image = await load_image_async(image_path, preprocess_pool)
+        if not image:
+            return None, image_path
+        reservation.resize(payload_size([image]))
+        return await analyze_loaded_image(image_path, image, questions_text_block, is_test_mode, semaphore, rate_limiter, cache, span), image_path
+
+async def analyze_loaded_image(image_path, image, questions_text_block, is_test_mode, semaphore, rate_limiter, cache=None, span=None):
+    user_prompt_text = build_user_prompt(questions_text_block)
+    system_prompt, response_format, max_tokens = response_settings(questions_text_block)
+    cache_key = compute_cache_key(image.data, system_prompt + user_prompt_text, MODEL_NAME, TEMPERATURE) if cache is not None else None
+    return await request_with_cache(
+        cache, cache_key, os.path.basename(image_path),
+        lambda: request_gpt4o_evaluation(image_path, [image], user_prompt_text, is_test_mode, semaphore, rate_limiter,
+                                         system_prompt=system_prompt, max_tokens=max_tokens, response_format=response_format, span=span),
+        span=span)
+
+async def analyze_image_pack_with_gpt4o(image_paths, questions_text_block, semaphore, rate_limiter, cache=None, preprocess_pool=None, span=None,
+                                        payload_budget=None):
+    # 返回与 image_paths 一一对应的单图响应 (JSON字符串)，失败的位置为 None
+    async with reserve_image_payload(payload_budget, image_paths, span) as reservation:
+        with measure(span, "read"):
+            images = await asyncio.gather(*(load_image_async(image_path, preprocess_pool) for image_path in image_paths))
+        loaded = [(image_path, image) for image_path, image in zip(image_paths, images) if image]
+        reservation.resize(payload_size([image for _, image in loaded]))
+        return await analyze_loaded_pack(image_paths, loaded, questions_text_block, semaphore, rate_limiter, cache, span)
+
+async def analyze_loaded_pack(image_paths, loaded, questions_text_block, semaphore, rate_limiter, cache=None, span=None):
+    if not loaded:
+        return [None] * len(image_paths)
+    if len(loaded) == 1:
+        # 只剩一张图片时按单图请求处理
+        image_path, image = loaded[0]
+        response_content = await analyze_loaded_image(image_path, image, questions_text_block, False, semaphore, rate_limiter, cache, span)
+        return [response_content if path == image_path else None for path in image_paths]
+
+    pack_label = f"{os.path.basename(loaded[0][0])} 等{len(loaded)}张"
+    user_prompt_text = build_user_prompt(questions_text_block)
+    system_prompt, response_format, max_tokens = response_settings(questions_text_block, len(loaded))
+    cache_key = None
+    if cache is not None:
+        pack_digest = b"".join(hashlib.sha256(image.data).digest() for _, image in loaded)
+        cache_key = compute_cache_key(pack_digest, system_prompt + user_prompt_text, MODEL_NAME, TEMPERATURE)
+    packed_response = await request_with_cache(
+        cache, cache_key, pack_label,
+        lambda: request_gpt4o_evaluation(pack_label, [image for _, image in loaded], user_prompt_text, False, semaphore, rate_limiter,
+                                         system_prompt=system_prompt, max_tokens=max_tokens, response_format=response_format, span=span),
+        span=span, num_images=len(loaded))
+
+    split_responses = dict(zip((image_path for image_path, _ in loaded), split_packed_response(packed_response, len(loaded))))
+    return [split_responses.get(image_path) for image_path in image_paths]
+
+async def vote_on_undetermined(image_path, raw_response, question_ids, semaphore, rate_limiter, cache=None, preprocess_pool=None, span=None,
+                               payload_budget=None):
+    # 对单次评估中判断为 -1 的问题多次采样投票，返回 {问题ID: (最终判断, 票数)}；没有需要复查的问题时返回 {}
+    answers, _ = parse_judgments_text(raw_response) if raw_response else (None, [])
+    if not answers:
+        return {}
+    undetermined_ids = [q_id for q_id in question_ids if answers.get(q_id, -1) == -1]
+    # 全部为 -1 多半是响应本身有问题，按提取失败处理，不逐题采样
+    if not undetermined_ids or len(undetermined_ids) == len(question_ids):
+        return {}
+    async with reserve_image_payload(payload_budget, [image_path], span) as reservation:
+        image = await load_image_async(image_path, preprocess_pool)
+        if not image:
+            return {}
+        reservation.resize(payload_size([image]))
+        return await sample_votes(image_path, image, undetermined_ids, semaphore, rate_limiter, cache, span)
+
+async def sample_votes(image_path, image, undetermined_ids, semaphore, rate_limiter, cache=None, span=None):
+    prompt_set = prompts()
+    tally = VoteTally(undetermined_ids, VOTE_MAX_SAMPLES)
+    while tally.undecided():
+        sample_ids = tally.undecided()
+        user_prompt_text = prompt_set.recheck_template.format(questions=format_questions(questions_data(), question_ids=set(sample_ids)))
+        response_format = json_schema_response_format(build_judgments_schema(sample_ids, include_findings=False))
+        cache_key = None
+        if cache is not None:
+            # 缓存键包含采样序号，重新运行时复用各次采样的结果而不是同一个结果
+            cache_key = compute_cache_key(image.data, f"{prompt_set.compact_system}{user_prompt_text}#{tally.samples}", MODEL_NAME, VOTE_TEMPERATURE)
+        sample_response = await request_with_cache(
+            cache, cache_key, os.path.basename(image_path),
+            lambda: request_gpt4o_evaluation(image_path, [image], user_prompt_text, False, semaphore, rate_limiter,
+                                             system_prompt=prompt_set.compact_system, max_tokens=COMPACT_MAX_TOKENS,
+                                             response_format=response_format, span=span, temperature=VOTE_TEMPERATURE))
+        if not sample_response:
+            break  # 请求失败时按已有票数决定
+        sample_answers, _ = parse_judgments_text(sample_response)
+        tally.add_sample(sample_answers or {})
+    return tally.results()
+
+def is_valid_evaluation(item):
+    return (isinstance(item, dict) and isinstance(item.get("question_id"), str)
+            and normalize_judgment(item.get("judgment")) is not None)
+
+def is_valid_image_result(item):
+    return isinstance(item, dict) and isinstance(item.get("evaluations"), list)
+
+def create_stream_parser(num_images, response_format=None):
+    # 单图响应检查 "evaluations" 数组中的每个问题，多图响应检查 "images" 数组中的每张图片
+    # 严格 JSON Schema 的结构由服务端保证，无需在客户端检查
+    if not STREAM_EARLY_ABORT or (response_format or {}).get("type") == "json_schema":
+        return None
+    if num_images > 1:
+        return StreamingArrayParser("images", is_valid_image_result, STREAM_MAX_PREFIX_CHARS, STREAM_MAX_INVALID_ITEMS)
+    return StreamingArrayParser("evaluations", is_valid_evaluation, STREAM_MAX_PREFIX_CHARS, STREAM_MAX_INVALID_ITEMS)
+
+def create_payload_budget():
+    return PayloadBudget(int(MAX_INFLIGHT_PAYLOAD_MB * 1024 * 1024) if MAX_INFLIGHT_PAYLOAD_MB else None)
+
+def create_rate_limiter():
+    return AdaptiveRateLimiter(RATE_LIMIT_RPM, RATE_LIMIT_TPM, max_retries=MAX_RETRIES,
+                               base_backoff_seconds=RETRY_BASE_DELAY_SECONDS, max_backoff_seconds=RETRY_MAX_DELAY_SECONDS,
+                               budget_share=rate_limit_share())
+
+def build_messages(user_prompt_text, image_urls, system_prompt):
+    # image_urls: [data URL, ...] (见 image_io.encode_data_url)；多张图片时在每张前加上 "图片N" 标签
+    user_content = [{"type": "text", "text": user_prompt_text}]
+    for index, image_url in enumerate(image_urls, start=1):
+        if len(image_urls) > 1:
+            user_content.append({"type": "text", "text": prompts().image_label.format(index=index)})
+        user_content.append({"type": "image_url", "image_url": {"url": image_url}})
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+def build_request_body(user_prompt_text, image_urls, stream, system_prompt, max_tokens, response_format=None, temperature=None):
+    body = {
+        "model": MODEL_NAME,
+        "messages": build_messages(user_prompt_text, image_urls, system_prompt),
+        "max_tokens": max_tokens,
+        "temperature": TEMPERATURE if temperature is None else temperature,
+        "response_format": response_format or {"type": "json_object"},
+    }
+    if stream:
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True} # 最后一个数据块返回 token 用量，用于费用统计
+    return body
+
+def estimate_request_tokens(user_prompt_text, images, system_prompt, max_tokens):
+    # 与 OpenAI 的限流估算方式一致：提示词 token + 图片 token + max_tokens
+    prompt_tokens = estimate_text_tokens(system_prompt, MODEL_NAME) + estimate_text_tokens(user_prompt_text, MODEL_NAME)
+    image_tokens = sum(image.estimated_tokens or ESTIMATED_IMAGE_TOKENS for image in images)
+    return prompt_tokens + image_tokens + max_tokens
+
+async def request_gpt4o_evaluation(image_path, images, user_prompt_text, is_test_mode, semaphore, rate_limiter, system_prompt, max_tokens,
+                                   response_format=None, span=None, temperature=None):
+    # 图片占用的内存预算由读取图片的调用方预留 (见 reserve_image_payload)，覆盖整个请求期间包括重试退避
+    if span is not None:
+        span.image_tokens = sum(image.estimated_tokens or ESTIMATED_IMAGE_TOKENS for image in images)
+
+    if not is_test_mode:
+        pass 
+    else:
+        print(f"分析图片: {os.path.basename(image_path)}")
+        image = images[0]
+        try:
+            image_size_kb = os.path.getsize(image_path) / 1024
+            print(f"图片大小: {image_size_kb:.2f} KB (上传 {len(image.data) / 1024:.2f} KB, {image.mime_type})")
+        except OSError:
+            pass
+        if image.estimated_tokens:
+            print(f"上传尺寸: {image.width}x{image.height}，估计图片 token: {image.estimated_tokens}")
+
+    estimated_tokens = estimate_request_tokens(user_prompt_text, images, system_prompt, max_tokens)
+    for attempt in range(rate_limiter.max_retries + 1):
+        with measure(span, "rate_limit_wait"):
+            await rate_limiter.acquire(estimated_tokens)
+        full_response_content = ""
+        retry_after = None
+        malformed = False
+        stream_parser = create_stream_parser(len(images), response_format)
+        # 每次尝试重新编码，退避等待期间不保留 base64 副本
+        with measure(span, "encode"):
+            image_urls = await encode_data_urls(images)
+        semaphore_wait_start = time.perf_counter()
+        async with semaphore: 
+            add_duration(span, "semaphore_wait", time.perf_counter() - semaphore_wait_start)
+            if span is not None:
+                span.attempts += 1
+            accepted = False  # 服务端已开始返回响应，本次尝试会计费
+            usage_recorded = False
+            try:
+                if is_test_mode:
+                    print("开始调用 OpenAI API (JSON模式, 流式获取完整响应)...")
+            
+                request_start = time.perf_counter()
+                first_token_at = None
+                raw_response = await api_client().chat.completions.with_raw_response.create(
+                    **build_request_body(user_prompt_text, image_urls, stream=True, system_prompt=system_prompt, max_tokens=max_tokens,
+                                        response_format=response_format, temperature=temperature)
+                )
+                accepted = True
+                rate_limiter.update_from_headers(raw_response.headers)
+                stream = raw_response.parse()
+
+                if is_test_mode:
+                    print("GPT响应 (流式接收JSON):")
+                    print("==================================================")
+            
+                async for chunk in stream:
+                    if chunk.usage is not None and span is not None:
+                        span.record_usage(chunk.usage)
+                        usage_recorded = True
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            add_duration(span, "ttft", first_token_at - request_start)
+                        content_piece = chunk.choices[0].delta.content
+                        if is_test_mode:
+                            print(content_piece, end='', flush=True)
+                        full_response_content += content_piece
+                        if stream_parser is not None:
+                            stream_parser.feed(content_piece)  # 闭合的元素保存在 stream_parser.items 中
+                            if stream_parser.error:
+                                await stream.close()
+                                raise MalformedResponseError(stream_parser.error)
+            
+                if is_test_mode:
+                    print("\n==================================================")
+                    print(f"API调用完成，耗时: {time.perf_counter() - request_start:.2f} 秒")
+
+                if first_token_at is not None:
+                    add_duration(span, "stream", time.perf_counter() - first_token_at)
+                rate_limiter.on_success()
+                if stream_parser is not None:
+                    return stream_parser.parsed_result(full_response_content)
+                return full_response_content
+
+            except MalformedResponseError as e:
+                malformed = True
+                error_message = f"响应格式错误，已在 {len(full_response_content)} 个字符处中止: {e}"
+            except RateLimitError as e:
+                retry_after = rate_limiter.on_rate_limited(e.response.headers)
+                error_message = f"API速率限制错误: {e}"
+            except APIConnectionError as e:
+                error_message = f"API连接错误: {e}"
+            except APIStatusError as e:
+                if e.status_code < 500:
+                    print(f"调用OpenAI API时发生错误 (图片: {os.path.basename(image_path)}): {e}")
+                    return None
+                error_message = f"API服务端错误 ({e.status_code}): {e}"
+            except Exception as e:
+                print(f"调用OpenAI API时发生错误 (图片: {os.path.basename(image_path)}): {e}")
+                return None
+            finally:
+                if span is not None and accepted and not usage_recorded:
+                    # 中途中止或断开的尝试没有 usage，按估计的提示词 token 和已收到的输出计入
+                    span.record_estimated_usage(estimated_tokens - max_tokens, count_text_tokens(full_response_content, MODEL_NAME))
+
+        # 退避等待时已释放 semaphore，不占用并发名额 (已读入的图片仍计入内存预算)；响应格式错误与限流无关，立即重试
+        image_urls = None
+        if attempt < rate_limiter.max_retries:
+            delay = 0.0 if malformed else rate_limiter.backoff_delay(attempt, retry_after)
+            if is_test_mode:
+                print(f"{error_message} (图片: {os.path.basename(image_path)})。{delay:.1f} 秒后进行第 {attempt + 1} 次重试...")
+            with measure(span, "backoff"):
+                await asyncio.sleep(delay)
+
+    print(f"❌ {error_message} (图片: {os.path.basename(image_path)})，已重试 {rate_limiter.max_retries} 次，放弃。")
+    return None
+
+def split_packed_response(json_string, num_images):
+    # 把多图响应拆分成与单图响应格式相同的 {"evaluations": [...]} (精简模式为 {"judgments": {...}, "findings": [...]})，
+    # 以便复用 extract_answers 和结果保存逻辑
+    if not json_string:
+        return [None] * num_images
+    try:
+        data = load_response_json(json_string)
+    except json.JSONDecodeError:
+        print(f"⚠️无法解析多图API返回的JSON: {json_string[:200]}...")
+        return [None] * num_images
+    if not isinstance(data, dict) or not isinstance(data.get("images"), list):
+        print("⚠️ 多图API响应中未找到 'images' 数组或格式不正确。")
+        return [None] * num_images
+
+    split_responses = [None] * num_images
+    for position, image_result in enumerate(data["images"]):
+        if not isinstance(image_result, dict):
+            continue
+        image_index = image_result.get("image_index", position + 1)
+        if isinstance(image_index, int) and 1 <= image_index <= num_images:
+            single_result = {key: value for key, value in image_result.items() if key != "image_index"}
+            split_responses[image_index - 1] = ParsedResponseText(json.dumps(single_result, ensure_ascii=False), single_result)
+    return split_responses
+
+def extract_answers(json_string, question_ids_expected):
+    if not json_string:
+        print("⚠️ API响应为空，无法提取答案。")
+        return {}
+    answers, problems = parse_judgments_text(json_string)
+    if answers is None:
+        if problems == ["响应不是有效的JSON"]:
+            print(f"⚠️无法解析API返回的JSON: {json_string[:200]}...")
+            return {qid: -1 for qid in question_ids_expected}
+        print("⚠️ API响应中未找到 'judgments' 对象或 'evaluations' 数组，或格式不正确。")
+        return {}
+    for problem in problems:
+        print(f"警告: {problem}")
+    return {qid: answers.get(qid, -1) for qid in question_ids_expected}
+
+def save_test_mode_results(df, raw_response_content, image_name):
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    base_filename = os.path.splitext(image_name)[0]
+    excel_path = os.path.join(OUTPUT_FOLDER, f"{base_filename}_evaluation_gpt4o.xlsx")
+    csv_path = os.path.join(OUTPUT_FOLDER, f"{base_filename}_evaluation_gpt4o.csv")
+    raw_output_path = os.path.join(OUTPUT_FOLDER, f"{base_filename}_gpt_raw_output.txt")
+
+    try:
+        df.to_excel(excel_path, index=False)
+        print(f"✅ Excel已保存至: {excel_path}")
+        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        print(f"✅ CSV已保存至: {csv_path}")
+    except Exception as e:
+        print(f"保存Excel/CSV文件时出错: {e}")
+
+    if raw_response_content:
+        try:
+            with open(raw_output_path, 'w', encoding='utf-8') as f:
+                f.write(raw_response_content)
+            print(f"原始API响应已保存至: {raw_output_path}")
+        except Exception as e:
+            print(f"保存原始API响应时出错: {e}")
+
+def default_test_image():
+    if TEST_MODE_IMAGE_PATH:
+        return TEST_MODE_IMAGE_PATH
+    for rel_path in iter_image_files(DATA_FOLDER, recursive=RECURSIVE_SCAN):
+        return os.path.join(DATA_FOLDER, rel_path)
+    raise FileNotFoundError(f"在 {DATA_FOLDER} 中没有找到测试图片，请用 --image 指定。")
+
+async def process_single_image_test_mode(image_path=None, num_questions=NUM_TEST_QUESTIONS):
+    import pandas as pd
+
+    image_path = image_path or default_test_image()
+    print(f"🔍 正在处理测试图片: {image_path}")
+    questions = questions_data()
+    questions_text_block = format_questions(questions, num_questions)
+    
+    all_question_tuples = parse_questions_for_ids(questions)
+    question_ids_to_evaluate = [q_id for q_id, _ in all_question_tuples]
+    if num_questions is not None:
+        question_ids_to_evaluate = question_ids_to_evaluate[:num_questions]
+
+    semaphore = asyncio.Semaphore(1) 
+    rate_limiter = create_rate_limiter()
+    raw_response, _ = await analyze_image_with_gpt4o(image_path, questions_text_block, question_ids_to_evaluate, is_test_mode=True, semaphore=semaphore, rate_limiter=rate_limiter)
+
+    answers_map = extract_answers(raw_response, question_ids_to_evaluate)
+
+    if not answers_map or all(v == -1 for v in answers_map.values()):
+        print("⚠️ 未能从API响应中提取到有效答案或所有答案均无效。")
+        data_for_df = {qid: [-1] for qid in question_ids_to_evaluate}
+        problems_found_count = 0
+    else:
+        data_for_df = {qid: [answers_map.get(qid, -1)] for qid in question_ids_to_evaluate}
+        problems_found_count = sum(1 for qid in question_ids_to_evaluate if answers_map.get(qid) == 1)
+
+    main_df = pd.DataFrame(data_for_df)
+    main_df.insert(0, "Image", os.path.basename(image_path))
+    main_df["Problems_Found"] = problems_found_count
+    
+    save_test_mode_results(main_df, raw_response, os.path.basename(image_path))
+
+    print("\n数据概览:")
+    print(main_df.to_string())
+    print(f"\n发现的问题数量: {problems_found_count}/{len(question_ids_to_evaluate)}")
+
+def save_batch_image_result(image_filename, raw_response, question_ids_expected, journal, store=None, partial=False, span=None, duplicates=(), votes=None):
+    # duplicates: [(近重复图片, 汉明距离), ...]，这些图片直接复用本图片的判断结果
+    # votes: vote_on_undetermined 的结果，投票得出的判断覆盖原响应中的 -1
+    if not raw_response:
+        result_message = f"{image_filename}: ❌ (API调用失败)"
+        journal.record(image_filename, STATE_FAILED, error="API调用失败")
+        for duplicate_filename, _ in duplicates:
+            journal.record(duplicate_filename, STATE_FAILED, error=f"代表图片 {image_filename} API调用失败")
+    else:
+        with measure(span, "parse"):
+            answers_map = extract_answers(raw_response, question_ids_expected)
+            vote_counts = {}
+            for q_id, (judgment, counts) in (votes or {}).items():
+                answers_map[q_id] = judgment
+                vote_counts[q_id] = counts
+        with measure(span, "write"):
+            result_message = write_batch_image_result(image_filename, raw_response, answers_map, question_ids_expected, journal, store, partial,
+                                                      votes=vote_counts)
+            for duplicate_filename, distance in duplicates:
+                write_batch_image_result(duplicate_filename, raw_response, answers_map, question_ids_expected, journal, store, partial,
+                                         duplicate_of=(image_filename, distance), votes=vote_counts)
+    if span is not None and journal.states[image_filename]["state"] == STATE_FAILED:
+        span.error = journal.states[image_filename]["error"]
+    return result_message
+
+def write_batch_image_result(image_filename, raw_response, answers_map, question_ids_expected, journal, store=None, partial=False, duplicate_of=None, votes=None):
+    answers_valid = bool(answers_map) and not all(v == -1 for v in answers_map.values())
+    if partial and answers_map and not answers_valid:
+        # 增量模式只重新询问少数问题，全部回答无法判断 (-1) 也是正常结果；只有响应无法解析或没有任何有效判断时才算失败
+        parsed_answers, _ = parse_judgments_text(raw_response)
+        answers_valid = bool(parsed_answers) and any(q_id in parsed_answers for q_id in question_ids_expected)
+
+    if store is not None:
+        # 写入线程提交成功后才把图片标记为完成，中途崩溃的图片会在续跑时重新处理
+        # 近重复图片只保存判断和来源，原始响应保存在代表图片下
+        stored_response = None if duplicate_of else raw_response
+        if answers_valid:
+            judgments = {q_id: answers_map.get(q_id, -1) for q_id in question_ids_expected}
+            store.add_result(image_filename, judgments, stored_response, partial=partial, duplicate_of=duplicate_of, votes=votes,
+                             on_committed=lambda: journal.record(image_filename, STATE_DONE))
+            problems_found_count = sum(1 for j in judgments.values() if j == 1)
+            return f"{image_filename}: ✔️ ({problems_found_count} 问题)"
+        if stored_response:
+            # 不覆盖已保存的有效响应，失败的响应单独记录
+            store.add_failed_response(image_filename, stored_response, "提取答案失败")
+        journal.record(image_filename, STATE_FAILED, error="提取答案失败")
+        return f"{image_filename}: ⚠️ (提取答案失败)"
+
+    output_stem = image_output_stem(image_filename)
+    raw_output_filename = f"{output_stem}_raw_response.json"
+    raw_output_path = os.path.join(BATCH_OUTPUT_FOLDER, raw_output_filename)
+    try:
+        parsed_json = json.loads(raw_response)
+        if votes and isinstance(parsed_json, dict):
+            parsed_json["votes"] = votes  # 旧版输出没有数据库，票数随原始响应一起保存
+        with open(raw_output_path, 'w', encoding='utf-8') as f:
+            json.dump(parsed_json, f, ensure_ascii=False, indent=2)
+    except json.JSONDecodeError:
+        with open(raw_output_path, 'w', encoding='utf-8') as f:
+            f.write(raw_response)
+        # print(f"提示: {image_filename} 的API响应不是有效JSON，已按原样保存为文本。") 
+    except Exception as e:
+        print(f"保存 {image_filename} 的原始响应时出错: {e}")
+
+    if answers_valid:
+        judgments_data = [answers_map.get(q_id, -1) for q_id in question_ids_expected]
+        problems_found_count = sum(1 for j in judgments_data if j == 1)
+        
+        import pandas as pd  # 只有旧版逐图 CSV 输出需要 pandas
+        df_single_image = pd.DataFrame([judgments_data], columns=question_ids_expected)
+        df_single_image.insert(0, "Image", image_filename)
+        df_single_image["Problems_Found"] = problems_found_count
+
+        csv_filename = f"{output_stem}_judgments.csv"
+        csv_output_path = os.path.join(BATCH_OUTPUT_FOLDER, csv_filename)
+        try:
+            df_single_image.to_csv(csv_output_path, index=False, encoding='utf-8-sig')
+        except Exception as e:
+            print(f"保存 {image_filename} 的判断结果CSV时出错: {e}")
+            journal.record(image_filename, STATE_FAILED, error=f"保存CSV失败: {e}")
+            return f"{image_filename}: ❌ (保存结果失败)"
+        journal.record(image_filename, STATE_DONE)
+        return f"{image_filename}: ✔️ ({problems_found_count} 问题)"
+    else:
+        journal.record(image_filename, STATE_FAILED, error="提取答案失败")
+        return f"{image_filename}: ⚠️ (提取答案失败)"
+
+def open_result_store(legacy_output):
+    if legacy_output:
+        print("📄 旧版输出模式: 每张图片单独保存 CSV 和 JSON 文件。")
+        return None
+    print(f"🗄️ 结果将写入数据库: {RESULT_STORE_PATH}")
+    return ResultStore(RESULT_STORE_PATH, flush_rows=STORE_FLUSH_ROWS, flush_interval_seconds=STORE_FLUSH_INTERVAL_SECONDS,
+                       question_versions=question_set_versions(parse_questions_for_ids(questions_data())))
+
+def plan_changed_questions():
+    # 返回 (已保存的问题版本, 当前问题版本)；只读取数据库，已删除问题的旧判断在运行成功结束后才清理
+    # 分片运行时同时参考主结果数据库和本分片尚未合并的结果
+    current_versions = question_set_versions(parse_questions_for_ids(questions_data()))
+    store_paths = [RESULT_STORE_PATH]
+    if merged_result_store_path:
+        store_paths.insert(0, merged_result_store_path)
+    answered_versions = {}
+    for store_path in store_paths:
+        for image, versions in load_answered_versions(store_path).items():
+            answered_versions[image] = {**answered_versions[image], **versions} if image in answered_versions else versions
+    print(f"🔁 增量模式: 数据库中已有 {len(answered_versions)} 张图片，只评估新增或内容变更的问题。")
+    return answered_versions, current_versions
+
+def finish_changed_questions():
+    # 增量运行成功结束后才清理旧判断，评估中途出错不会先丢掉数据；
+    # 分片进程不清理共用的主数据库，由合并步骤在父进程中执行一次
+    if current_shard() is not None:
+        print("🧹 分片运行不清理已移出问题清单的判断，合并时使用 merge --prune-removed (--processes 会自动清理)。")
+        return
+    prune_removed_question_judgments(RESULT_STORE_PATH, [q_id for q_id, _ in parse_questions_for_ids(questions_data())])
+
+async def close_result_store(store):
+    if store is not None:
+        await asyncio.to_thread(store.close)
+
+def create_metrics_recorder():
+    metrics = MetricsRecorder(METRICS_PATH, PROMETHEUS_METRICS_PATH, input_price_per_million=PRICE_INPUT_PER_MILLION,
+                              output_price_per_million=PRICE_OUTPUT_PER_MILLION,
+                              cached_input_price_per_million=PRICE_CACHED_INPUT_PER_MILLION,
+                              write_interval_seconds=METRICS_WRITE_INTERVAL_SECONDS)
+    # 客户端在第一次请求时才创建，连接池统计在写入指标时再获取
+    metrics.add_gauge_source(lambda: get_pool_stats().prometheus_gauges() if get_pool_stats() else [])
+    return metrics
+
+def print_metrics_summary(metrics):
+    tokens = metrics.token_totals
+    print("\n⏱️ 耗时分布 (总耗时 / 平均):")
+    for stage, total_seconds, mean_seconds in metrics.stage_breakdown():
+        print(f"   {stage:<15} {total_seconds:9.1f} 秒 / {mean_seconds:.3f} 秒")
+    print(f"💰 token: 提示词 {tokens['prompt']} (缓存 {tokens['cached']})，输出 {tokens['completion']}，"
+          f"估计图片 {tokens['image_estimated']}；费用约 ${metrics.cost_total:.2f}")
+    if tokens["usage_estimated"]:
+        print(f"   其中 {tokens['usage_estimated']} 个 token 来自中途中止、没有返回 usage 的尝试 (估计值)")
+    pool_stats = get_pool_stats()
+    if pool_stats is not None:
+        print(f"🔌 连接池: {pool_stats.summary_line()}")
+    print(f"📈 指标已写入: {METRICS_PATH} 和 {PROMETHEUS_METRICS_PATH}")
+
+def plan_near_duplicates(image_files, near_duplicates, group_of=None):
+    # 为待处理图片计算感知哈希并聚类，返回需要评估的代表图片列表 (保持原有顺序)；
+    # near_duplicates 中填入 {代表图片: [(近重复图片, 汉明距离), ...]}，对应关系同时写入 NEAR_DUPLICATES_PATH
+    image_files = list(image_files)
+    if not image_files:
+        return image_files
+    print(f"🪞 正在为 {len(image_files)} 张图片计算感知哈希 ({NEAR_DUPLICATE_HASH})...")
+    image_hashes = compute_image_hashes(DATA_FOLDER, image_files, method=NEAR_DUPLICATE_HASH,
+                                        cache_path=IMAGE_HASH_CACHE_PATH, workers=PREPROCESS_WORKERS)
+
+    def cluster_group(image_filename):
+        folder = os.path.dirname(image_filename) if NEAR_DUPLICATE_SAME_FOLDER else None
+        return folder, group_of(image_filename) if group_of else None
+
+    clusters = cluster_near_duplicates(image_hashes, NEAR_DUPLICATE_MAX_DISTANCE, group_of=cluster_group)
+    near_duplicates.update((representative, members) for representative, members in clusters.items() if members)
+    duplicate_filenames = {member for members in near_duplicates.values() for member, _ in members}
+
+    with open(NEAR_DUPLICATES_PATH, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Image", "Duplicate_Of", "Hamming_Distance"])
+        for representative, members in near_duplicates.items():
+            writer.writerows((member, representative, distance) for member, distance in members)
+    print(f"🪞 近重复检测: {len(duplicate_filenames)} 张图片与其他图片近似重复，将直接复用 {len(near_duplicates)} 张代表图片的结果。")
+    # 无法计算哈希的图片 (如损坏的文件) 仍按普通图片处理
+    return [image_filename for image_filename in image_files if image_filename not in duplicate_filenames]
+
+def iter_image_packs(image_files, pack_size, group_by_folder=PACK_GROUP_BY_FOLDER, pack_key=None):
+    # 目录遍历会连续产出同一文件夹中的图片，因此只需把相邻的图片分组
+    # pack_key 返回值不同的图片 (例如需要评估的问题不同) 不会被放进同一个包
+    def group_of(image_filename):
+        return (os.path.dirname(image_filename) if group_by_folder else None,
+                pack_key(image_filename) if pack_key else None)
+
+    pack = []
+    for image_filename in image_files:
+        if pack and (len(pack) >= pack_size or group_of(pack[0]) != group_of(image_filename)):
+            yield tuple(pack)
+            pack = []
+        pack.append(image_filename)
+    if pack:
+        yield tuple(pack)
+
+async def process_batch(use_cache=USE_CACHE, resume=False, pack_size=PACK_SIZE, legacy_output=False, only_changed=False, dedupe=NEAR_DUPLICATE_DETECTION,
+                        vote=VOTE_UNDETERMINED):
+    os.makedirs(BATCH_OUTPUT_FOLDER, exist_ok=True)
+    print(f"🚀 批处理模式已启用，将处理 '{DATA_FOLDER}'中的所有图片。")
+    print(f"📂 结果将保存到: {BATCH_OUTPUT_FOLDER}")
+
+    journal = open_job_journal()
+    if resume:
+        print("⏩ 续跑模式: 将跳过任务日志中已完成的图片。")
+
+    questions_text_block = format_questions(questions_data()) 
+    all_question_tuples = parse_questions_for_ids(questions_data())
+    question_ids_expected = [q_id for q_id, _ in all_question_tuples]
+
+    semaphore = asyncio.Semaphore(CONCURRENT_REQUEST_LIMIT)
+    payload_budget = create_payload_budget()
+    rate_limiter = create_rate_limiter()
+
+    cache = None
+    if use_cache:
+        cache = ResponseCache(CACHE_FOLDER, max_size_mb=CACHE_MAX_SIZE_MB, max_age_days=CACHE_MAX_AGE_DAYS,
+                              image_cache_dir=PREPROCESSED_CACHE_FOLDER)
+        removed_count, freed_bytes = cache.evict()
+        if removed_count:
+            print(f"🧹 已淘汰 {removed_count} 条过期缓存，释放 {freed_bytes / 1024 / 1024:.1f} MB。")
+    else:
+        print("⚠️ 已禁用响应缓存，所有图片都将重新调用API。")
+
+    preprocess_pool = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS) if PREPROCESS_IMAGES else None
+    store = open_result_store(legacy_output)
+    metrics = create_metrics_recorder()
+    metrics.add_gauge_source(payload_budget.prometheus_gauges)
+
+    answered_versions, current_versions = {}, None
+    if only_changed:
+        if store is None:
+            print("⚠️ 增量模式需要结果数据库，旧版输出模式下将评估全部问题。")
+        else:
+            answered_versions, current_versions = plan_changed_questions()
+    question_subsets = {}  # 只需评估部分问题的图片 -> 问题ID元组
+    question_text_blocks = {}
+    vote_counts = {"questions": 0, "samples": 0, "resolved": 0}
+    if vote:
+        print(f"🗳️ 投票复查: 判断为 -1 的问题最多重新采样 {VOTE_MAX_SAMPLES} 次，按多数票得出判断。")
+
+    scan_counts = {"found": 0, "skipped": 0}
+
+    def iter_pending_images():
+        for rel_path in iter_data_images():
+            scan_counts["found"] += 1
+            if current_versions is not None:
+                # 增量模式以数据库中的问题版本为准，不依赖任务日志
+                stale_ids = stale_question_ids(answered_versions.get(rel_path, {}), current_versions)
+                if not stale_ids:
+                    scan_counts["skipped"] += 1
+                    continue
+                if len(stale_ids) < len(question_ids_expected):
+                    question_subsets[rel_path] = stale_ids
+            elif resume and journal.is_done(rel_path):
+                scan_counts["skipped"] += 1
+                continue
+            journal.record(rel_path, STATE_PENDING)
+            yield rel_path
+
+    def questions_for(image_filename):
+        # 返回 (问题文本块, 问题ID列表, 是否只评估部分问题)
+        question_ids = question_subsets.pop(image_filename, None)
+        if question_ids is None:
+            return questions_text_block, question_ids_expected, False
+        if question_ids not in question_text_blocks:
+            question_text_blocks[question_ids] = format_questions(questions_data(), question_ids=set(question_ids))
+        return question_text_blocks[question_ids], list(question_ids), True
+
+    async def vote_task(image_path, raw_response, question_ids, span):
+        if not vote:
+            return None
+        votes = await vote_on_undetermined(image_path, raw_response, question_ids, semaphore, rate_limiter, cache=cache,
+                                           preprocess_pool=preprocess_pool, span=span, payload_budget=payload_budget)
+        vote_counts["questions"] += len(votes)
+        vote_counts["samples"] += max((sum(counts.values()) for _, counts in votes.values()), default=0)
+        vote_counts["resolved"] += sum(1 for judgment, _ in votes.values() if judgment != -1)
+        return votes
+
+    async def process_image_task(image_filename):
+        image_path = os.path.join(DATA_FOLDER, image_filename)
+        journal.record(image_filename, STATE_IN_FLIGHT)
+        text_block, question_ids, partial = questions_for(image_filename)
+        span = metrics.start_span(image_filename)
+        raw_response, _ = await analyze_image_with_gpt4o(image_path, text_block, question_ids, is_test_mode=False, semaphore=semaphore, rate_limiter=rate_limiter, cache=cache, preprocess_pool=preprocess_pool, span=span,
+                                                         payload_budget=payload_budget)
+        votes = await vote_task(image_path, raw_response, question_ids, span)
+
+        result_message = save_batch_image_result(image_filename, raw_response, question_ids, journal, store, partial=partial, span=span,
+                                                 duplicates=near_duplicates.get(image_filename, ()), votes=votes)
+        metrics.finish(span)
+        return result_message
+
+    async def process_pack_task(image_filenames):
+        for image_filename in image_filenames:
+            journal.record(image_filename, STATE_IN_FLIGHT)
+        # 同一个包中的图片需要评估的问题相同 (见 iter_image_packs 的 pack_key)
+        pack_questions = [questions_for(image_filename) for image_filename in image_filenames]
+        text_block, question_ids, partial = pack_questions[0]
+        image_paths = [os.path.join(DATA_FOLDER, image_filename) for image_filename in image_filenames]
+        # 一个包只有一个请求，span 记录整个包的耗时和费用，包中任一图片失败即记为失败
+        span = metrics.start_span(image_filenames[0], images=len(image_filenames))
+        raw_responses = await analyze_image_pack_with_gpt4o(image_paths, text_block, semaphore, rate_limiter, cache=cache, preprocess_pool=preprocess_pool, span=span,
+                                                            payload_budget=payload_budget)
+        # 复查请求按单图发送，包中各图片的投票并发进行
+        pack_votes = await asyncio.gather(*(vote_task(image_path, raw_response, question_ids, span)
+                                            for image_path, raw_response in zip(image_paths, raw_responses)))
+        result_messages = [save_batch_image_result(image_filename, raw_response, question_ids, journal, store, partial=partial, span=span,
+                                                   duplicates=near_duplicates.get(image_filename, ()), votes=votes)
+                           for image_filename, raw_response, votes in zip(image_filenames, raw_responses, pack_votes)]
+        metrics.finish(span)
+        return result_messages
+
+    # 图片总数事先未知，进度条显示已完成数量，并附带延迟、token 和费用的实时汇总
+    progress_bar = tqdm_asyncio(desc="处理图片中", unit="张")
+    postfix_refreshed_at = [0.0]
+
+    def refresh_progress_postfix(force=False):
+        # 汇总需要计算分位数，每 PROGRESS_REFRESH_SECONDS 秒最多计算一次，而不是每完成一张图片都计算
+        now = time.monotonic()
+        if force or now - postfix_refreshed_at[0] >= PROGRESS_REFRESH_SECONDS:
+            postfix_refreshed_at[0] = now
+            progress_bar.set_postfix_str(metrics.summary_line(), refresh=False)
+
+    def on_image_done(image_filename, result_message):
+        progress_bar.update(1 + len(near_duplicates.pop(image_filename, ())))
+        refresh_progress_postfix()
+        # print(result_message) 
+
+    def on_pack_done(image_filenames, result_messages):
+        progress_bar.update(sum(1 + len(near_duplicates.pop(image_filename, ())) for image_filename in image_filenames))
+        refresh_progress_postfix()
+
+    near_duplicates = {}  # 代表图片 -> [(近重复图片, 汉明距离), ...]
+    pending_images = iter_pending_images()
+    if pack_size > 1:
+        print(f"🗂️ 多图打包模式: 每次请求最多包含 {pack_size} 张图片。")
+
+    try:
+        if dedupe:
+            # 聚类需要先扫描完整个目录；只在需要评估的问题相同的图片之间复用结果
+            pending_images = plan_near_duplicates(pending_images, near_duplicates, group_of=question_subsets.get)
+            for members in near_duplicates.values():
+                for member, _ in members:
+                    question_subsets.pop(member, None)
+        if pack_size > 1:
+            work_items = iter_image_packs(pending_images, pack_size, group_by_folder=PACK_GROUP_BY_FOLDER, pack_key=question_subsets.get)
+            worker_fn, on_result = process_pack_task, on_pack_done
+        else:
+            work_items, worker_fn, on_result = pending_images, process_image_task, on_image_done
+
+        await run_bounded_pipeline(work_items, worker_fn, num_workers=CONCURRENT_REQUEST_LIMIT,
+                                   queue_size=TASK_QUEUE_SIZE, on_result=on_result)
+    finally:
+        refresh_progress_postfix(force=True)
+        progress_bar.close()
+        await close_result_store(store)
+        journal.close()
+        metrics.close()
+        if preprocess_pool is not None:
+            preprocess_pool.shutdown(cancel_futures=True)
+
+    if scan_counts["found"] == 0:
+        print(f"在 '{DATA_FOLDER}' 中未找到图片文件。")
+        return
+    if current_versions is not None:
+        print(f"🔁 共发现 {scan_counts['found']} 张图片，跳过所有问题均为最新版本的 {scan_counts['skipped']} 张。")
+        finish_changed_questions()
+    elif resume:
+        print(f"⏩ 共发现 {scan_counts['found']} 张图片，跳过已完成的 {scan_counts['skipped']} 张。")
+
+    state_counts = journal.summary()
+    print(f"\n📒 任务日志: 完成 {state_counts.get(STATE_DONE, 0)}，失败 {state_counts.get(STATE_FAILED, 0)}，"
+          f"未完成 {state_counts.get(STATE_PENDING, 0) + state_counts.get(STATE_IN_FLIGHT, 0)}。")
+
+    print_metrics_summary(metrics)
+    print(f"📦 图片与请求体内存: {payload_budget.summary_line()}")
+
+    if vote_counts["questions"]:
+        print(f"🗳️ 投票复查: {vote_counts['questions']} 个无法判断的问题共采样 {vote_counts['samples']} 次，"
+              f"其中 {vote_counts['resolved']} 个得出判断，票数已保存到{'结果数据库的 votes 列' if not legacy_output else '原始响应的 votes 字段'}。")
+
+    if rate_limiter.rate_limited_count:
+        print(f"\n🚦 共遇到 {rate_limiter.rate_limited_count} 次速率限制 (429)。")
+
+    if cache is not None:
+        cache.evict()
+        print(f"\n💾 缓存命中 {cache.hits} 张，未命中 {cache.misses} 张。")
+
+    print("\n🎉 所有图片处理完成。")
+    print(f"📂 请检查输出文件夹: {BATCH_OUTPUT_FOLDER}")
+
+async def process_batch_api(use_cache=USE_CACHE, resume=False, legacy_output=False, only_changed=False, dedupe=NEAR_DUPLICATE_DETECTION):
+    os.makedirs(BATCH_API_FOLDER, exist_ok=True)
+    manifest_path = os.path.join(BATCH_API_FOLDER, "manifest.json")
+    print(f"🌙 Batch API 模式已启用，将离线处理 '{DATA_FOLDER}'中的所有图片。")
+    print(f"📂 结果将保存到: {BATCH_OUTPUT_FOLDER}")
+
+    journal = open_job_journal()
+    questions_text_block = format_questions(questions_data())
+    all_question_tuples = parse_questions_for_ids(questions_data())
+    question_ids_expected = [q_id for q_id, _ in all_question_tuples]
+    cache = ResponseCache(CACHE_FOLDER, max_size_mb=CACHE_MAX_SIZE_MB, max_age_days=CACHE_MAX_AGE_DAYS,
+                          image_cache_dir=PREPROCESSED_CACHE_FOLDER) if use_cache else None
+    store = open_result_store(legacy_output)
+
+    manifest = load_batch_manifest(manifest_path)
+    try:
+        if manifest.get("batches"):
+            submitted_count = sum(1 for entry in manifest["batches"] if entry.get("batch_id"))
+            print(f"⏩ 发现 {submitted_count} 个已提交的批处理任务，继续等待其结果。")
+        else:
+            cache_keys = {}
+            submitted_by_key = {}
+            duplicates = {}
+            question_subsets = {}
+            question_blocks = {}
+            near_duplicates = {}
+
+            answered_versions, current_versions = {}, None
+            if only_changed:
+                if store is None:
+                    print("⚠️ 增量模式需要结果数据库，旧版输出模式下将评估全部问题。")
+                else:
+                    answered_versions, current_versions = plan_changed_questions()
+
+            def iter_pending_images():
+                for rel_path in iter_data_images():
+                    if current_versions is not None:
+                        stale_ids = stale_question_ids(answered_versions.get(rel_path, {}), current_versions)
+                        if not stale_ids:
+                            continue
+                        if len(stale_ids) < len(question_ids_expected):
+                            question_subsets[rel_path] = list(stale_ids)
+                    elif resume and journal.is_done(rel_path):
+                        continue
+                    yield rel_path
+
+            def iter_batch_requests(pending_images):
+                for rel_path in pending_images:
+                    image_questions_block = questions_text_block
+                    if rel_path in question_subsets:
+                        stale_ids = tuple(question_subsets[rel_path])
+                        if stale_ids not in question_blocks:
+                            question_blocks[stale_ids] = format_questions(questions_data(), question_ids=set(stale_ids))
+                        image_questions_block = question_blocks[stale_ids]
+                    image = load_image(os.path.join(DATA_FOLDER, rel_path))
+                    if not image:
+                        journal.record(rel_path, STATE_FAILED, error="读取图片失败")
+                        continue
+                    image_prompt_text = build_user_prompt(image_questions_block)
+                    system_prompt, response_format, max_tokens = response_settings(image_questions_block)
+                    if cache is not None:
+                        cache_key = compute_cache_key(image.data, system_prompt + image_prompt_text, MODEL_NAME, TEMPERATURE)
+                        cached_response = cache.get(cache_key, validate=is_cacheable_response)
+                        if cached_response is not None:
+                            save_batch_image_result(rel_path, cached_response, question_subsets.get(rel_path, question_ids_expected),
+                                                    journal, store, partial=rel_path in question_subsets,
+                                                    duplicates=near_duplicates.pop(rel_path, ()))
+                            continue
+                        if cache_key in submitted_by_key:
+                            # 内容相同的图片只提交一次，结果返回后复制给重复的图片
+                            duplicates.setdefault(submitted_by_key[cache_key], []).append(rel_path)
+                            journal.record(rel_path, STATE_IN_FLIGHT)
+                            continue
+                        submitted_by_key[cache_key] = rel_path
+                        cache_keys[rel_path] = cache_key
+                    journal.record(rel_path, STATE_IN_FLIGHT)
+                    yield rel_path, build_request_body(image_prompt_text, [encode_data_url(image.data, image.mime_type)], stream=False,
+                                                       system_prompt=system_prompt, max_tokens=max_tokens, response_format=response_format)
+
+            def fail_skipped_request(rel_path, error):
+                # 未写入分片的请求不会有结果，把图片及其重复图片标记为失败，不留在 in_flight 状态
+                cache_key = cache_keys.pop(rel_path, None)
+                if submitted_by_key.get(cache_key) == rel_path:
+                    del submitted_by_key[cache_key]
+                for target_filename in [rel_path] + duplicates.pop(rel_path, []):
+                    journal.record(target_filename, STATE_FAILED, error=error)
+                    for duplicate_filename, _ in near_duplicates.pop(target_filename, ()):
+                        journal.record(duplicate_filename, STATE_FAILED, error=f"代表图片 {target_filename}: {error}")
+
+            pending_images = iter_pending_images()
+            if dedupe:
+                pending_images = plan_near_duplicates(pending_images, near_duplicates,
+                                                      group_of=lambda rel_path: tuple(question_subsets.get(rel_path, ())))
+                for members in near_duplicates.values():
+                    for member, _ in members:
+                        question_subsets.pop(member, None)
+            shard_paths = write_batch_shards(iter_batch_requests(pending_images), BATCH_API_FOLDER, max_requests=BATCH_MAX_REQUESTS_PER_FILE,
+                                             on_skipped=fail_skipped_request)
+            if not shard_paths:
+                print("没有需要提交的图片。")
+                if current_versions is not None:
+                    finish_changed_questions()
+                return
+            print(f"📦 已生成 {len(shard_paths)} 个批处理请求文件，开始上传并提交...")
+
+            # 提交前先把所有分片写入清单 (batch_id 为空表示尚未提交)，提交到一半失败时再次运行会继续提交剩余的分片
+            manifest = {"batches": [{"shard": shard_path, "batch_id": None} for shard_path in shard_paths],
+                        "cache_keys": cache_keys, "duplicates": duplicates, "question_subsets": question_subsets,
+                        "near_duplicates": near_duplicates}
+            save_batch_manifest(manifest_path, manifest)
+
+        for entry in manifest["batches"]:
+            if entry.get("batch_id"):
+                continue
+            try:
+                entry["batch_id"] = await submit_batch_shard(api_client(), entry["shard"], completion_window=BATCH_COMPLETION_WINDOW)
+            except Exception as e:
+                remaining_count = sum(1 for item in manifest["batches"] if not item.get("batch_id"))
+                print(f"❌ 提交 {os.path.basename(entry['shard'])} 失败: {e}")
+                print(f"   还有 {remaining_count} 个分片未提交，再次运行 run --batch-api 会继续提交并等待已提交的任务。")
+                raise SystemExit(1)
+            # 每提交一个分片就写入清单，程序中断后可继续等待而不必重新提交
+            save_batch_manifest(manifest_path, manifest)
+            print(f"   已提交 {os.path.basename(entry['shard'])} -> {entry['batch_id']}")
+
+        def on_batch_status(batch):
+            counts = batch.request_counts
+            progress = f" ({counts.completed + counts.failed}/{counts.total})" if counts else ""
+            print(f"   批处理 {batch.id}: {batch.status}{progress}")
+
+        batch_ids = [entry["batch_id"] for entry in manifest["batches"]]
+        finished_batches = await wait_for_batches(api_client(), batch_ids, BATCH_POLL_INTERVAL_SECONDS, on_status=on_batch_status)
+
+        cache_keys = manifest.get("cache_keys", {})
+        duplicates = manifest.get("duplicates", {})
+        question_subsets = manifest.get("question_subsets", {})
+        near_duplicates = manifest.get("near_duplicates", {})
+        for batch in finished_batches.values():
+            if batch.status != "completed":
+                print(f"⚠️ 批处理 {batch.id} 状态为 {batch.status}，未返回结果的图片可用 --resume 重新处理。")
+            async for image_filename, raw_response, error in iter_batch_results(api_client(), batch):
+                # 重复图片的缓存键相同，需要评估的问题也相同
+                question_ids = question_subsets.get(image_filename, question_ids_expected)
+                for target_filename in [image_filename] + duplicates.get(image_filename, []):
+                    if error:
+                        journal.record(target_filename, STATE_FAILED, error=error)
+                        for duplicate_filename, _ in near_duplicates.get(target_filename, ()):
+                            journal.record(duplicate_filename, STATE_FAILED, error=f"代表图片 {target_filename}: {error}")
+                    else:
+                        save_batch_image_result(target_filename, raw_response, question_ids, journal, store,
+                                                partial=image_filename in question_subsets,
+                                                duplicates=near_duplicates.get(target_filename, ()))
+                cache_key = cache_keys.get(image_filename)
+                if cache is not None and cache_key and is_cacheable_response(raw_response):
+                    cache.put(cache_key, raw_response, {"image": os.path.basename(image_filename), "model": MODEL_NAME})
+
+        for entry in manifest["batches"]:
+            if os.path.exists(entry["shard"]):
+                os.remove(entry["shard"])
+        os.remove(manifest_path)
+    finally:
+        await close_result_store(store)
+        journal.close()
+
+    if only_changed and store is not None:
+        finish_changed_questions()
+    state_counts = journal.summary()
+    print(f"\n📒 任务日志: 完成 {state_counts.get(STATE_DONE, 0)}，失败 {state_counts.get(STATE_FAILED, 0)}，"
+          f"未完成 {state_counts.get(STATE_PENDING, 0) + state_counts.get(STATE_IN_FLIGHT, 0)}。")
+    print("\n🎉 Batch API 结果处理完成。")
+    print(f"📂 请检查输出文件夹: {BATCH_OUTPUT_FOLDER}")
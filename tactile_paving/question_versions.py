@@ -0,0 +1,21 @@
+import hashlib
+
+# ========== 问题版本 ==========
+# 每个问题的版本号是其 ID 和文本内容的哈希。修改或新增问题清单中的某一行时，
+# 只有该问题的版本会变化；结果数据库记录每个判断对应的问题版本，
+# 重新运行时只需为每张图片发送版本不一致或尚未回答的问题。
+
+
+def question_version(question_id, question_text):
+    return hashlib.sha256(f"{question_id}\n{question_text.strip()}".encode("utf-8")).hexdigest()[:12]
+
+
+def question_set_versions(question_tuples):
+    # question_tuples: [(问题ID, 问题文本), ...] -> {问题ID: 版本}，保持问题顺序
+    return {question_id: question_version(question_id, question_text) for question_id, question_text in question_tuples}
+
+
+def stale_question_ids(answered_versions, current_versions):
+    # answered_versions: 该图片已保存的 {问题ID: 版本}；返回需要重新评估的问题ID (按当前顺序)
+    return tuple(question_id for question_id, version in current_versions.items()
+                 if answered_versions.get(question_id) != version)
@@ -0,0 +1,126 @@
+# ========== 问题清单 ==========
+# 每行一个问题，格式为 "问题ID 问题文本"。QUESTION_SETS 按语言提供问题清单，
+# 两种语言的问题ID一一对应，结果可以直接比较；也可以通过 QUESTIONS_FILE 配置使用自定义清单。
+
+QUESTIONS_ZH = """
+1.1.1 盲道砖之间是否存在明显的裂缝或过宽的缝隙？
+1.1.2 盲道与相邻路面之间是否存在高度差？
+1.1.3 盲道的不同部分之间是否存在较大的颜色差异？
+1.1.4 盲道上的触觉点或条纹是否严重磨损或缺失？
+1.1.5 导向型盲道是否直接引导至楼梯、栅栏或其他障碍物？
+1.1.6 盲道的连续性是否被检查井盖或管道出口打断？
+1.1.7 在需要设置盲道的位置（如地铁入口、公交车站）是否完全缺失盲道？
+1.1.8 这段盲道是否包含两个以上超过90度的转弯？
+1.2.1 是否有行人长时间停留在盲道上？
+1.2.2 是否有快递员或外卖骑手临时停靠在盲道上或旁边？
+1.2.3 是否有清洁车辆或卫生工具占据盲道？
+1.2.4 盲道上是否有非机动车（如自行车、电动自行车）停放？
+2.1.1 盲道是否距离墙壁不足250毫米？
+2.1.2 盲道是否距离绿化带或种植区不足250毫米？
+2.1.3 盲道是否距离树坑不足250毫米？
+2.1.4 垃圾桶是否放置在盲道两侧250毫米范围内？
+2.1.5 标志杆、灯柱或信息柱是否放置在盲道两侧250毫米范围内？
+2.1.6 广告箱、邮箱或电气柜是否放置在盲道两侧250毫米范围内？
+2.1.7 交通杆或导向柱是否位于盲道两侧250毫米范围内？
+2.1.8 周围地砖颜色是否与盲道过于相似，导致难以区分？
+2.1.9 周围地砖是否具有相似的触觉纹理，影响辨别？
+2.1.10 盲道的边缘是否未明确定义，难以通过触摸检测？
+2.2.1 盲道旁边是否有建筑障碍物，且没有设置临时引导砖？
+2.2.2 是否有街头小贩在盲道250毫米范围内设摊？
+2.2.3 是否有快递架或广告板临时放置在盲道附近？
+2.2.4 是否有共享单车停放在盲道250毫米范围内？
+2.2.5 是否有电动自行车、踏板车或其他非机动车阻塞盲道边缘？
+3.1.1 当前人行道宽度是否小于2.0米？
+3.1.2 人行道上是否有障碍物使有效通行宽度小于2.0米？
+3.1.3 路缘石是否完全缺失？
+3.1.4 路缘石是否过高（大于15厘米），导致通行困难？
+3.1.5 路缘石是否过低（小于3厘米），增加视障行人进入机动车道的风险？
+3.1.6 人行道与机动车道之间是否没有明确分隔？
+3.1.7 人行道与道路是否处于同一水平，没有高度差？
+3.2.1 建筑材料是否堆放在盲道或人行道上？
+3.2.2 是否有堆积的绿化垃圾（如落叶、树枝）？
+3.2.3 装修垃圾或废弃家具是否堆放在盲道附近？
+3.2.4 临时建筑工地是否没有设置绕行通道或警示标志？
+3.2.5 路边摊贩是否占据人行道/盲道空间且没有设置绕行引导？
+3.2.6 商店是否将商品或家具摆放在盲道或人行道区域？
+"""
+
+QUESTIONS_EN = """
+1.1.1 Are there any significant cracks or excessively wide gaps between the tactile paving tiles?
+1.1.2 Is there any height difference between the tactile paving and the adjacent road surface?
+1.1.3 Are there large color differences between sections of the tactile paving?
+1.1.4 Are the tactile dots or bars on the paving severely worn or missing?
+1.1.5 Does the guidance paving lead directly to stairs, fences, or other obstacles?
+1.1.6 Is the continuity of the tactile paving interrupted by manholes or pipe outlets?
+1.1.7 Is tactile paving completely missing in locations where it is needed (e.g., metro entrances, bus stops)?
+1.1.8 Does this section of tactile paving contain more than two turns exceeding 90 degrees?
+1.2.1 Is there any pedestrian staying on the tactile paving for an extended period?
+1.2.2 Are there couriers or food delivery workers temporarily parked on or beside the tactile paving?
+1.2.3 Are cleaning vehicles or sanitation tools occupying the tactile paving?
+1.2.4 Are there non-motorized vehicles (e.g., bikes, e-bikes) parked on the tactile paving?
+2.1.1 Is the tactile paving within 250mm of a wall?
+2.1.2 Is the tactile paving within 250mm of greenbelt or planted area?
+2.1.3 Is the tactile paving within 250mm of a tree pit?
+2.1.4 Are garbage bins placed within 250mm on either side of the tactile paving?
+2.1.5 Are signposts, lampposts, or information columns placed within 250mm on either side?
+2.1.6 Are advertisement boxes, mailboxes, or electrical cabinets placed within 250mm on either side?
+2.1.7 Are traffic poles or guideposts located within 250mm on either side?
+2.1.8 Are surrounding floor tiles too similar in color to the tactile paving, making it hard to distinguish?
+2.1.9 Do surrounding floor tiles have similar tactile textures that impair differentiation?
+2.1.10 Are the edges of the tactile paving not clearly defined and difficult to detect by touch?
+2.2.1 Are there construction barriers directly adjacent to the tactile paving without temporary guiding tiles?
+2.2.2 Are there street vendors set up within 250mm of the tactile paving?
+2.2.3 Are delivery racks or advertisement boards temporarily placed near the tactile paving?
+2.2.4 Are shared bicycles parked within 250mm of the tactile paving?
+2.2.5 Are e-bikes, scooters, or other non-motorized vehicles blocking the tactile paving’s edge?
+3.1.1 Is the current sidewalk width less than 2.0 meters?
+3.1.2 Are there barriers on the sidewalk making the effective width less than 2.0 meters?
+3.1.3 Are curb stones completely missing?
+3.1.4 Is the curb too high (>15cm), creating difficulty in crossing?
+3.1.5 Is the curb too low (<3cm), increasing risk of blind pedestrians entering vehicular roads?
+3.1.6 Is there no clear separation between sidewalk and motor vehicle road?
+3.1.7 Is the sidewalk and the road on the same level, without height difference?
+3.2.1 Are building materials stored on the tactile or pedestrian paths?
+3.2.2 Is there accumulated green waste (e.g., fallen leaves, branches)?
+3.2.3 Are renovation wastes or abandoned furniture piled near the tactile paving?
+3.2.4 Are there temporary construction sites without bypass paths or warning signs?
+3.2.5 Are roadside vendors occupying pedestrian/tactile space without bypass guidance?
+3.2.6 Are shops placing goods or furniture on the tactile paving or pedestrian area?
+"""
+
+QUESTION_SETS = {"zh": QUESTIONS_ZH, "en": QUESTIONS_EN}
+
+
+def load_questions(language="zh", questions_file=None):
+    # 返回问题清单文本；指定 questions_file 时从文件读取 (格式相同)
+    if questions_file:
+        with open(questions_file, "r", encoding="utf-8") as f:
+            return f.read()
+    if language not in QUESTION_SETS:
+        raise ValueError(f"不支持的问题清单语言: {language} (可选: {', '.join(QUESTION_SETS)})")
+    return QUESTION_SETS[language]
+
+
+def parse_questions_for_ids(questions_as_string):
+    questions = []
+    for line in questions_as_string.strip().split('\n'):
+        if line.strip():
+            parts = line.strip().split(" ", 1)
+            if len(parts) == 2:
+                questions.append((parts[0], parts[1]))
+    return questions
+
+
+def format_questions(questions_as_string, num_questions_to_format=None, question_ids=None):
+    # question_ids 不为 None 时只保留这些问题 (用于只重新评估变更过的问题)
+    formatted_questions = []
+    questions_processed_count = 0
+    for line in questions_as_string.strip().split('\n'):
+        if line.strip():
+            if num_questions_to_format is not None and questions_processed_count >= num_questions_to_format:
+                break
+            if question_ids is not None and line.strip().split(" ", 1)[0] not in question_ids:
+                continue
+            formatted_questions.append(line.strip())
+            questions_processed_count += 1
+    return "\n".join(formatted_questions)
@@ -0,0 +1,172 @@
+import re
+import math
+import time
+import random
+import asyncio
+import functools
+
+# ========== 自适应速率限制 ==========
+# 所有请求共享一个限速器：分别用令牌桶跟踪每分钟请求数 (RPM) 和每分钟 token 数 (TPM)，
+# 根据 OpenAI 响应头 (x-ratelimit-*, retry-after) 校正额度，并按 AIMD 规则
+# (遇到 429 乘性减小、成功后加性恢复) 调整实际使用的速率比例。
+# 多个进程共用同一个 API 密钥时 (见 sharding.py)，每个进程只使用 budget_share 比例的额度，
+# 响应头中的额度和剩余量也按该比例换算。
+# estimate_text_tokens 估算提示词的 token 数：安装 tiktoken 时精确计数，否则中文按每字约 1 个 token、
+# 英文和 JSON 等 ASCII 文本按每 4 个字符约 1 个 token 估算。
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+ASCII_CHARS_PER_TOKEN = 4
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value):
+    # OpenAI 的重置时间格式形如 "1s"、"6m0s"、"20ms"
+    if not value:
+        return None
+    matches = _DURATION_PATTERN.findall(value)
+    if not matches:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in matches)
+
+
+@functools.lru_cache(maxsize=None)
+def _token_encoder(model):
+    # tiktoken 为可选依赖；未安装或无法加载编码表 (例如离线环境) 时返回 None
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:  # 未知模型名使用 GPT-4o 的编码
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_text_tokens(text, model="gpt-4o"):
+    encoder = _token_encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text))
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / ASCII_CHARS_PER_TOKEN)
+
+
+@functools.lru_cache(maxsize=256)
+def estimate_text_tokens(text, model="gpt-4o"):
+    # 提示词在各请求间重复，缓存估算结果；响应文本各不相同，直接用 count_text_tokens
+    return count_text_tokens(text, model)
+
+
+def _header_number(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.per_minute = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self):
+        # 允许约10秒的突发量
+        return self.per_minute / 6
+
+    def refill(self, rate_fraction):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute * rate_fraction / 60)
+        self.updated = now
+
+    def wait_time(self, amount, rate_fraction):
+        # 单个请求超过桶容量时，只要求桶是满的，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / (self.per_minute * rate_fraction)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute, max_retries=6, base_backoff_seconds=1.0,
+                 max_backoff_seconds=120.0, min_rate_fraction=0.1, recovery_step=0.02, budget_share=1.0):
+        self.budget_share = budget_share
+        self.request_bucket = TokenBucket(requests_per_minute * budget_share)
+        self.token_bucket = TokenBucket(tokens_per_minute * budget_share)
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.min_rate_fraction = min_rate_fraction
+        self.recovery_step = recovery_step
+        self.rate_fraction = 1.0
+        self.paused_until = 0.0
+        self.rate_limited_count = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, estimated_tokens):
+        # 按先来后到排队，直到两个令牌桶都有足够额度
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self.request_bucket.refill(self.rate_fraction)
+                self.token_bucket.refill(self.rate_fraction)
+                wait = max(self.request_bucket.wait_time(1, self.rate_fraction),
+                           self.token_bucket.wait_time(estimated_tokens, self.rate_fraction))
+                if wait <= 0:
+                    self.request_bucket.level -= 1
+                    self.token_bucket.level -= min(estimated_tokens, self.token_bucket.capacity)
+                    return
+                await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers):
+        if headers is None:
+            return
+        # 以服务端返回的真实额度为准
+        for bucket, kind in ((self.request_bucket, "requests"), (self.token_bucket, "tokens")):
+            limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+            if limit:
+                bucket.per_minute = limit * self.budget_share
+            remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+            if remaining is not None:
+                bucket.level = min(bucket.level, remaining * self.budget_share)
+                if remaining <= 0:
+                    reset_seconds = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset_seconds:
+                        self.paused_until = max(self.paused_until, time.monotonic() + reset_seconds)
+
+    def on_success(self):
+        self.rate_fraction = min(1.0, self.rate_fraction + self.recovery_step)
+
+    def on_rate_limited(self, headers=None):
+        self.rate_limited_count += 1
+        self.rate_fraction = max(self.min_rate_fraction, self.rate_fraction / 2)
+        retry_after = None
+        if headers is not None:
+            retry_after_ms = _header_number(headers, "retry-after-ms")
+            retry_after = retry_after_ms / 1000 if retry_after_ms is not None else _header_number(headers, "retry-after")
+            self.update_from_headers(headers)
+        if retry_after:
+            # 暂停所有请求，而不只是当前这一个
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        return retry_after
+
+    def backoff_delay(self, attempt, retry_after=None):
+        # 带随机抖动的指数退避 (full jitter)，不短于服务端要求的 retry-after
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
@@ -0,0 +1,214 @@
+import os
+import glob
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# ========== 结果汇总报告 ==========
+# 从结果数据库 (或旧版逐图 CSV) 读取所有判断结果，用向量化的 pandas/NumPy 运算生成：
+# 每个问题的发生率和无法判断 (-1) 比例、各类别 (1.x/2.x/3.x) 得分、问题数量分布、
+# 各文件夹/站点的汇总，并输出 CSV 表格、PNG 图表和一个静态 HTML 页面。
+# 不读取原始响应，百万行级别的数据也只需数秒。
+
+# 命令行入口为 `python -m tactile_paving report` (见 cli.py)。
+
+
+def load_judgments_from_store(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query(
+            "SELECT j.image, i.folder, j.question_id, j.judgment FROM judgments j JOIN images i ON i.image = j.image",
+            connection)
+    finally:
+        connection.close()
+    return df.astype({"image": "category", "folder": "category", "question_id": "category", "judgment": "int8"})
+
+
+def load_judgments_from_csv_folder(csv_folder):
+    # 旧版输出: 每张图片一个 <名称>_judgments.csv，列为 Image, 问题ID..., Problems_Found
+    csv_paths = glob.glob(os.path.join(csv_folder, "**", "*_judgments.csv"), recursive=True)
+    if not csv_paths:
+        return pd.DataFrame(columns=["image", "folder", "question_id", "judgment"])
+    wide = pd.concat((pd.read_csv(path, encoding="utf-8-sig", dtype={"Image": str}) for path in csv_paths), ignore_index=True)
+    wide = wide.drop(columns=["Problems_Found"], errors="ignore").drop_duplicates("Image", keep="last")
+    long = wide.melt(id_vars="Image", var_name="question_id", value_name="judgment").rename(columns={"Image": "image"})
+    long["folder"] = long["image"].map(os.path.dirname)
+    long["judgment"] = long["judgment"].fillna(-1)
+    return long.astype({"image": "category", "folder": "category", "question_id": "category", "judgment": "int8"})
+
+
+def question_sort_key(question_id):
+    return tuple(int(part) if part.isdigit() else part for part in str(question_id).split("."))
+
+
+def build_judgment_matrix(df):
+    # 用分类编码直接填充 (图片 × 问题) 矩阵，比 pivot_table 快得多
+    images = df["image"].cat.categories
+    question_ids = sorted(df["question_id"].cat.categories, key=question_sort_key)
+    question_positions = pd.Categorical(df["question_id"], categories=question_ids).codes
+    matrix = np.full((len(images), len(question_ids)), -1, dtype=np.int8)
+    matrix[df["image"].cat.codes.to_numpy(), question_positions] = df["judgment"].to_numpy()
+    return matrix, images, question_ids
+
+
+def summarize(df, question_texts=None):
+    matrix, images, question_ids = build_judgment_matrix(df)
+    positive = matrix == 1
+    undetermined = matrix == -1
+    determined_counts = (~undetermined).sum(axis=0)
+
+    question_summary = pd.DataFrame({
+        "question_id": question_ids,
+        "category": [question_id.split(".")[0] for question_id in question_ids],
+        "positive_count": positive.sum(axis=0),
+        "prevalence": positive.mean(axis=0),
+        "prevalence_determined": np.divide(positive.sum(axis=0), determined_counts,
+                                           out=np.zeros(len(question_ids)), where=determined_counts > 0),
+        "undetermined_rate": undetermined.mean(axis=0),
+    })
+    if question_texts:
+        question_summary.insert(1, "question_text", question_summary["question_id"].map(question_texts))
+
+    # 类别得分: 每张图片在该类别中被判定存在问题的比例，再对所有图片取平均
+    categories = question_summary["category"].to_numpy()
+    category_rows = []
+    for category in sorted(set(categories), key=question_sort_key):
+        columns = categories == category
+        per_image_share = positive[:, columns].mean(axis=1)
+        category_rows.append({
+            "category": category,
+            "questions": int(columns.sum()),
+            "mean_score": per_image_share.mean(),
+            "images_with_problem": int((per_image_share > 0).sum()),
+            "undetermined_rate": undetermined[:, columns].mean(),
+        })
+    category_summary = pd.DataFrame(category_rows)
+
+    problems_found = positive.sum(axis=1)
+    counts = np.bincount(problems_found, minlength=len(question_ids) + 1)
+    problems_distribution = pd.DataFrame({"problems_found": np.arange(len(counts)), "images": counts})
+    problems_distribution = problems_distribution[problems_distribution["images"] > 0].reset_index(drop=True)
+    problems_distribution["share"] = problems_distribution["images"] / len(images)
+
+    image_folders = df.drop_duplicates("image").set_index("image")["folder"].reindex(images).astype(str).to_numpy()
+    per_image = pd.DataFrame({"folder": image_folders, "problems_found": problems_found,
+                              "undetermined": undetermined.sum(axis=1)})
+    for row in category_rows:
+        per_image[f"category_{row['category']}_score"] = positive[:, categories == row["category"]].mean(axis=1)
+    folder_summary = per_image.groupby("folder").agg(
+        images=("problems_found", "size"),
+        mean_problems_found=("problems_found", "mean"),
+        max_problems_found=("problems_found", "max"),
+        undetermined_answers=("undetermined", "sum"),
+        **{column: (column, "mean") for column in per_image.columns if column.startswith("category_")},
+    ).reset_index()
+    folder_summary["undetermined_rate"] = folder_summary.pop("undetermined_answers") / (folder_summary["images"] * len(question_ids))
+    folder_summary = folder_summary.sort_values("mean_problems_found", ascending=False)
+
+    overview = {
+        "images": len(images),
+        "questions": len(question_ids),
+        "mean_problems_found": float(problems_found.mean()) if len(images) else 0.0,
+        "undetermined_rate": float(undetermined.mean()) if matrix.size else 0.0,
+    }
+    return {
+        "overview": overview,
+        "question_summary": question_summary,
+        "category_summary": category_summary,
+        "problems_distribution": problems_distribution,
+        "folder_summary": folder_summary,
+    }
+
+
+def render_charts(summary, output_folder):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ 未安装 matplotlib，跳过图表生成。")
+        return []
+
+    chart_paths = []
+    question_summary = summary["question_summary"]
+    fig, ax = plt.subplots(figsize=(14, 5))
+    ax.bar(question_summary["question_id"], question_summary["prevalence"], label="prevalence")
+    ax.bar(question_summary["question_id"], question_summary["undetermined_rate"],
+           bottom=question_summary["prevalence"], label="undetermined (-1)", alpha=0.6)
+    ax.set_ylabel("share of images")
+    ax.set_title("Per-question prevalence")
+    ax.tick_params(axis="x", rotation=90)
+    ax.legend()
+    fig.tight_layout()
+    chart_paths.append(os.path.join(output_folder, "question_prevalence.png"))
+    fig.savefig(chart_paths[-1], dpi=120)
+    plt.close(fig)
+
+    distribution = summary["problems_distribution"]
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.bar(distribution["problems_found"], distribution["images"])
+    ax.set_xlabel("Problems_Found")
+    ax.set_ylabel("images")
+    ax.set_title("Problems_Found distribution")
+    fig.tight_layout()
+    chart_paths.append(os.path.join(output_folder, "problems_distribution.png"))
+    fig.savefig(chart_paths[-1], dpi=120)
+    plt.close(fig)
+
+    category_summary = summary["category_summary"]
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.bar(category_summary["category"].astype(str), category_summary["mean_score"])
+    ax.set_xlabel("category")
+    ax.set_ylabel("mean share of positive questions")
+    ax.set_title("Per-category score")
+    fig.tight_layout()
+    chart_paths.append(os.path.join(output_folder, "category_scores.png"))
+    fig.savefig(chart_paths[-1], dpi=120)
+    plt.close(fig)
+    return chart_paths
+
+
+def write_report(summary, output_folder, chart_paths):
+    table_names = ["question_summary", "category_summary", "problems_distribution", "folder_summary"]
+    for name in table_names:
+        summary[name].to_csv(os.path.join(output_folder, f"{name}.csv"), index=False, encoding="utf-8-sig")
+
+    overview = summary["overview"]
+    sections = [
+        "<h1>盲道评估汇总报告</h1>",
+        f"<p>图片数: {overview['images']}，问题数: {overview['questions']}，"
+        f"平均发现问题数: {overview['mean_problems_found']:.2f}，无法判断比例: {overview['undetermined_rate']:.2%}</p>",
+    ]
+    sections += [f'<img src="{os.path.basename(path)}">' for path in chart_paths]
+    for name in table_names:
+        sections.append(f"<h2>{name}</h2>")
+        sections.append(summary[name].to_html(index=False, float_format=lambda value: f"{value:.3f}"))
+    html = "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>盲道评估汇总报告</title></head><body>\n"
+    html += "\n".join(sections) + "\n</body></html>\n"
+    with open(os.path.join(output_folder, "report.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def generate_report(output_folder, db_path=None, csv_folder=None, question_texts=None):
+    if csv_folder:
+        df = load_judgments_from_csv_folder(csv_folder)
+    else:
+        if not os.path.exists(db_path):
+            print(f"未找到结果数据库: {db_path}")
+            return None
+        df = load_judgments_from_store(db_path)
+    if df.empty:
+        print("没有可汇总的判断结果。")
+        return None
+
+    os.makedirs(output_folder, exist_ok=True)
+    summary = summarize(df, question_texts)
+    chart_paths = render_charts(summary, output_folder)
+    write_report(summary, output_folder, chart_paths)
+
+    overview = summary["overview"]
+    print(f"📊 已汇总 {overview['images']} 张图片，平均发现 {overview['mean_problems_found']:.2f} 个问题，"
+          f"无法判断比例 {overview['undetermined_rate']:.2%}。")
+    print(f"📂 报告已保存到: {output_folder}")
+    return summary
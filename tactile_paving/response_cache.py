@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import hashlib
+
+# ========== API响应缓存 ==========
+# 以 (图片字节, 提示词, 模型, 温度) 的哈希作为键，把API原始响应持久化到磁盘。
+# 同一张图片即使文件名不同，也只会调用一次API。
+# evict 同时淘汰预处理图片缓存 (image_preprocess.py 写入的 <xx>/<key>.bin + .json)，两类条目共用大小上限。
+
+
+def compute_cache_key(image_bytes, prompt_text, model, temperature):
+    hasher = hashlib.sha256()
+    hasher.update(hashlib.sha256(image_bytes).digest())
+    hasher.update(prompt_text.encode("utf-8"))
+    hasher.update(model.encode("utf-8"))
+    hasher.update(repr(float(temperature)).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir, max_size_mb=None, max_age_days=None, image_cache_dir=None):
+        self.cache_dir = cache_dir
+        self.image_cache_dir = image_cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        # 正在请求中的键 -> asyncio.Future，避免重复图片并发时各自调用一次API
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key, validate=None):
+        # validate(response) 返回 False 时删除该条目并按未命中处理 (例如旧版本缓存的截断响应)
+        path = self._entry_path(key)
+        try:
+            if self.max_age_seconds is not None and time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                os.remove(path)
+                self.misses += 1
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # 刷新修改时间，淘汰时按最近使用顺序
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            print(f"读取缓存 {key} 时出错: {e}")
+            self.misses += 1
+            return None
+        response_content = entry.get("response")
+        if validate is not None and not validate(response_content):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response_content
+
+    def put(self, key, response_content, metadata=None):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"response": response_content, "created": time.time()}
+        if metadata:
+            entry.update(metadata)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入缓存 {key} 时出错: {e}")
+
+    def _scan_entries(self):
+        # 返回 [(mtime, 总大小, [文件路径])]；预处理图片的 .bin 与同名 .json 作为一个条目，一起计算大小、一起删除
+        roots = [self.cache_dir]
+        if self.image_cache_dir and os.path.realpath(self.image_cache_dir) != os.path.realpath(self.cache_dir):
+            roots.append(self.image_cache_dir)
+        entries = []
+        for root in roots:
+            try:
+                subs = [sub.path for sub in os.scandir(root) if sub.is_dir()]
+            except FileNotFoundError:
+                continue
+            for sub_path in subs:
+                groups = {}
+                for entry in os.scandir(sub_path):
+                    stem, ext = os.path.splitext(entry.name)
+                    if ext in (".json", ".bin") and entry.is_file():
+                        groups.setdefault(stem, []).append(entry)
+                for files in groups.values():
+                    stats = [entry.stat() for entry in files]
+                    entries.append((max(stat.st_mtime for stat in stats), sum(stat.st_size for stat in stats),
+                                    [entry.path for entry in files]))
+        return entries
+
+    def evict(self):
+        entries = self._scan_entries()
+
+        now = time.time()
+        removed_count = 0
+        freed_bytes = 0
+        kept = []
+        for mtime, size, paths in entries:
+            if self.max_age_seconds is not None and now - mtime > self.max_age_seconds:
+                removed_count, freed_bytes = self._remove(paths, size, removed_count, freed_bytes)
+            else:
+                kept.append((mtime, size, paths))
+
+        if self.max_size_bytes is not None:
+            total_size = sum(size for _, size, _ in kept)
+            kept.sort()  # 最久未使用的排在前面
+            for mtime, size, paths in kept:
+                if total_size <= self.max_size_bytes:
+                    break
+                removed_count, freed_bytes = self._remove(paths, size, removed_count, freed_bytes)
+                total_size -= size
+
+        return removed_count, freed_bytes
+
+    def _remove(self, paths, size, removed_count, freed_bytes):
+        removed = False
+        for path in paths:
+            try:
+                os.remove(path)
+                removed = True
+            except OSError:
+                pass
+        if removed:
+            return removed_count + 1, freed_bytes + size
+        return removed_count, freed_bytes
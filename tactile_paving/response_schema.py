@@ -0,0 +1,111 @@
+import json
+
+from .streaming_json import load_response_json
+
+# ========== 响应格式与校验 ==========
+# 两种响应格式:
+#   完整格式 {"evaluations": [{"question_id", "question_text", "analysis", "judgment"}, ...]}，每个问题都附带分析；
+#   精简格式 {"judgments": {"1.1.1": 0, ...}, "findings": [{"question_id", "analysis"}, ...]}，
+#     只返回每个问题的判断，分析仅用于判断为 1 的问题，输出 token 约为完整格式的十分之一。
+# 精简格式配合 Structured Outputs 的严格 JSON Schema 使用，服务端保证每个问题ID都出现且值只能是 -1/0/1。
+# parse_judgments 统一校验两种格式，取代逐项的 isinstance 检查和正则匹配。
+
+VALID_JUDGMENTS = (-1, 0, 1)
+SCHEMA_NAME = "tactile_paving_judgments"
+
+
+def build_judgments_schema(question_ids, allowed_values=VALID_JUDGMENTS, include_findings=True):
+    # 严格模式要求列出的属性全部 required 且不允许额外属性，因此 "可选" 的分析用可以为空的 findings 数组表示
+    schema = {
+        "type": "object",
+        "properties": {
+            "judgments": {
+                "type": "object",
+                "properties": {question_id: {"type": "integer", "enum": list(allowed_values)} for question_id in question_ids},
+                "required": list(question_ids),
+                "additionalProperties": False,
+            },
+        },
+        "required": ["judgments"],
+        "additionalProperties": False,
+    }
+    if include_findings:
+        schema["properties"]["findings"] = {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question_id": {"type": "string", "enum": list(question_ids)},
+                    "analysis": {"type": "string"},
+                },
+                "required": ["question_id", "analysis"],
+                "additionalProperties": False,
+            },
+        }
+        schema["required"].append("findings")
+    return schema
+
+
+def build_packed_judgments_schema(question_ids, allowed_values=VALID_JUDGMENTS, include_findings=True):
+    # 多图请求: {"images": [{"image_index": 1, "judgments": {...}, "findings": [...]}, ...]}
+    image_schema = build_judgments_schema(question_ids, allowed_values, include_findings)
+    image_schema["properties"] = {"image_index": {"type": "integer"}, **image_schema["properties"]}
+    image_schema["required"] = ["image_index"] + image_schema["required"]
+    return {
+        "type": "object",
+        "properties": {"images": {"type": "array", "items": image_schema}},
+        "required": ["images"],
+        "additionalProperties": False,
+    }
+
+
+def json_schema_response_format(schema, name=SCHEMA_NAME):
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def normalize_judgment(value, allowed_values=VALID_JUDGMENTS):
+    # 返回 -1/0/1 之一；布尔值、超出范围的数字和无法识别的文本返回 None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        value = int(value.strip())
+    if isinstance(value, int) and value in allowed_values:
+        return value
+    return None
+
+
+def parse_judgments(data, allowed_values=VALID_JUDGMENTS):
+    # data 为已解析的响应对象；返回 ({问题ID: 判断}, [问题描述])，格式无法识别时返回 (None, [原因])
+    if not isinstance(data, dict):
+        return None, ["响应不是JSON对象"]
+    answers = {}
+    problems = []
+    if isinstance(data.get("judgments"), dict):
+        for question_id, value in data["judgments"].items():
+            judgment = normalize_judgment(value, allowed_values)
+            if judgment is None:
+                problems.append(f"问题 {question_id} 的判断无效: {value!r}")
+            else:
+                answers[question_id] = judgment
+        return answers, problems
+    if isinstance(data.get("evaluations"), list):
+        for evaluation in data["evaluations"]:
+            question_id = evaluation.get("question_id") if isinstance(evaluation, dict) else None
+            judgment = normalize_judgment(evaluation.get("judgment"), allowed_values) if question_id else None
+            if not isinstance(question_id, str) or judgment is None:
+                problems.append(f"问题 {question_id} 的评估结果格式不正确或judgment缺失。")
+            else:
+                answers[question_id] = judgment
+        return answers, problems
+    return None, ["未找到 'judgments' 对象或 'evaluations' 数组"]
+
+
+def parse_judgments_text(json_string, allowed_values=VALID_JUDGMENTS):
+    # 流式接收时已解析的响应 (见 streaming_json.ParsedResponseText) 不再重复解析
+    try:
+        data = load_response_json(json_string)
+    except json.JSONDecodeError:
+        return None, ["响应不是有效的JSON"]
+    return parse_judgments(data, allowed_values)
@@ -0,0 +1,96 @@
+import os
+import csv
+
+from .questions import load_questions, parse_questions_for_ids
+from .result_store import export_legacy_files, prune_removed_questions, merge_result_stores
+from .job_journal import JobJournal, STATE_PENDING, STATE_IN_FLIGHT, STATE_DONE, STATE_FAILED
+from .sharding import find_shard_folders
+
+# ========== 整理已有结果的子命令 ==========
+# report、export-csv 和 merge 只读写结果数据库、任务日志和近重复对应表，不调用 API。
+# 配置从传入的 cfg 模块读取 (命令行传入已应用配置的 settings)，因此不必导入 pipeline 以及 openai、numpy、tqdm。
+
+
+def question_tuples(cfg):
+    return parse_questions_for_ids(load_questions(cfg.LANGUAGE, cfg.QUESTIONS_FILE))
+
+
+def prune_removed_question_judgments(store_path, question_ids):
+    # 删除主结果数据库中已从问题清单移除的问题的旧判断，并重新计算 Problems_Found
+    if not os.path.exists(store_path):
+        return
+    removed_count = prune_removed_questions(store_path, question_ids)
+    if removed_count:
+        print(f"🧹 已删除 {removed_count} 条已移出问题清单的判断。")
+
+
+def export_result_store(cfg):
+    if not os.path.exists(cfg.RESULT_STORE_PATH):
+        print(f"未找到结果数据库: {cfg.RESULT_STORE_PATH}")
+        return
+    question_ids = [q_id for q_id, _ in question_tuples(cfg)]
+    exported_count = export_legacy_files(cfg.RESULT_STORE_PATH, cfg.BATCH_OUTPUT_FOLDER, question_ids)
+    print(f"✅ 已从 {cfg.RESULT_STORE_PATH} 导出 {exported_count} 张图片的结果到: {cfg.BATCH_OUTPUT_FOLDER}")
+
+
+def merge_near_duplicate_tables(near_duplicates_path, table_paths):
+    # 合并各分片的近重复对应表，同一张图片以后合并的分片为准
+    rows = {}
+    for table_path in [near_duplicates_path] + list(table_paths):
+        if not os.path.exists(table_path):
+            continue
+        with open(table_path, "r", newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                rows[row["Image"]] = row
+    if rows:
+        with open(near_duplicates_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=["Image", "Duplicate_Of", "Hamming_Distance"])
+            writer.writeheader()
+            writer.writerows(rows.values())
+    return len(rows)
+
+
+def merge_shards(cfg, shard_folders=None, prune_removed=False):
+    # 把各分片的结果数据库、任务日志和近重复对应表合并到主输出文件夹；可以重复执行
+    # prune_removed=True 时合并后清理已从问题清单中删除的问题的旧判断 (各分片以 --only-changed 运行时使用)
+    shard_folders = shard_folders or find_shard_folders(cfg.SHARDS_FOLDER)
+    if not shard_folders:
+        print(f"在 {cfg.SHARDS_FOLDER} 中没有找到分片结果。")
+        return
+    os.makedirs(cfg.BATCH_OUTPUT_FOLDER, exist_ok=True)
+    print(f"🧩 正在合并 {len(shard_folders)} 个分片的结果...")
+
+    def shard_files(path):
+        return [os.path.join(folder, os.path.basename(path)) for folder in shard_folders
+                if os.path.exists(os.path.join(folder, os.path.basename(path)))]
+
+    store_paths = shard_files(cfg.RESULT_STORE_PATH)
+    if store_paths:
+        merged_count = merge_result_stores(cfg.RESULT_STORE_PATH, store_paths)
+        print(f"🗄️ 已把 {merged_count} 张图片的结果合并到: {cfg.RESULT_STORE_PATH}")
+    if prune_removed:
+        prune_removed_question_judgments(cfg.RESULT_STORE_PATH, [q_id for q_id, _ in question_tuples(cfg)])
+
+    journal = JobJournal(cfg.JOURNAL_PATH)
+    try:
+        for journal_path in shard_files(cfg.JOURNAL_PATH):
+            journal.merge(JobJournal.load(journal_path))
+    finally:
+        journal.close()
+    state_counts = journal.summary()
+    print(f"📒 任务日志: 完成 {state_counts.get(STATE_DONE, 0)}，失败 {state_counts.get(STATE_FAILED, 0)}，"
+          f"未完成 {state_counts.get(STATE_PENDING, 0) + state_counts.get(STATE_IN_FLIGHT, 0)}。")
+
+    duplicate_tables = shard_files(cfg.NEAR_DUPLICATES_PATH)
+    if duplicate_tables:
+        print(f"🪞 近重复对应表共 {merge_near_duplicate_tables(cfg.NEAR_DUPLICATES_PATH, duplicate_tables)} 行: {cfg.NEAR_DUPLICATES_PATH}")
+    print("📈 各分片的指标仍保存在各自的分片文件夹中。")
+
+
+def report_result_store(cfg, legacy_output=False):
+    from .report import generate_report  # pandas 和 matplotlib 只在生成报告时导入
+    question_texts = dict(question_tuples(cfg))
+    if legacy_output:
+        generate_report(cfg.REPORT_FOLDER, csv_folder=cfg.BATCH_OUTPUT_FOLDER, question_texts=question_texts)
+    else:
+        generate_report(cfg.REPORT_FOLDER, db_path=cfg.RESULT_STORE_PATH, question_texts=question_texts)
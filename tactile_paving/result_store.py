@@ -0,0 +1,375 @@
+import os
+import csv
+import json
+import time
+import zlib
+import queue
+import sqlite3
+import threading
+
+from .image_pipeline import image_output_stem
+
+# ========== 结果存储 ==========
+# 所有图片的判断结果写入同一个 SQLite 数据库，原始响应经 zlib 压缩后存放在同一数据库中，
+# 取代每张图片各一个 CSV/JSON 的小文件。写入在独立线程中按批次提交，不阻塞事件循环。
+# 需要旧的逐图文件时，可用 export_legacy_files 按需导出。
+# 每个判断同时记录所回答的问题版本 (见 question_versions.py)，只重新评估部分问题时，
+# 新结果会合并到已有记录中，Problems_Found 按合并后的全部判断重新计算。
+# 近重复图片 (见 near_duplicates.py) 的判断复制自代表图片，duplicate_of 记录代表图片及其汉明距离，
+# 原始响应只保存在代表图片下。
+# 经多次采样投票得出的判断 (见 voting.py) 在 votes 列记录各判断的票数，例如 {"1": 2, "0": 0, "-1": 1}。
+# 无法提取答案的响应单独保存在 failed_responses 表 (每张图片保留最近一次)，不会覆盖 raw_responses 中已有的有效响应；
+# 之后该图片评估成功时，失败记录会被清除。
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    image TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    problems_found INTEGER,
+    updated_at REAL NOT NULL,
+    duplicate_of TEXT,
+    duplicate_distance INTEGER
+);
+CREATE TABLE IF NOT EXISTS judgments (
+    image TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    judgment INTEGER NOT NULL,
+    question_version TEXT,
+    votes TEXT,
+    PRIMARY KEY (image, question_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS raw_responses (
+    image TEXT PRIMARY KEY,
+    response BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed_responses (
+    image TEXT PRIMARY KEY,
+    response BLOB NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+UPDATE_PROBLEMS_FOUND = (
+    "UPDATE images SET problems_found = "
+    "(SELECT COUNT(*) FROM judgments j WHERE j.image = images.image AND j.judgment = 1)")
+
+
+def connect_store(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    judgment_columns = {row[1] for row in connection.execute("PRAGMA table_info(judgments)")}
+    if "question_version" not in judgment_columns:
+        # 旧版数据库没有问题版本，这些判断在只评估变更问题时会被视为需要重新评估
+        connection.execute("ALTER TABLE judgments ADD COLUMN question_version TEXT")
+    if "votes" not in judgment_columns:
+        connection.execute("ALTER TABLE judgments ADD COLUMN votes TEXT")
+    image_columns = {row[1] for row in connection.execute("PRAGMA table_info(images)")}
+    if "duplicate_of" not in image_columns:
+        connection.execute("ALTER TABLE images ADD COLUMN duplicate_of TEXT")
+        connection.execute("ALTER TABLE images ADD COLUMN duplicate_distance INTEGER")
+    return connection
+
+
+def compress_response(raw_response):
+    return zlib.compress(raw_response.encode("utf-8"), 6)
+
+
+def decompress_response(blob):
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def merge_raw_responses(existing_response, new_response):
+    # 把只包含部分问题的新响应合并进已有响应: 同一问题以新结果为准，其余问题保留。
+    # 新响应无法解析时保留已有响应；已有响应无法解析时以新响应为准
+    try:
+        new_data = json.loads(new_response)
+        if not isinstance(new_data, dict) or not (isinstance(new_data.get("judgments"), dict) or isinstance(new_data.get("evaluations"), list)):
+            return existing_response
+    except json.JSONDecodeError:
+        return existing_response
+    try:
+        existing_data = json.loads(existing_response)
+        if isinstance(existing_data.get("judgments"), dict) and isinstance(new_data.get("judgments"), dict):
+            # 精简格式: {"judgments": {...}, "findings": [...]}
+            existing_data["judgments"].update(new_data["judgments"])
+            new_ids = set(new_data["judgments"])
+            kept_findings = [item for item in existing_data.get("findings") or []
+                             if not (isinstance(item, dict) and item.get("question_id") in new_ids)]
+            existing_data["findings"] = kept_findings + list(new_data.get("findings") or [])
+            return json.dumps(existing_data, ensure_ascii=False)
+        existing_evaluations = existing_data["evaluations"]
+        new_evaluations = new_data["evaluations"]
+        new_by_id = {item["question_id"]: item for item in new_evaluations}
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return new_response
+    merged = [new_by_id.pop(item.get("question_id"), item) if isinstance(item, dict) else item for item in existing_evaluations]
+    merged.extend(new_by_id.values())
+    existing_data["evaluations"] = merged
+    return json.dumps(existing_data, ensure_ascii=False)
+
+
+class ResultStore:
+    def __init__(self, db_path, flush_rows=200, flush_interval_seconds=2.0, question_versions=None):
+        self.db_path = db_path
+        self.question_versions = question_versions or {}
+        self.flush_rows = flush_rows
+        self.flush_interval_seconds = flush_interval_seconds
+        self.written_count = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        connect_store(db_path).close()  # 在主线程中建表，路径错误可以立即暴露
+        self._queue = queue.Queue()
+        self._stop_marker = object()
+        self._thread = threading.Thread(target=self._writer_loop, name="result-store-writer", daemon=True)
+        self._thread.start()
+
+    def add_result(self, image, judgments=None, raw_response=None, on_committed=None, partial=False, duplicate_of=None, votes=None):
+        # judgments: {question_id: 0/1/-1}，为 None 时只保存原始响应
+        # partial=True 表示只评估了部分问题，原始响应会与已保存的响应合并
+        # duplicate_of: (代表图片, 汉明距离)，表示判断复制自该近重复图片
+        # votes: {question_id: {"1": 票数, "0": 票数, "-1": 票数}}，经投票得出的判断的票数
+        # on_committed 在数据提交到磁盘后由写入线程调用
+        self._queue.put((image, judgments, raw_response, on_committed, partial, duplicate_of, votes, None))
+
+    def add_failed_response(self, image, raw_response, error):
+        # 保存无法提取答案的响应，供排查使用；不改动该图片已有的判断和原始响应
+        self._queue.put((image, None, raw_response, None, False, None, None, error))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._stop_marker)
+            self._thread.join()
+
+    def _writer_loop(self):
+        connection = connect_store(self.db_path)
+        pending = []
+        deadline = None
+        stopping = False
+        try:
+            while not stopping:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                    if item is self._stop_marker:
+                        stopping = True
+                    else:
+                        pending.append(item)
+                        if deadline is None:
+                            deadline = time.monotonic() + self.flush_interval_seconds
+                except queue.Empty:
+                    pass
+                if pending and (stopping or len(pending) >= self.flush_rows or time.monotonic() >= deadline):
+                    self._flush(connection, pending)
+                    pending = []
+                    deadline = None
+        finally:
+            connection.close()
+
+    def _flush(self, connection, items):
+        now = time.time()
+        image_rows = []
+        judgment_rows = []
+        raw_rows = []
+        failed_rows = []
+        for image, judgments, raw_response, _, partial, duplicate_of, votes, error in items:
+            if error is not None:
+                failed_rows.append((image, compress_response(raw_response or ""), error, now))
+                continue
+            if judgments is not None:
+                representative, distance = duplicate_of or (None, None)
+                votes = votes or {}
+                image_rows.append((image, os.path.dirname(image), now, representative, distance))
+                judgment_rows.extend((image, question_id, judgment, self.question_versions.get(question_id),
+                                      json.dumps(votes[question_id]) if question_id in votes else None)
+                                     for question_id, judgment in judgments.items())
+            if raw_response:
+                if partial:
+                    existing = connection.execute("SELECT response FROM raw_responses WHERE image = ?", (image,)).fetchone()
+                    if existing is not None:
+                        raw_response = merge_raw_responses(decompress_response(existing[0]), raw_response)
+                raw_rows.append((image, compress_response(raw_response)))
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO images (image, folder, updated_at, duplicate_of, duplicate_distance) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(image) DO UPDATE SET updated_at = excluded.updated_at, "
+                    "duplicate_of = excluded.duplicate_of, duplicate_distance = excluded.duplicate_distance",
+                    image_rows)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO judgments (image, question_id, judgment, question_version, votes) VALUES (?, ?, ?, ?, ?)",
+                    judgment_rows)
+                connection.executemany(UPDATE_PROBLEMS_FOUND + " WHERE image = ?", [(row[0],) for row in image_rows])
+                connection.executemany("INSERT OR REPLACE INTO raw_responses (image, response) VALUES (?, ?)", raw_rows)
+                connection.executemany("DELETE FROM failed_responses WHERE image = ?", [(row[0],) for row in image_rows])
+                connection.executemany(
+                    "INSERT OR REPLACE INTO failed_responses (image, response, error, failed_at) VALUES (?, ?, ?, ?)", failed_rows)
+        except sqlite3.Error as e:
+            print(f"写入结果数据库时出错 ({len(items)} 张图片未保存): {e}")
+            return
+        self.written_count += len(items)
+        for _, _, _, on_committed, _, _, _, _ in items:
+            if on_committed is not None:
+                on_committed()
+
+
+def load_answered_versions(db_path):
+    # 返回 {image: {question_id: question_version}}；版本组合相同的图片共用同一个字典以节省内存
+    answered = {}
+    if not os.path.exists(db_path):
+        return answered
+    connection = connect_store(db_path)
+    try:
+        current_image = None
+        current_versions = {}
+        shared_versions = {}
+        cursor = connection.execute("SELECT image, question_id, question_version FROM judgments ORDER BY image")
+        for image, question_id, version in cursor:
+            if image != current_image:
+                if current_image is not None:
+                    answered[current_image] = shared_versions.setdefault(frozenset(current_versions.items()), current_versions)
+                current_image, current_versions = image, {}
+            current_versions[question_id] = version
+        if current_image is not None:
+            answered[current_image] = shared_versions.setdefault(frozenset(current_versions.items()), current_versions)
+    finally:
+        connection.close()
+    return answered
+
+
+def prune_removed_questions(db_path, question_ids):
+    # 删除已从问题清单中移除的问题的判断，并重新计算 problems_found；返回删除的行数
+    connection = connect_store(db_path)
+    try:
+        with connection:
+            placeholders = ", ".join("?" for _ in question_ids)
+            removed_count = connection.execute(
+                f"DELETE FROM judgments WHERE question_id NOT IN ({placeholders})", list(question_ids)).rowcount
+            if removed_count:
+                connection.execute(UPDATE_PROBLEMS_FOUND)
+    finally:
+        connection.close()
+    return removed_count
+
+
+def merge_result_stores(target_path, source_paths):
+    # 把分片的结果数据库合并进 target_path，返回合并的图片数。
+    # 同一张图片以 updated_at 较新的记录为准，重复合并同一分片不会改变任何记录；
+    # 只评估了部分问题的记录按问题合并判断，原始响应与已有响应合并
+    connection = connect_store(target_path)
+    merged_count = 0
+    try:
+        for source_path in source_paths:
+            connect_store(source_path).close()  # 旧版分片数据库先补齐缺少的列
+            connection.execute("ATTACH DATABASE ? AS src", (source_path,))
+            try:
+                newer_images = [row[0] for row in connection.execute(
+                    "SELECT s.image FROM src.images s LEFT JOIN images t ON t.image = s.image "
+                    "WHERE t.image IS NULL OR s.updated_at > t.updated_at")]
+                with connection:
+                    connection.execute("CREATE TEMP TABLE IF NOT EXISTS merge_images (image TEXT PRIMARY KEY)")
+                    connection.execute("DELETE FROM merge_images")
+                    connection.executemany("INSERT INTO merge_images (image) VALUES (?)", [(image,) for image in newer_images])
+                    connection.execute(
+                        "INSERT INTO images (image, folder, updated_at, duplicate_of, duplicate_distance) "
+                        "SELECT image, folder, updated_at, duplicate_of, duplicate_distance FROM src.images "
+                        "WHERE image IN (SELECT image FROM merge_images) "
+                        "ON CONFLICT(image) DO UPDATE SET updated_at = excluded.updated_at, "
+                        "duplicate_of = excluded.duplicate_of, duplicate_distance = excluded.duplicate_distance")
+                    connection.execute(
+                        "INSERT OR REPLACE INTO judgments (image, question_id, judgment, question_version, votes) "
+                        "SELECT image, question_id, judgment, question_version, votes FROM src.judgments "
+                        "WHERE image IN (SELECT image FROM merge_images)")
+                    connection.execute(UPDATE_PROBLEMS_FOUND + " WHERE image IN (SELECT image FROM merge_images)")
+                    merge_attached_raw_responses(connection)
+                    # 失败记录按 failed_at 取较新的一条，已被更新的成功结果取代的失败记录删除
+                    connection.execute(
+                        "INSERT INTO failed_responses (image, response, error, failed_at) "
+                        "SELECT image, response, error, failed_at FROM src.failed_responses WHERE true "
+                        "ON CONFLICT(image) DO UPDATE SET response = excluded.response, error = excluded.error, "
+                        "failed_at = excluded.failed_at WHERE excluded.failed_at > failed_responses.failed_at")
+                    connection.execute(
+                        "DELETE FROM failed_responses WHERE image IN (SELECT image FROM merge_images) "
+                        "AND failed_at <= (SELECT updated_at FROM images WHERE images.image = failed_responses.image)")
+            finally:
+                connection.execute("DETACH DATABASE src")
+            merged_count += len(newer_images)
+    finally:
+        connection.close()
+    return merged_count
+
+
+def merge_attached_raw_responses(connection, chunk_rows=500):
+    # 分批读取，避免把所有原始响应一次性载入内存；已有响应时按问题合并
+    last_image = ""
+    while True:
+        rows = connection.execute(
+            "SELECT r.image, r.response, t.response FROM src.raw_responses r "
+            "LEFT JOIN raw_responses t ON t.image = r.image "
+            "WHERE r.image > ? AND r.image IN (SELECT image FROM merge_images) ORDER BY r.image LIMIT ?",
+            (last_image, chunk_rows)).fetchall()
+        if not rows:
+            return
+        raw_rows = []
+        for image, source_blob, target_blob in rows:
+            if target_blob is not None and target_blob != source_blob:
+                merged = merge_raw_responses(decompress_response(target_blob), decompress_response(source_blob))
+                source_blob = compress_response(merged)
+            raw_rows.append((image, source_blob))
+        connection.executemany("INSERT OR REPLACE INTO raw_responses (image, response) VALUES (?, ?)", raw_rows)
+        last_image = rows[-1][0]
+
+
+def iter_stored_images(db_path):
+    # 逐张产出 (image, {question_id: judgment}, problems_found)
+    connection = sqlite3.connect(db_path)
+    try:
+        cursor = connection.execute(
+            "SELECT i.image, i.problems_found, j.question_id, j.judgment FROM images i "
+            "JOIN judgments j ON j.image = i.image ORDER BY i.image")
+        current_image = None
+        current_judgments = {}
+        current_problems = 0
+        for image, problems_found, question_id, judgment in cursor:
+            if image != current_image:
+                if current_image is not None:
+                    yield current_image, current_judgments, current_problems
+                current_image, current_judgments, current_problems = image, {}, problems_found
+            current_judgments[question_id] = judgment
+        if current_image is not None:
+            yield current_image, current_judgments, current_problems
+    finally:
+        connection.close()
+
+
+def export_legacy_files(db_path, output_folder, question_ids, include_raw=True):
+    # 导出为旧版的逐图文件: <名称>_judgments.csv 和 <名称>_raw_response.json
+    os.makedirs(output_folder, exist_ok=True)
+    exported_count = 0
+    for image, judgments, problems_found in iter_stored_images(db_path):
+        output_stem = image_output_stem(image)
+        csv_path = os.path.join(output_folder, f"{output_stem}_judgments.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["Image"] + list(question_ids) + ["Problems_Found"])
+            writer.writerow([image] + [judgments.get(question_id, -1) for question_id in question_ids] + [problems_found])
+        exported_count += 1
+
+    if include_raw:
+        connection = sqlite3.connect(db_path)
+        try:
+            # 没有有效响应的图片导出最近一次失败的响应，与旧版逐图输出一致
+            for image, blob in connection.execute(
+                    "SELECT image, response FROM raw_responses UNION ALL "
+                    "SELECT image, response FROM failed_responses WHERE image NOT IN (SELECT image FROM raw_responses)"):
+                raw_response = decompress_response(blob)
+                raw_path = os.path.join(output_folder, f"{image_output_stem(image)}_raw_response.json")
+                with open(raw_path, "w", encoding="utf-8") as f:
+                    try:
+                        json.dump(json.loads(raw_response), f, ensure_ascii=False, indent=2)
+                    except json.JSONDecodeError:
+                        f.write(raw_response)
+        finally:
+            connection.close()
+    return exported_count
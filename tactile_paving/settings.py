@@ -0,0 +1,116 @@
+import os
+
+# ========== 全局配置 ==========
+# 以下大写变量为默认配置，可通过配置文件或 TACTILE_PAVING_<名称> 环境变量覆盖 (见 config.py)。
+# 相对路径相对于当前工作目录。本模块只依赖标准库：命令行先对本模块应用配置，
+# report、export-csv 和 merge 直接读取这里的值；调用 API 的子命令随后才导入 pipeline，导入时复制这些值。
+
+# 路径配置
+DATA_FOLDER = "data" # 待评估的图片，可包含按站点划分的子目录
+TEST_MODE_IMAGE_PATH = None # 测试模式使用的图片，None 表示使用 DATA_FOLDER 中的第一张图片
+OUTPUT_FOLDER = "results" # 测试模式的输出文件夹
+BATCH_OUTPUT_FOLDER = "results_batch" # 批处理的输出文件夹
+CACHE_FOLDER = "cache" # 响应缓存、预处理图片和感知哈希的缓存文件夹
+JOURNAL_PATH = os.path.join(BATCH_OUTPUT_FOLDER, "_job_journal.jsonl") # 批处理任务日志，用于断点续跑
+BATCH_API_FOLDER = os.path.join(BATCH_OUTPUT_FOLDER, "_batch_api") # Batch API 模式的请求分片和任务清单
+PREPROCESSED_CACHE_FOLDER = os.path.join(CACHE_FOLDER, "images") # 预处理后图片的缓存
+IMAGE_HASH_CACHE_PATH = os.path.join(CACHE_FOLDER, "image_hashes.json") # 近重复检测用的感知哈希缓存
+NEAR_DUPLICATES_PATH = os.path.join(BATCH_OUTPUT_FOLDER, "_near_duplicates.csv") # 近重复图片与代表图片的对应关系
+RESULT_STORE_PATH = os.path.join(BATCH_OUTPUT_FOLDER, "results.sqlite") # 汇总所有图片判断结果和原始响应的数据库
+REPORT_FOLDER = os.path.join(BATCH_OUTPUT_FOLDER, "report") # 汇总报告 (CSV、图表和 HTML) 的输出文件夹
+METRICS_PATH = os.path.join(BATCH_OUTPUT_FOLDER, "_metrics.jsonl") # 每个请求的各阶段耗时、token 用量和费用
+PROMETHEUS_METRICS_PATH = os.path.join(BATCH_OUTPUT_FOLDER, "metrics.prom") # Prometheus 文本格式的汇总指标
+SHARDS_FOLDER = os.path.join(BATCH_OUTPUT_FOLDER, "_shards") # 分片运行时各分片的结果数据库、任务日志、指标和运行日志
+
+# 问题清单和提示词的语言: "zh" 或 "en" (见 questions.py 和 prompts.py)
+LANGUAGE = "zh"
+QUESTIONS_FILE = None # 自定义问题清单文件 (每行 "问题ID 问题文本")，None 表示使用 LANGUAGE 对应的内置清单
+
+# 模型配置 (同时参与缓存键的计算)
+MODEL_NAME = "gpt-4o"
+TEMPERATURE = 0.2
+MAX_TOKENS = 8192
+
+# 响应格式配置: "full" 每个问题都返回分析；"compact" 只返回判断 (严格 JSON Schema)，分析仅用于判断为 1 的问题
+RESPONSE_MODE = "full" # 可用 --compact 临时切换为精简模式
+COMPACT_MAX_TOKENS = 2048 # 精简模式下单张图片的输出 token 上限
+
+# 投票复查配置：判断为 -1 的问题用只包含这些问题的精简请求重新采样，按多数票得出判断 (见 voting.py)
+VOTE_UNDETERMINED = False # 可用 run --vote 临时启用；Batch API 模式不支持
+VOTE_MAX_SAMPLES = 3 # 每个问题最多采样的次数 (K)，领先的判断无法被超过时提前停止
+VOTE_TEMPERATURE = 0.7 # 采样温度，高于 TEMPERATURE 使各次采样相互独立
+
+# 响应缓存配置
+USE_CACHE = True # 批处理时是否使用响应缓存，可用 --no-cache 临时关闭
+CACHE_MAX_SIZE_MB = 2048 # 缓存总大小上限，超出后按最近使用时间淘汰
+CACHE_MAX_AGE_DAYS = 90 # 缓存条目的最长保留天数
+
+# 图片预处理配置 (需要安装 Pillow，未安装时直接上传原图)
+PREPROCESS_IMAGES = True # 上传前修正方向、缩小尺寸并重新编码
+IMAGE_MAX_SIDE = 2048 # 长边上限，与 GPT-4o 服务端的缩放规则一致
+IMAGE_MAX_SHORT_SIDE = 768 # 短边上限，超出部分服务端也会缩掉，提前缩小可减少上传量
+IMAGE_MAX_TILES = None # 512px 图块数上限 (每块170 token)，None 表示不额外限制
+IMAGE_OUTPUT_FORMAT = "JPEG" # 重新编码格式: "JPEG" 或 "WEBP"
+IMAGE_QUALITY = 85 # 重新编码质量
+PREPROCESS_WORKERS = os.cpu_count() # 预处理进程池大小
+
+# 速率限制配置 (按账户等级填写，运行中会根据 x-ratelimit-* 响应头自动校正)
+RATE_LIMIT_RPM = 500 # 每分钟请求数上限
+RATE_LIMIT_TPM = 300000 # 每分钟 token 数上限
+ESTIMATED_IMAGE_TOKENS = 765 # 无法得知图片尺寸时使用的估计 token 数，用于 TPM 限流
+MAX_RETRIES = 6 # 速率限制、连接错误或服务端错误的最大重试次数
+RETRY_BASE_DELAY_SECONDS = 1.0 # 指数退避的初始等待时间
+RETRY_MAX_DELAY_SECONDS = 120.0 # 单次退避的最长等待时间
+
+# HTTP 连接池配置 (见 client.py)：连接数与并发数挂钩，批处理期间连接持续复用，不必反复握手
+HTTP2 = False # 可选: 安装 h2 (pip install 'httpx[http2]') 后设为 True，多个请求复用同一连接；未安装 h2 时仍使用 HTTP/1.1
+HTTP_MAX_CONNECTIONS = None # 连接数上限，None 表示 CONCURRENT_REQUEST_LIMIT 再加 4 个 (用于 Batch API 上传等请求)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 30.0 # 空闲连接的保留时间
+HTTP_CONNECT_TIMEOUT_SECONDS = 10.0 # 建立连接 (含 TLS 握手) 的超时
+HTTP_WRITE_TIMEOUT_SECONDS = 120.0 # 发送请求体的超时，需容纳数 MB 的 base64 图片
+HTTP_READ_TIMEOUT_SECONDS = 180.0 # 两次收到数据之间的最长间隔，流式响应中首个 token 之前的等待也计入
+HTTP_POOL_TIMEOUT_SECONDS = 60.0 # 等待空闲连接的超时
+
+# 流式响应检查配置：边接收边解析，结构明显错误时立即中止并重试，不必等到输出结束
+STREAM_EARLY_ABORT = True
+STREAM_MAX_PREFIX_CHARS = 2000 # 超过这么多字符仍未出现 "evaluations" (多图时为 "images") 数组即中止
+STREAM_MAX_INVALID_ITEMS = 3 # 数组中格式不正确的元素超过这个数即中止
+
+# Batch API 模式配置
+BATCH_POLL_INTERVAL_SECONDS = 60 # 轮询批处理任务状态的间隔
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_MAX_REQUESTS_PER_FILE = 50000 # 单个请求文件的请求数上限 (Batch API 的上限为 50,000)
+
+# 多图打包配置：把同一站点的多张图片放在一次请求中评估，问题清单和系统提示词只需发送一次
+PACK_SIZE = 1 # 每次请求包含的图片数，1 表示不打包；可用 --pack N 临时指定
+PACK_GROUP_BY_FOLDER = True # 只把同一子目录 (站点) 下的图片打包在一起
+PACK_MAX_TOKENS = 16384 # 打包请求的输出 token 上限，需容纳所有图片的评估结果
+
+# 费用统计配置 (美元 / 百万 token，按 OpenAI 价格表填写)
+PRICE_INPUT_PER_MILLION = 2.50
+PRICE_CACHED_INPUT_PER_MILLION = 1.25
+PRICE_OUTPUT_PER_MILLION = 10.00
+METRICS_WRITE_INTERVAL_SECONDS = 10.0 # Prometheus 指标文件的刷新间隔
+
+# 近重复检测配置：视频抽帧或连拍得到的几乎相同的图片只评估一张，判断结果复制给其余图片并记录来源
+NEAR_DUPLICATE_DETECTION = False # 可用 --dedupe 临时启用 (需要安装 Pillow)
+NEAR_DUPLICATE_HASH = "dhash" # 感知哈希算法: "dhash" (更快) 或 "phash" (对亮度和压缩变化更稳健)
+NEAR_DUPLICATE_MAX_DISTANCE = 4 # 64 位哈希的汉明距离不超过该值即视为近重复；值越大合并越多，查找也越慢
+NEAR_DUPLICATE_SAME_FOLDER = True # 只在同一子目录 (站点) 内查找近重复图片
+
+# 分片运行配置：多个进程或多台机器各处理数据集的一部分 (见 sharding.py)，最后用 merge 子命令合并结果
+SHARD = None # "i/N" 表示只处理第 i 个分片 (从 0 开始，共 N 个)；可用 run --shard i/N 指定
+SHARD_BY_FOLDER = False # 按子目录 (站点) 而不是单张图片分片：同一站点总在同一分片中，多图打包和近重复检测不受分片影响，但各分片的图片数可能不均
+RATE_LIMIT_SHARE = None # 本进程可使用的 RPM/TPM 额度比例，None 表示分片运行时为 1/N，否则为 1
+
+# 结果存储配置
+STORE_FLUSH_ROWS = 200 # 累积多少张图片的结果后提交一次
+STORE_FLUSH_INTERVAL_SECONDS = 2.0 # 距上次提交最长间隔
+
+# 测试模式配置
+NUM_TEST_QUESTIONS = None # 测试模式下处理的问题数量，None表示处理所有问题
+CONCURRENT_REQUEST_LIMIT = 50 # 批处理时并发API请求的上限
+MAX_INFLIGHT_PAYLOAD_MB = 256 # 已读入的图片和在途请求占用内存的估计上限 (原图 + data URL + JSON 请求体，从读取图片到请求结束)，与 CONCURRENT_REQUEST_LIMIT 一起限制内存占用；None 表示不限制
+PROGRESS_REFRESH_SECONDS = 1.0 # 进度条上延迟、token 和费用汇总的刷新间隔
+TASK_QUEUE_SIZE = 100 # 待处理图片队列的容量，目录遍历最多领先 worker 这么多张
+RECURSIVE_SCAN = True # 是否递归遍历 DATA_FOLDER 下的站点子目录
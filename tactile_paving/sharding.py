@@ -0,0 +1,95 @@
+import os
+import sys
+import hashlib
+import subprocess
+from collections import namedtuple
+
+# ========== 分片运行 ==========
+# 把数据集按图片路径的稳定哈希分成 N 个分片，每个进程 (或每台机器) 用 --shard i/N 只处理其中一个，
+# 各自拥有独立的事件循环、API 客户端和速率额度，结果写入各自的分片文件夹，最后合并到主结果数据库。
+# 哈希只取决于相对路径，与遍历顺序、机器和 Python 的 hash 随机化无关，同一张图片总是落在同一分片中。
+
+ShardSpec = namedtuple("ShardSpec", ["index", "count"])
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_shard_spec(value):
+    # "i/N" -> ShardSpec(i, N)，i 从 0 开始
+    try:
+        index_text, count_text = str(value).split("/", 1)
+        shard = ShardSpec(int(index_text), int(count_text))
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N (例如 0/4): {value}") from None
+    if shard.count < 1 or not 0 <= shard.index < shard.count:
+        raise ValueError(f"分片编号超出范围: {value} (i 应满足 0 <= i < N)")
+    return shard
+
+
+def shard_name(shard):
+    return f"shard-{shard.index:03d}-of-{shard.count:03d}"
+
+
+def shard_key(rel_path, by_folder=False):
+    # 统一使用 "/" 作为分隔符，Windows 和 Linux 上同一图片得到相同的分片
+    rel_path = rel_path.replace(os.sep, "/")
+    if by_folder:
+        return rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+    return rel_path
+
+
+def shard_of(rel_path, shard_count, by_folder=False):
+    digest = hashlib.blake2b(shard_key(rel_path, by_folder).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def in_shard(rel_path, shard, by_folder=False):
+    return shard is None or shard_of(rel_path, shard.count, by_folder) == shard.index
+
+
+def assign_api_keys(shard_count, api_keys):
+    # 按轮转方式为每个分片分配 API 密钥，返回 [(密钥, 速率额度比例), ...]；
+    # 共用同一个密钥的分片平分该密钥的额度
+    if not api_keys:
+        return [(None, 1 / shard_count)] * shard_count
+    keys = [api_keys[index % len(api_keys)] for index in range(shard_count)]
+    return [(key, 1 / keys.count(key)) for key in keys]
+
+
+def launch_local_shards(build_argv, shard_count, log_folder, api_keys=None, extra_env=None):
+    # 在本机启动 shard_count 个子进程，build_argv(shard) 返回子进程的命令行参数；
+    # 每个子进程的输出写入 log_folder 下的日志文件，返回 {分片: 退出码}
+    os.makedirs(log_folder, exist_ok=True)
+    processes = {}
+    for index, (api_key, rate_share) in enumerate(assign_api_keys(shard_count, api_keys)):
+        shard = ShardSpec(index, shard_count)
+        env = dict(os.environ, **(extra_env or {}))
+        env.setdefault("TACTILE_PAVING_RATE_LIMIT_SHARE", repr(rate_share))
+        if api_key:
+            env["OPENAI_API_KEY"] = api_key
+        # 无论父进程从哪个目录启动，子进程都能导入本包
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_PARENT, env.get("PYTHONPATH")]))
+        log_path = os.path.join(log_folder, f"{shard_name(shard)}.log")
+        with open(log_path, "w", encoding="utf-8") as log_file:
+            process = subprocess.Popen([sys.executable, "-m", "tactile_paving"] + build_argv(shard),
+                                       stdout=log_file, stderr=subprocess.STDOUT, env=env)
+        processes[shard] = (process, log_path)
+        print(f"   已启动分片 {index}/{shard_count} (pid {process.pid})，日志: {log_path}")
+
+    return_codes = {}
+    try:
+        for shard, (process, log_path) in processes.items():
+            return_codes[shard] = process.wait()
+            status = "✅ 完成" if return_codes[shard] == 0 else f"❌ 退出码 {return_codes[shard]}"
+            print(f"   分片 {shard.index}/{shard.count}: {status}")
+    except KeyboardInterrupt:
+        for process, _ in processes.values():
+            process.terminate()
+        raise
+    return return_codes
+
+
+def find_shard_folders(shards_folder):
+    if not os.path.isdir(shards_folder):
+        return []
+    return sorted(entry.path for entry in os.scandir(shards_folder) if entry.is_dir() and entry.name.startswith("shard-"))
@@ -0,0 +1,176 @@
+import re
+import json
+
+# ========== 流式 JSON 解析 ==========
+# 在流式接收响应的同时逐块解析，根对象中指定数组 (如 "evaluations") 的每个元素一闭合就立即解析并返回，
+# 不必等到整个响应结束。发现响应结构明显不对时 (根不是对象、迟迟没有出现目标数组、
+# 目标字段不是数组、无效元素过多) 会设置 error，调用方可以立即中止请求并重试，
+# 而不是等模型输出完 8k token 之后才发现无法解析。
+# 流式解析得到的元素随完整响应文本一起返回 (ParsedResponseText)，提取答案时直接使用，不再重新解析整个文本。
+
+STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class MalformedResponseError(Exception):
+    pass
+
+
+class ParsedResponseText(str):
+    # 完整的响应文本 (用于保存和缓存)，parsed 为已解析的根对象；parse_judgments_text 等函数优先使用 parsed
+    def __new__(cls, text, parsed):
+        instance = super().__new__(cls, text)
+        instance.parsed = parsed
+        return instance
+
+
+def load_response_json(json_string):
+    # 返回响应的根对象：流式解析时已得到的对象直接返回，否则解析文本 (解析失败时抛出 json.JSONDecodeError)
+    parsed = getattr(json_string, "parsed", None)
+    return parsed if parsed is not None else json.loads(json_string)
+
+
+class StreamingArrayParser:
+    def __init__(self, array_key, validate_item=None, max_prefix_chars=2000, max_invalid_items=3):
+        self.array_key = array_key
+        self.validate_item = validate_item
+        self.max_prefix_chars = max_prefix_chars
+        self.max_invalid_items = max_invalid_items
+        self.error = None
+        self.item_count = 0
+        self.invalid_count = 0
+        self.array_done = False
+        self.items = []  # 已闭合并通过校验的元素
+
+        self._stack = []  # 当前所在的容器: "{" 或 "["
+        self._consumed = 0
+        self._in_string = False
+        self._escape_pending = False
+        self._expect_key = False  # 根对象中下一个字符串是否为键
+        self._key_pieces = None  # 正在读取的根对象键
+        self._root_key = None
+        self._awaiting_array = False  # 已读到目标键和冒号，等待 "["
+        self._in_array = False
+        self._item_pieces = None  # 正在读取的数组元素
+
+    def feed(self, text):
+        # 返回本块文本中闭合的数组元素 (已解析为 Python 对象)
+        if self.error or self.array_done or not text:
+            self._consumed += len(text)
+            return []
+        items = []
+        position = 0
+        item_start = 0
+        length = len(text)
+        if self._escape_pending:
+            position = 1
+            self._escape_pending = False
+        while position < length and not self.error:
+            if self._in_string:
+                match = STRING_SPECIAL.search(text, position)
+                if match is None:
+                    if self._key_pieces is not None:
+                        self._key_pieces.append(text[position:])
+                    position = length
+                    break
+                if match.group() == "\\":
+                    if self._key_pieces is not None:
+                        self._key_pieces.append(text[position:match.end() + 1])
+                    if match.end() >= length:
+                        self._escape_pending = True
+                    position = match.end() + 1
+                    continue
+                self._in_string = False
+                if self._key_pieces is not None:
+                    self._key_pieces.append(text[position:match.start()])
+                    self._root_key = "".join(self._key_pieces)
+                    self._key_pieces = None
+                position = match.end()
+                continue
+
+            char = text[position]
+            depth = len(self._stack)
+            if char.isspace():
+                position += 1
+                continue
+            if depth == 0 and char != "{":
+                self.error = "响应不是JSON对象"
+                break
+            if self._awaiting_array:
+                self._awaiting_array = False
+                if char != "[":
+                    self.error = f"'{self.array_key}' 字段不是数组"
+                    break
+                self._in_array = True
+
+            if char == '"':
+                self._in_string = True
+                if depth == 1 and self._expect_key:
+                    self._key_pieces = []
+            elif char in "{[":
+                if self._in_array and depth == 2:
+                    if char != "{":
+                        self._count_invalid()
+                    else:
+                        self._item_pieces = []
+                        item_start = position
+                self._stack.append(char)
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if not self._stack:
+                    self.error = "JSON括号不匹配"
+                    break
+                self._stack.pop()
+                depth = len(self._stack)
+                if self._in_array and depth == 2 and char == "}" and self._item_pieces is not None:
+                    self._item_pieces.append(text[item_start:position + 1])
+                    item = self._finish_item("".join(self._item_pieces))
+                    self._item_pieces = None
+                    if item is not None:
+                        items.append(item)
+                elif self._in_array and depth == 1:
+                    self._in_array = False
+                    self.array_done = True
+                    position += 1
+                    break
+                elif depth == 0:
+                    self.error = f"缺少 '{self.array_key}' 数组"
+                    break
+            elif char == ":":
+                if depth == 1:
+                    self._expect_key = False
+                    self._awaiting_array = self._root_key == self.array_key
+            elif char == ",":
+                if depth == 1:
+                    self._expect_key = True
+            position += 1
+
+        if self._item_pieces is not None and not self.array_done:
+            self._item_pieces.append(text[item_start:])
+        self._consumed += length
+        if not self.error and not self._in_array and not self.array_done and self._consumed > self.max_prefix_chars:
+            self.error = f"前 {self.max_prefix_chars} 个字符内未出现 '{self.array_key}' 数组"
+        return items
+
+    def _finish_item(self, item_text):
+        try:
+            item = json.loads(item_text)
+        except json.JSONDecodeError:
+            self._count_invalid()
+            return None
+        if self.validate_item is not None and not self.validate_item(item):
+            self._count_invalid()
+            return None
+        self.item_count += 1
+        self.items.append(item)
+        return item
+
+    def parsed_result(self, text):
+        # 数组完整且没有无效元素时，返回附带解析结果的响应文本；否则返回原文本，由调用方按常规方式解析
+        if self.error or not self.array_done or self.invalid_count:
+            return text
+        return ParsedResponseText(text, {self.array_key: self.items})
+
+    def _count_invalid(self):
+        self.invalid_count += 1
+        if self.invalid_count > self.max_invalid_items:
+            self.error = f"'{self.array_key}' 中的无效元素超过 {self.max_invalid_items} 个"
@@ -0,0 +1,46 @@
+from collections import Counter
+
+# ========== 多次采样投票 ==========
+# 单次评估中判断为 -1 (无法判断) 的问题，用只包含这些问题的精简请求重新采样最多 K 次，按多数票得出最终判断。
+# 每次采样后检查各问题的票数，领先的判断即使剩余采样全部投给对方也不会被超过时，该问题停止采样；
+# 所有问题都有结论后不再发送请求，因此意见一致时 K=3 只需 2 次采样。
+# 采样仍返回 -1 的票不参与多数比较；0 和 1 票数相同或全部为 -1 时，最终判断保持 -1。
+
+VOTE_KEYS = {1: "1", 0: "0", -1: "-1"}
+
+
+class VoteTally:
+    def __init__(self, question_ids, max_samples):
+        self.max_samples = max_samples
+        self.counts = {question_id: Counter() for question_id in question_ids}
+        self.samples = 0
+
+    def add_sample(self, answers):
+        # answers: {问题ID: 判断}，本次采样缺少的问题记为 -1；只为尚未得出结论的问题计票
+        for question_id in self.undecided():
+            self.counts[question_id][answers.get(question_id, -1)] += 1
+        self.samples += 1
+
+    def leader(self, question_id):
+        # 返回 (领先的判断, 领先票数, 另一方票数)
+        counts = self.counts[question_id]
+        if counts[1] >= counts[0]:
+            return 1, counts[1], counts[0]
+        return 0, counts[0], counts[1]
+
+    def is_decided(self, question_id):
+        remaining = self.max_samples - sum(self.counts[question_id].values())
+        _, lead, other = self.leader(question_id)
+        return remaining <= 0 or lead > other + remaining
+
+    def undecided(self):
+        return [question_id for question_id in self.counts if not self.is_decided(question_id)]
+
+    def judgment(self, question_id):
+        judgment, lead, other = self.leader(question_id)
+        return judgment if lead > other else -1
+
+    def results(self):
+        # 返回 {问题ID: (最终判断, {"1": 票数, "0": 票数, "-1": 票数})}
+        return {question_id: (self.judgment(question_id), {key: counts[value] for value, key in VOTE_KEYS.items()})
+                for question_id, counts in self.counts.items()}